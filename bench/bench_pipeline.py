@@ -0,0 +1,232 @@
+"""
+Benchmark suite for the binary-matrix pipeline in data_construction/:
+
+    build     BitMatrix.from_aw(wc)
+    rank      get_rank(matrix)
+    basis     get_basis(matrix, rank)
+    jaccard   cal_jaccard_similarity(matrix[basis])
+    balance   find_balance (greedy swaps, the better_problem inner step)
+
+Cases are either synthetic A/W matrices with a given shape (codes x tests), W density
+and rank (--shapes / --density / --rank_fraction), or a replay of real entries of a
+filter_info.json / init.json (--data). Every stage is timed --repeat times (min and
+median seconds), then run once more under tracemalloc for its peak memory; the
+balance stage also records the Jaccard value it reaches.
+
+Results go to a JSON file (--output). With --baseline OLD.json the run is compared
+against an earlier one: a stage that is more than --threshold times slower (and
+slower by more than --min_seconds) or uses more than --threshold times the peak
+memory, or a balance value that got worse, is reported and the script exits with 1.
+
+    python bench/bench_pipeline.py --output bench/results/base.json
+    ... change an optimizer ...
+    python bench/bench_pipeline.py --output bench/results/new.json --baseline bench/results/base.json
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_construction"))
+
+from utils import BitMatrix, get_rank, get_basis, cal_jaccard_similarity, transform2aw  # noqa: E402
+from solve import find_balance  # noqa: E402
+
+STAGES = ["build", "rank", "basis", "jaccard", "balance"]
+
+
+def synthetic_matrix(codes, tests, rank, density, rng):
+    """
+    codes x tests 的 0/1 矩阵，秩恰为 rank：测试分成 rank 组（同组的列相同），
+    每个代码以 density 的概率错每一组，相当于 (codes x rank) 的组矩阵乘以不相交的组指示矩阵。
+    """
+    if not 1 <= rank <= min(codes, tests):
+        raise ValueError(f"rank must be in [1, min(codes, tests)], got {rank} for {codes}x{tests}")
+    groups = np.concatenate([np.arange(rank), rng.integers(0, rank, tests - rank)])
+    rng.shuffle(groups)
+    for _ in range(100):
+        group_matrix = (rng.random((codes, rank)) < density).astype(np.int64)
+        # 每个错误代码至少错一个测试
+        empty = ~group_matrix.any(axis=1)
+        group_matrix[empty, rng.integers(0, rank, int(empty.sum()))] = 1
+        if get_rank(group_matrix) == rank:
+            return group_matrix[:, groups]
+    raise ValueError(f"could not draw a rank-{rank} group matrix for {codes}x{tests} at density {density}")
+
+
+def synthetic_cases(shapes, density, rank_fraction, seed):
+    cases = []
+    for shape in shapes:
+        codes, tests = (int(x) for x in shape.lower().split("x"))
+        rank = max(1, min(codes, tests, round(tests * rank_fraction)))
+        rng = np.random.default_rng([seed, codes, tests])
+        matrix = synthetic_matrix(codes, tests, rank, density, rng)
+        cases.append({
+            "case": f"synthetic-{codes}x{tests}-r{rank}-d{density:g}",
+            "codes": codes, "tests": tests, "rank": rank, "density": density,
+            "wc": transform2aw(matrix),
+        })
+    return cases
+
+
+def replay_cases(path, limit):
+    ds = json.load(open(path))
+    cases = []
+    for name, infos in ds.items():
+        wc = infos["wc"]
+        if not wc:
+            continue
+        cases.append({
+            "case": name,
+            "codes": len(wc), "tests": len(wc[0]), "rank": infos.get("rank"),
+            "density": sum(row.count("W") for row in wc) / (len(wc) * len(wc[0])),
+            "wc": wc,
+        })
+        if limit and len(cases) == limit:
+            break
+    return cases
+
+
+def stage_functions(case):
+    """每个阶段的无参函数；后面的阶段用前面阶段的结果（先各运行一次算出来）"""
+    wc = case["wc"]
+    matrix = BitMatrix.from_aw(wc)
+    rank = case["rank"] if case["rank"] is not None else get_rank(matrix)
+    basis = get_basis(matrix, rank)
+    return {
+        "build": lambda: BitMatrix.from_aw(wc),
+        "rank": lambda: get_rank(matrix),
+        "basis": lambda: get_basis(matrix, rank),
+        "jaccard": lambda: cal_jaccard_similarity(matrix[basis]),
+        "balance": lambda: find_balance([case["case"], matrix, rank, basis, "jaccard"]),
+    }, rank
+
+
+def run_case(case, repeat, stages):
+    functions, rank = stage_functions(case)
+    result = {key: case[key] for key in ("case", "codes", "tests", "density")}
+    result["rank"] = rank
+    result["stages"] = {}
+    for stage in stages:
+        fn = functions[stage]
+        seconds = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            value = fn()
+            seconds.append(time.perf_counter() - start_time)
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["stages"][stage] = {
+            "min_seconds": min(seconds),
+            "median_seconds": statistics.median(seconds),
+            "peak_bytes": peak,
+        }
+        if stage == "rank":
+            result["measured_rank"] = int(value)
+        if stage == "balance":
+            result["balance_value"] = float(value[2])
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """返回回归列表（每项一行说明）"""
+    previous = {r["case"]: r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result["case"])
+        if old is None:
+            continue
+        for stage, timing in result["stages"].items():
+            old_timing = old["stages"].get(stage)
+            if old_timing is None:
+                continue
+            new_seconds, old_seconds = timing["min_seconds"], old_timing["min_seconds"]
+            if new_seconds > old_seconds * threshold and new_seconds - old_seconds > min_seconds:
+                regressions.append(f"{result['case']} {stage}: {old_seconds * 1e3:.2f} ms -> {new_seconds * 1e3:.2f} ms ({new_seconds / old_seconds:.2f}x)")
+            if timing["peak_bytes"] > max(old_timing["peak_bytes"], 1) * threshold and timing["peak_bytes"] - old_timing["peak_bytes"] > 1 << 20:
+                regressions.append(f"{result['case']} {stage}: peak memory {old_timing['peak_bytes'] / 2 ** 20:.1f} MiB -> {timing['peak_bytes'] / 2 ** 20:.1f} MiB")
+        if "balance_value" in result and "balance_value" in old and result["balance_value"] > old["balance_value"] + 1e-9:
+            regressions.append(f"{result['case']} balance: jaccard {old['balance_value']:.6f} -> {result['balance_value']:.6f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark rank / basis / Jaccard / find_balance on A/W matrices.")
+    parser.add_argument('--data', type=str, default="", help="replay the wc matrices of a filter_info.json / init.json instead of synthetic ones")
+    parser.add_argument('--limit', type=int, default=50, help="number of --data entries to replay, 0 for all")
+    parser.add_argument('--shapes', nargs='+', default=["100x20", "400x50", "1000x100", "2000x200"], help="synthetic CODESxTESTS shapes")
+    parser.add_argument('--density', type=float, default=0.3, help="synthetic probability that a code fails a test group")
+    parser.add_argument('--rank_fraction', type=float, default=0.5, help="synthetic rank = round(tests * rank_fraction)")
+    parser.add_argument('--seed', type=int, default=0, help="synthetic matrix seed")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help="stages to run")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage")
+    parser.add_argument('--output', type=str, default="", help="results json (default bench/results/bench-{time}.json)")
+    parser.add_argument('--baseline', type=str, default="", help="earlier results json to check for regressions")
+    parser.add_argument('--threshold', type=float, default=1.25, help="allowed slowdown / memory growth factor against --baseline")
+    parser.add_argument('--min_seconds', type=float, default=0.005, help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    if args.data:
+        cases = replay_cases(args.data, args.limit)
+        source = args.data
+    else:
+        cases = synthetic_cases(args.shapes, args.density, args.rank_fraction, args.seed)
+        source = "synthetic"
+
+    # 先跑一次小矩阵：素数表和 C 消元内核只在第一次调用时准备，不计入计时
+    get_rank(np.eye(2, dtype=np.int64))
+
+    results = []
+    print(f"{'case':<36} {'codes':>6} {'tests':>6} {'rank':>5} " + " ".join(f"{stage:>10}" for stage in args.stages))
+    for case in cases:
+        result = run_case(case, max(1, args.repeat), args.stages)
+        results.append(result)
+        timings = " ".join(f"{result['stages'][stage]['min_seconds'] * 1e3:>8.2f}ms" for stage in args.stages)
+        print(f"{result['case'][:36]:<36} {result['codes']:>6} {result['tests']:>6} {result['rank']:>5} {timings}")
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"bench-{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    report = {
+        "meta": {
+            "source": source,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results -> {output}")
+
+    if args.baseline:
+        regressions = compare(results, json.load(open(args.baseline)), args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline} (threshold {args.threshold}x):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (threshold {args.threshold}x)")
@@ -0,0 +1,103 @@
+"""
+Benchmark the exact rank / basis engine in utils against the float versions it replaced
+(np.linalg.matrix_rank and column-pivoted QR) on the wc matrices of a solve.py input
+file (data/filter_info.json or init.json: {problem: {"wc": [...], ...}}).
+
+Three workloads per problem:
+  rank   get_rank(transform2matrix(wc))                       (filter.rule_filter)
+  basis  get_basis(matrix, rank)                              (solve.init / better_problem)
+  swap   get_rank(matrix[basis with one row swapped]) < rank  (find_balance inner loop)
+
+Without --data (or if the file is missing) it runs on synthetic wc-like matrices:
+a few random bug patterns, each shared by many codes with some noise.
+"""
+import json
+import os
+import time
+
+import numpy as np
+from scipy.linalg import qr
+
+from utils import transform2matrix, transform2aw, get_rank, get_basis
+
+
+def float_rank(matrix):
+    return np.linalg.matrix_rank(matrix).item()
+
+
+def float_basis(matrix, rank):
+    q, r, p = qr(matrix.T, pivoting=True)
+    return p[:rank].tolist()
+
+
+def synthetic_wc(num_problems, seed=0):
+    rng = np.random.default_rng(seed)
+    problems = {}
+    for i in range(num_problems):
+        num_codes = int(rng.integers(30, 400))
+        num_tests = int(rng.integers(10, 80))
+        patterns = rng.random((int(rng.integers(5, 30)), num_tests)) < rng.uniform(0.05, 0.4)
+        rows = patterns[rng.integers(0, len(patterns), num_codes)]
+        rows ^= rng.random(rows.shape) < 0.02
+        rows[~rows.any(axis=1), 0] = True
+        problems[f"synthetic-{i}"] = {"wc": transform2aw(rows.astype(int))}
+    return problems
+
+
+def swap_matrices(matrix, basis, count, rng):
+    """find_balance 里 R_temp 的样子：basis 的一行换成 basis 外的一行"""
+    others = np.setdiff1d(np.arange(matrix.shape[0]), basis)
+    if len(others) == 0:
+        return []
+    result = []
+    for _ in range(count):
+        temp_basis = np.array(basis)
+        temp_basis[rng.integers(len(basis))] = others[rng.integers(len(others))]
+        result.append(matrix[temp_basis, :])
+    return result
+
+
+def timed(fn, items):
+    start_time = time.perf_counter()
+    values = [fn(*item) for item in items]
+    return time.perf_counter() - start_time, values
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark exact vs float rank/basis on wc matrices.")
+    parser.add_argument('--data', type=str, default="data/filter_info.json", help="solve.py input with a wc list per problem")
+    parser.add_argument('--synthetic', type=int, default=200, help="number of synthetic problems when --data is missing")
+    parser.add_argument('--swaps', type=int, default=50, help="swapped-basis rank checks per problem")
+    args = parser.parse_args()
+
+    if os.path.exists(args.data):
+        ds = json.load(open(args.data))
+        source = args.data
+    else:
+        ds = synthetic_wc(args.synthetic)
+        source = f"{args.synthetic} synthetic problems"
+    matrices = [transform2matrix(infos["wc"]) for infos in ds.values() if infos["wc"]]
+    shapes = np.array([m.shape for m in matrices])
+    print(f"{source}: {len(matrices)} matrices, rows {shapes[:, 0].min()}-{shapes[:, 0].max()}, columns {shapes[:, 1].min()}-{shapes[:, 1].max()}")
+
+    # 素数表和 C 内核只在第一次调用时准备，不计入计时
+    get_rank(np.eye(2, dtype=int))
+    float_seconds, float_ranks = timed(float_rank, [(m,) for m in matrices])
+    exact_seconds, exact_ranks = timed(get_rank, [(m,) for m in matrices])
+    mismatches = sum(a != b for a, b in zip(float_ranks, exact_ranks))
+    print(f"rank   float {float_seconds * 1e3:9.1f} ms  exact {exact_seconds * 1e3:9.1f} ms  {float_seconds / exact_seconds:6.1f}x  ({mismatches} differ)")
+
+    items = list(zip(matrices, exact_ranks))
+    float_seconds, float_bases = timed(float_basis, items)
+    exact_seconds, exact_bases = timed(get_basis, items)
+    invalid = sum(len(b) != r or get_rank(m[b]) != r for (m, r), b in zip(items, exact_bases))
+    print(f"basis  float {float_seconds * 1e3:9.1f} ms  exact {exact_seconds * 1e3:9.1f} ms  {float_seconds / exact_seconds:6.1f}x  ({invalid} invalid exact bases)")
+
+    rng = np.random.default_rng(0)
+    swaps = [(r,) for (m, r), b in zip(items, exact_bases) for r in swap_matrices(m, b, args.swaps, rng)]
+    float_seconds, float_ranks = timed(float_rank, swaps)
+    exact_seconds, exact_ranks = timed(get_rank, swaps)
+    mismatches = sum(a != b for a, b in zip(float_ranks, exact_ranks))
+    print(f"swap   float {float_seconds * 1e3:9.1f} ms  exact {exact_seconds * 1e3:9.1f} ms  {float_seconds / exact_seconds:6.1f}x  ({len(swaps)} checks, {mismatches} differ)")
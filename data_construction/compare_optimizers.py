@@ -0,0 +1,100 @@
+"""
+Compare the balance optimizers in solve.OPTIMIZERS (greedy best-improvement swaps vs
+simulated annealing) on init.json: quality of the best basis vs CPU seconds.
+
+Every problem gets `--starts` seeded starts per optimizer, run in parallel on one
+process pool (solve.multi_start) under a wall-clock budget per problem. For each
+optimizer and budget the script prints the mean best Jaccard, the mean time to reach
+it, the CPU seconds spent, and how many problems it wins / ties / loses against the
+greedy baseline at the same number of starts.
+
+Without --data (or if the file is missing) it runs on bench_rank's synthetic wc
+matrices.
+"""
+import json
+import os
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from utils import BitMatrix, get_rank
+from solve import OPTIMIZERS, _init_balance_worker, multi_start
+from bench_rank import synthetic_wc
+
+
+def load_problems(path, limit, synthetic):
+    if os.path.exists(path):
+        ds = json.load(open(path))
+        source = path
+    else:
+        ds = synthetic_wc(synthetic)
+        source = f"{synthetic} synthetic problems"
+    problems = {}
+    for name, infos in ds.items():
+        wc = infos["wc"]
+        rank = infos.get("rank") or get_rank(BitMatrix.from_aw(wc))
+        # 满秩或只有一行基的题目没有可换的行
+        if 1 < rank < len(wc):
+            problems[name] = {"wc": wc, "rank": rank}
+        if len(problems) == limit:
+            break
+    return problems, source
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare balance optimizers: best Jaccard vs CPU seconds.")
+    parser.add_argument('--data', type=str, default="data/0903/init.json", help="solve.init() output with wc / rank per problem")
+    parser.add_argument('--problems', type=int, default=20, help="number of problems to compare on")
+    parser.add_argument('--synthetic', type=int, default=40, help="number of synthetic problems when --data is missing")
+    parser.add_argument('--optimizers', nargs='+', default=list(OPTIMIZERS), choices=list(OPTIMIZERS), help="optimizers to run, greedy is the baseline")
+    parser.add_argument('--budgets', nargs='+', type=float, default=[1.0, 4.0], help="wall-clock seconds per problem")
+    parser.add_argument('--starts', type=int, default=8, help="seeded starts per problem")
+    parser.add_argument('--processes', type=int, default=max(1, cpu_count() - 4), help="worker processes")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the starts (row shuffles and annealing moves)")
+    parser.add_argument('--output', type=str, default="", help="also write per-problem results to this json file")
+    args = parser.parse_args()
+
+    problems, source = load_problems(args.data, args.problems, args.synthetic)
+    print(f"{source}: comparing on {len(problems)} problems, {args.starts} starts each, {args.processes} processes")
+    matrices = {name: BitMatrix.from_aw(p["wc"]) for name, p in problems.items()}
+
+    runs = {}
+    with Pool(args.processes, initializer=_init_balance_worker, initargs=(matrices,)) as pool:
+        for budget in args.budgets:
+            for optimizer in args.optimizers:
+                # 贪心到局部最优就停，预算只是上限，同一结果不必按每个预算重跑
+                key = (optimizer, None if optimizer == "greedy" else budget)
+                if key in runs:
+                    continue
+                runs[key] = {
+                    name: multi_start(pool, name, p["rank"], optimizer, args.starts, budget, args.seed)
+                    for name, p in problems.items()
+                }
+
+    names = list(problems)
+    baseline = runs.get(("greedy", None))
+    print(f"{'optimizer':<10} {'budget':>7} {'mean jaccard':>13} {'to best (s)':>12} {'cpu s':>9} {'vs greedy W/T/L':>16}")
+    report = []
+    for (optimizer, budget), results in runs.items():
+        values = np.array([results[name]["value"] for name in names])
+        to_best = np.mean([results[name]["time_to_best"] for name in names])
+        cpu_seconds = sum(results[name]["cpu_seconds"] for name in names)
+        versus = ""
+        if baseline is not None and optimizer != "greedy":
+            greedy_values = np.array([baseline[name]["value"] for name in names])
+            wins = int(np.sum(values < greedy_values - 1e-9))
+            losses = int(np.sum(values > greedy_values + 1e-9))
+            versus = f"{wins}/{len(names) - wins - losses}/{losses}"
+        budget_text = "-" if budget is None else f"{budget:g}"
+        print(f"{optimizer:<10} {budget_text:>7} {values.mean():>13.4f} {to_best:>12.3f} {cpu_seconds:>9.1f} {versus:>16}")
+        report.append({
+            "optimizer": optimizer,
+            "budget": budget,
+            "problems": {name: {key: results[name][key] for key in ("value", "time_to_best", "cpu_seconds", "steps")} for name in names},
+        })
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
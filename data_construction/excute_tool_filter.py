@@ -1,10 +1,17 @@
 import subprocess
 import tempfile
 import os
+import sys
 import resource
 import uuid
 import json
 
+# runner / compile_cache / async_engine / time_limits 与 evaluation/ 共用，放在仓库根目录的 judge/ 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "judge"))
+
+from runner import execute_steps, OLE_RETURNCODE
+from time_limits import effective_timeout
+
 import random
 from decimal import Decimal
 import decimal
@@ -108,6 +115,13 @@ def is_decimal(s):
 
 
 def run_cpp_code_linux(infos, test_mode = False, rank_p = 1):
+    return execute_steps(run_cpp_code_steps(infos, test_mode, rank_p))
+
+def run_cpp_code_steps(infos, test_mode = False, rank_p = 1):
+    """
+    run_cpp_code_linux 的判题过程，编译和运行测试 yield 给驱动方：
+    runner.execute_steps（同步，Pool 引擎）或 async_engine（asyncio 引擎）。
+    """
     code = infos["code"]
     time_limit = infos["time_limit"]
     memory_limit = infos["memory_limit"]
@@ -121,29 +135,18 @@ def run_cpp_code_linux(infos, test_mode = False, rank_p = 1):
 
 
     with tempfile.TemporaryDirectory() as tmpdirname:
-        unique_id = uuid.uuid4()
-        cpp_file = os.path.join(tmpdirname, f"{unique_id}.cpp")
-        exe_file = os.path.join(tmpdirname, f"{unique_id}.out")
-
-        # Write C++ code to file
-        with open(cpp_file, "w") as f:
-            f.write(remove_freopen_lines(code))
-
-        # Compile the C++ code
-        compile_result = subprocess.run(
-            ["g++", cpp_file, "-o", exe_file, f"-std={infos['compileAndRunOptions']['std']}"],
-            capture_output=True,
-            text=True
-        )
-
-        if compile_result.returncode != 0:
+        # Compile the C++ code (相同源码/编译器/参数命中 compile_cache 时直接复用)
+        flags = [f"-std={infos['compileAndRunOptions']['std']}"]
+        _, (exe_file, compile_stderr) = yield ("compile", remove_freopen_lines(code), flags, tmpdirname)
+
+        if exe_file is None:
             infos["error"].append("CE")
-            infos["details"].append(compile_result.stderr)
+            infos["details"].append(compile_stderr)
             return infos
 
         memory_kb = int(memory_limit) * 1024 * 5
-        time_limit_int = int(time_limit) // 1000 + 3
-        cmd = f"ulimit -t {time_limit_int} && ulimit -v {memory_kb} && {exe_file}"
+        # --time_limits 校准过的题目用 infos["timeout"]，否则为 time_limit // 1000 + 3
+        time_limit_int = effective_timeout(infos)
         # cmd = f"{exe_file}"
         for idx, testcase in enumerate(test_cases):
             if isinstance(testcase["input"], dict):
@@ -152,15 +155,10 @@ def run_cpp_code_linux(infos, test_mode = False, rank_p = 1):
             output_string = testcase["output"]
 
             error = ""
+            _, result = yield ("run", exe_file, input_string, time_limit_int, memory_kb)
             try:
-                result = subprocess.run(
-                        cmd,
-                        input=input_string,
-                        text=True,
-                        capture_output=True,
-                        shell=True,
-                        timeout=time_limit_int
-                    )
+                if isinstance(result, Exception):
+                    raise result
                 
                 # 检查返回码
                 if result.returncode != 0:
@@ -170,12 +168,17 @@ def run_cpp_code_linux(infos, test_mode = False, rank_p = 1):
                     elif result.returncode == 124:  # timeout命令的超时返回码
                         error = "TLE"
                         details = f"{error}: Testcase:{idx}"
+                    elif result.returncode == OLE_RETURNCODE:  # SIGXFSZ - 输出超过上限
+                        error = "OLE"
+                        details = f"{error}: Testcase:{idx}"
                     else:
                         error = "RE"
                         details = f"{error}: Testcase:{idx}"
                 if not error and result.stderr:
                     error = "RE"
                     details = f"{error}: Testcase:{idx}"
+                # runner 返回 bytes；无法按 UTF-8 解码的输出与原来 text=True 时一样记为 RE
+                stdout = result.stdout.decode()
             except subprocess.TimeoutExpired:
                 error = "TLE"
                 details = f"{error}: Testcase:{idx}"
@@ -187,7 +190,7 @@ def run_cpp_code_linux(infos, test_mode = False, rank_p = 1):
                 if isinstance(output_string, float):
                     output_string = str(output_string)
                 expected_lines = [line.strip() for line in output_string.splitlines()]
-                actual_lines = [line.strip() for line in result.stdout.splitlines()]
+                actual_lines = [line.strip() for line in stdout.splitlines()]
 
                 # 移除空行
                 expected_lines = [line for line in expected_lines if line]
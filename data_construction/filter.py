@@ -134,12 +134,12 @@ def rule_filter():
         #     print(f"Problem {pro} has invalid time or memory limit: {infos['timeLimit']} {infos['memoryLimit']}")
         #     continue
         wc = [c["output_str"] for c in infos["codes"] if "W" in c["output_str"]]
-        matrix = transform2matrix(wc)
+        matrix = BitMatrix.from_aw(wc)
         rank = get_rank(matrix)
         if rank < 5:
             print(f"Problem {pro} has invalid rank: {rank}")
             continue
-        if np.any(np.all(matrix == 1, axis=0)):
+        if np.any(matrix.column_sums() == len(matrix)):
             print(f"Problem {pro} has all-1 column in wc matrix.")
             continue
         wcs.append(len(wc))
@@ -157,9 +157,9 @@ def look_invalid():
     ds = json.load(open("data/filter_info.json", "r"))
     for pro, infos in ds.items():
         wc = infos["wc"]
-        matrix = transform2matrix(wc)
+        matrix = BitMatrix.from_aw(wc)
         
-        zero_rows = np.all(matrix == 0, axis=1)
+        zero_rows = matrix.row_sums() == 0
         if np.any(zero_rows):
             zero_indices = np.where(zero_rows)[0]
             print(f"Problem {pro}: Found {len(zero_indices)} zero rows at indices {zero_indices}")
@@ -1,8 +1,16 @@
 import os
+import sys
 import json
 from datetime import datetime
+# runner / compile_cache / async_engine / time_limits 与 evaluation/ 共用，放在仓库根目录的 judge/ 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "judge"))
 from load_data_filter import get_data
-from excute_tool_filter import run_cpp_code_linux
+from excute_tool_filter import run_cpp_code_linux, run_cpp_code_steps
+import compile_cache
+import runner
+import async_engine
+from time_limits import load_time_limits, apply_time_limits
+from itertools import chain
 from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
 import logging
@@ -58,23 +66,34 @@ def setup_logging():
 
 def process_code_with_logging(data_item):
     """包装函数，用于添加日志"""
-    problem_id = data_item["problem_id"]
     try:
         result = run_cpp_code_linux(data_item)
-        status = result.get("error", "Unknown")
-        logger.info(f"执行完成 - 问题ID: {problem_id}, 状态: {status}")
-        return result
     except Exception as e:
-        logger.error(f"执行异常 - 问题ID: {problem_id}, 错误: {str(e)}")
+        result = e
+    return finish_code(data_item, result)
+
+def process_batch_async(batch):
+    """asyncio 引擎：当前进程用一个事件循环跑完一批代码，最多 engine_concurrency 个进程同时运行"""
+    outcomes = async_engine.run_items(batch, run_cpp_code_steps, engine_concurrency)
+    return [finish_code(data_item, outcome) for data_item, outcome in zip(batch, outcomes)]
+
+def finish_code(data_item, outcome):
+    """outcome 为 run_cpp_code_linux 的返回值，或执行时抛出的异常"""
+    problem_id = data_item["problem_id"]
+    if isinstance(outcome, Exception):
+        logger.error(f"执行异常 - 问题ID: {problem_id}, 错误: {str(outcome)}")
         data_item["error"] = ["EXE"]
-        data_item["details"] = str(e)
+        data_item["details"] = str(outcome)
         return data_item
+    status = outcome.get("error", "Unknown")
+    logger.info(f"执行完成 - 问题ID: {problem_id}, 状态: {status}")
+    return outcome
 
 
 def save_results(results, correct_code_output_file, output_file):
     
     problem_results = {}
-    status_counts = {"AC": 0, "CE": 0, "TLE": 0, "MLE": 0, "RE": 0, "WA": 0, "EXE": 0}
+    status_counts = {"AC": 0, "CE": 0, "TLE": 0, "MLE": 0, "OLE": 0, "RE": 0, "WA": 0, "EXE": 0}
     
     for result in results:
         problem_id = result["problem_id"]
@@ -139,6 +158,13 @@ if __name__ == "__main__":
     parser.add_argument('--base_dir', type=str, default="", help="base_dir")
     parser.add_argument('--cpu', type=int, default=50, help="cpu_count")
     parser.add_argument('--data_path', type=str, default='TestcaseBench-v29.json', help="TC-Bench data path")
+    parser.add_argument('--compile_cache_dir', type=str, default="", help="compiled binary cache dir (e.g. ~/.cache/tcb-compile), empty: no cache")
+    parser.add_argument('--compile_cache_gb', type=float, default=20, help="compiled binary cache size limit (GB)")
+    parser.add_argument('--runner', type=str, default="shell", choices=runner.RUNNERS, help="shell: bash + ulimit (original), direct: exec binary with setrlimit, forkserver: fork per test")
+    parser.add_argument('--output_limit_mb', type=float, default=0, help="per-test stdout/stderr size cap (MB), larger output is judged OLE; 0: no cap (default)")
+    parser.add_argument('--engine', type=str, default="pool", choices=["pool", "asyncio"], help="pool: one worker process per running binary, asyncio: --engine_procs event loops keep --cpu binaries in flight")
+    parser.add_argument('--engine_procs', type=int, default=2, help="number of Python processes for --engine asyncio")
+    parser.add_argument('--time_limits', type=str, default="", help="per-problem timeouts from time_limits.py; empty: time_limit // 1000 + 3 seconds")
 
     args = parser.parse_args()
 
@@ -147,6 +173,11 @@ if __name__ == "__main__":
     base_dir = args.base_dir
     cpu = args.cpu
     data_path = args.data_path
+    compile_cache.configure(args.compile_cache_dir, max_bytes=args.compile_cache_gb * 1024 ** 3)
+    runner.configure(args.runner, output_limit=args.output_limit_mb * 1024 ** 2)
+    # asyncio 引擎每个进程同时运行的编译 / 测试进程数，合计约为 cpu
+    engine_procs = max(1, min(args.engine_procs, cpu))
+    engine_concurrency = -(-cpu // engine_procs)
 
     save_dir = f"{base_dir}/save_tests_{model_name}-fliter/{testcase_alg}/" + "tests-{}.jsonl"
 
@@ -161,12 +192,22 @@ if __name__ == "__main__":
 
     data = get_data(name=datasets_name, data_path=data_path, prefix_dir=test_dir, save_dir=save_dir, testcase_alg=testcase_alg, pass_rate_save_file=pass_rate_save_file)
     logger.info(f"加载了 {len(data)} 个代码项目")
+    if args.time_limits:
+        applied = apply_time_limits(data, load_time_limits(args.time_limits))
+        logger.info(f"{args.time_limits}: {applied}/{len(data)} 个代码项目使用校准的超时")
 
-    logger.info(f"使用 {cpu} 个CPU核心进行并行处理")
+    if args.engine == "asyncio":
+        logger.info(f"使用 asyncio 引擎：{engine_procs} 个进程，每个进程最多 {engine_concurrency} 个并发")
+    else:
+        logger.info(f"使用 {cpu} 个CPU核心进行并行处理")
 
-    with Pool(cpu) as pool:
+    with Pool(engine_procs if args.engine == "asyncio" else cpu) as pool:
+        if args.engine == "asyncio":
+            tasks = chain.from_iterable(pool.imap_unordered(process_batch_async, async_engine.split_batches(data, engine_concurrency)))
+        else:
+            tasks = pool.imap_unordered(process_code_with_logging, data)
         results = list(tqdm(
-            pool.imap_unordered(process_code_with_logging, data),
+            tasks,
             total=len(data),
             desc="执行进度"
         ))
@@ -184,7 +225,7 @@ if __name__ == "__main__":
         save_path = save_dir.format(k)
         status_array_length = len(v[0]["error"])
         remove_index = []
-        status_wrong = ["TLE", "RE", "MLE", "WA", "EXE"]
+        status_wrong = ["TLE", "RE", "MLE", "OLE", "WA", "EXE"]
         for idx, item in enumerate(v):
             if all(e in status_wrong for e in item["error"]):
                 remove_index.append(idx)
@@ -1,15 +1,25 @@
+import os
 import numpy as np
 from scipy.linalg import lu,qr # Can be used for rank, or numpy.linalg.matrix_rank
 from itertools import combinations
 from collections import Counter
 import json
+import math
 from utils import *
 from multiprocessing import Pool, cpu_count
-import os
 from tqdm import tqdm
 import random
 import logging
+import time
+import zlib
 from datetime import datetime
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+# 没有 threadpoolctl 时的退路：只对工作进程里之后才加载的 BLAS / OpenMP 库有效
+BLAS_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
 
 def init():
     ds = json.load(open("data/filter_info.json"))
@@ -17,7 +27,7 @@ def init():
     for pro, infos in ds.items():
         rank = infos["rank"]
         wc = infos["wc"]
-        matrix = transform2matrix(wc)
+        matrix = BitMatrix.from_aw(wc)
         basis_indices = get_basis(matrix, rank)
         infos["rank"] = rank
         infos["basis_indices"] = basis_indices
@@ -49,61 +59,243 @@ def setup_logger(log_file=None):
     return logging.getLogger(__name__)
 
 
-def find_balance(info):
-    name, matrix, rank, basis, balance_metric = info
+# 平衡优化器：optimizer(matrix, rank, basis, rng, deadline) -> {"basis", "value", "states", "best_time", "steps"}
+# matrix 为 BitMatrix，basis 为初始基的行下标，rng 为 np.random.Generator，deadline 为 time.time() 的截止时刻（None 为不限时）。
+# value / states 为 cal_jaccard_similarity 对最终基的结果，best_time 为找到它的 time.time()。
+def greedy_balance(matrix, rank, basis, rng=None, deadline=None, max_iter=1000):
+    """每轮在所有换行中取 Jaccard 下降最多的一个，直到没有改进（局部最优）"""
     basis = np.array(basis)
-    R = matrix[basis, :]
-    all_indices = np.arange(matrix.shape[0])
-    X = np.setdiff1d(all_indices, basis)  
+    balance_states, balance_value = cal_jaccard_similarity(matrix[basis, :])
+    best_time = time.time()
 
-    if balance_metric == "jaccard":
-        balance_states, balance_value = cal_jaccard_similarity(R)
-    else:
-        raise ValueError(f"Unknown balance_metric: {balance_metric}")
-    
-    max_iter = 1000
+    # 换行后是否仍满秩由基变换坐标直接查表，不必对每个 R_temp 重新求秩
+    exchange = init_exchange(matrix, basis)
+    # jaccard[k, l]：第 k 行与第 l 个基行的 Jaccard 相似度，换行只需重算一列
+    row_sums = matrix.row_sums()
+    jaccard = jaccard_columns(matrix, basis, row_sums)
     iter_count = 0
-    # logger.info(f"[{name}] Starting optimization with initial {balance_metric}={balance_value}")
     while iter_count < max_iter:
+        if deadline is not None and time.time() >= deadline:
+            break
         iter_count += 1
-        change = [balance_states, balance_value, None, None, None]
-        balance_min = balance_value
-        
-        for i_idx, i in enumerate(basis):
-            i_row = matrix[i]
-            for j in X:
-                j_row = matrix[j]
-                temp_basis = basis.copy()
-                temp_basis[i_idx] = j
-                R_temp = matrix[temp_basis, :]
-
-                if get_rank(R_temp) < rank:
-                    continue
+        # 把第 l 个基行换成第 k 行：去掉第 l 行与其余基行的相似度，加上第 k 行与其余基行的相似度（对称矩阵各算两次）
+        basis_row_sums = jaccard[basis].sum(axis=1)
+        scores = balance_value - 2 * basis_row_sums[None, :] + 2 * (jaccard.sum(axis=1)[:, None] - jaccard)
+        scores[~swappable(exchange)] = np.inf
+        scores[basis] = np.inf
+        # 与逐个枚举时相同的次序（先基行 i_idx，再非基行 j）取第一个最小值
+        i_idx, j = np.unravel_index(np.argmin(scores.T), scores.T.shape)
+        if not scores[j, i_idx] < balance_value:
+            break
 
-                if balance_metric == "jaccard":
-                    temp_balance_states, temp_balance_value = cal_jaccard_similarity(R_temp)
-                else:
-                    raise ValueError(f"Unknown balance_metric: {balance_metric}")
-                
-                if temp_balance_value < balance_min:
-                    balance_min = temp_balance_value
-                    change = [temp_balance_states, temp_balance_value, i, i_idx, j]
-
-        if change[2] is not None:
-            # logger.info(f"[{name}] Iter {iter_count}: {balance_metric} improved from {balance_value} to {change[1]} (swap index {i} -> {j})")
-            balance_states, balance_value, i, i_idx, j = change
-            basis[i_idx] = j
-            X = np.setdiff1d(all_indices, basis)
-        else:
+        temp_basis = basis.copy()
+        temp_basis[i_idx] = j
+        # 接受前按 cal_jaccard_similarity 重新计算，保存的值与 verify.verify_balance 完全一致
+        temp_balance_states, temp_balance_value = cal_jaccard_similarity(matrix[temp_basis, :])
+        if not temp_balance_value < balance_value:
             break
-    return name, basis.tolist(), balance_value, balance_states.tolist(), matrix
+        balance_states, balance_value = temp_balance_states, temp_balance_value
+        best_time = time.time()
+        basis = temp_basis
+        exchange_rows(exchange, i_idx, j)
+        jaccard[:, i_idx] = jaccard_columns(matrix, [j], row_sums)[:, 0]
+    return {"basis": basis.tolist(), "value": balance_value, "states": balance_states, "best_time": best_time, "steps": iter_count}
+
+
+def anneal_balance(matrix, rank, basis, rng, deadline=None, max_steps=None, initial_scale=1.0, final_ratio=1e-3):
+    """
+    先用 greedy_balance 走到局部最优，再模拟退火：每步随机取一个基行 l 和一个非基行 k，换行后仍满秩才考虑，
+    Jaccard 增量 delta <= 0 或以 exp(-delta / T) 的概率接受。温度从 initial_scale 倍的初始 |delta| 均值
+    按几何级数降到它的 final_ratio 倍，进度按 deadline（或 max_steps）计算。最后从最好的基出发再用 greedy_balance 收尾。
+    """
+    if deadline is None and max_steps is None:
+        raise ValueError("anneal_balance needs a deadline or max_steps")
+    start_time = time.time()
+    # 从同一起点的贪心局部最优出发，最好结果不会比贪心差
+    greedy = greedy_balance(matrix, rank, basis, deadline=deadline)
+    basis = np.array(greedy["basis"])
+    num_rows, size = len(matrix), len(basis)
+    best_basis, best_time = basis.copy(), greedy["best_time"]
+    steps = 0
+    if 0 < size < num_rows:
+        exchange = init_exchange(matrix, basis)
+        valid = swappable(exchange)
+        row_sums = matrix.row_sums()
+        jaccard = jaccard_columns(matrix, basis, row_sums)
+        in_basis = np.zeros(num_rows, dtype=bool)
+        in_basis[basis] = True
+        value = best_value = jaccard[basis].sum()
+
+        def propose():
+            k = int(rng.integers(num_rows))
+            l = int(rng.integers(size))
+            if in_basis[k] or not valid[k, l]:
+                return None
+            # 去掉第 l 个基行与其余基行的相似度，加上第 k 行与其余基行的相似度
+            return k, l, 2 * (jaccard[k].sum() - jaccard[k, l] - jaccard[basis, l].sum())
+
+        samples = [move[2] for move in (propose() for _ in range(200)) if move is not None]
+        initial_temperature = initial_scale * float(np.mean(np.abs(samples))) if samples else 0.0
+        temperature = initial_temperature
+        while best_value > 0 and initial_temperature > 0:
+            if steps % 64 == 0:
+                if deadline is not None:
+                    now = time.time()
+                    if now >= deadline:
+                        break
+                    progress = (now - start_time) / max(deadline - start_time, 1e-9)
+                else:
+                    progress = 0.0
+                if max_steps is not None:
+                    progress = max(progress, steps / max_steps)
+                temperature = initial_temperature * final_ratio ** progress
+            if max_steps is not None and steps >= max_steps:
+                break
+            steps += 1
+            move = propose()
+            if move is None:
+                continue
+            k, l, delta = move
+            if delta > 0 and rng.random() >= math.exp(-delta / temperature):
+                continue
+            in_basis[basis[l]] = False
+            in_basis[k] = True
+            basis[l] = k
+            exchange_rows(exchange, l, k)
+            valid = swappable(exchange)
+            jaccard[:, l] = jaccard_columns(matrix, [k], row_sums)[:, 0]
+            value = jaccard[basis].sum()
+            if value < best_value - 1e-9:
+                best_value, best_basis, best_time = value, basis.copy(), time.time()
+
+    result = greedy_balance(matrix, rank, best_basis)
+    # 收尾没有换行（只跑了判断无改进的一轮）时，最好结果是退火阶段找到的
+    if result["steps"] <= 1:
+        result["best_time"] = best_time
+    if not result["value"] < greedy["value"]:
+        result = greedy
+    result["steps"] += steps
+    return result
+
+
+OPTIMIZERS = {"greedy": greedy_balance, "anneal": anneal_balance}
+
+
+def find_balance(info):
+    name, matrix, rank, basis, balance_metric = info
+    if not isinstance(matrix, BitMatrix):
+        matrix = BitMatrix.from_dense(matrix)
+    if balance_metric != "jaccard":
+        raise ValueError(f"Unknown balance_metric: {balance_metric}")
+    result = greedy_balance(matrix, rank, basis)
+    return name, result["basis"], result["value"], result["states"].tolist(), matrix
+
+
+# better_problem 的工作进程里按题目名共享的原始（未打乱）矩阵，由 _init_balance_worker 在进程启动时设置一次
+_shared_matrices = {}
+
+
+def _init_balance_worker(matrices):
+    global _shared_matrices
+    _shared_matrices = matrices
+    # 每个进程各自跑一个优化任务，BLAS / OpenMP 限制为单线程，避免 N 个进程各开 N 个线程。
+    # numpy 在父进程里早已加载，设置环境变量对它不起作用，要用 threadpoolctl 在运行时修改
+    if threadpool_limits is not None:
+        threadpool_limits(1)
+    else:
+        for name in BLAS_THREAD_ENV:
+            os.environ.setdefault(name, "1")
+
+
+def check_optimizer(optimizer, budget, max_steps=None):
+    """在进入进程池之前检查 optimizer 名字、budget 和 max_steps，避免错误在每个 worker 里才抛出"""
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer: {optimizer}, expected one of {list(OPTIMIZERS)}")
+    if optimizer == "anneal" and not budget and not max_steps:
+        raise ValueError("optimizer='anneal' needs a budget (seconds per task) or max_steps")
+    if max_steps is not None and optimizer != "anneal":
+        raise ValueError("max_steps only applies to optimizer='anneal'")
+
+
+def optimize_task(task):
+    """
+    一次起点：按 seed 打乱题目的行、重新取基，再用 optimizer 优化。
+    task = (name, seed, rank, optimizer, budget, deadline, max_steps)，budget 为本任务的秒数、deadline 为共同的截止时刻，
+    max_steps 为退火的步数上限，都可以为 None。只按步数停止（不设时间）时结果只取决于种子。
+    只传题目名和种子，矩阵取自进程内共享的 _shared_matrices；返回的 order 为打乱顺序，父进程据此重建 final_wc。
+    """
+    name, seed, rank, optimizer, budget, deadline, max_steps = task
+    start_cpu = time.process_time()
+    if budget is not None:
+        deadline = min(deadline or math.inf, time.time() + budget)
+    matrix = _shared_matrices[name]
+    order = list(range(len(matrix)))
+    random.Random(seed).shuffle(order)
+    matrix = matrix[order]
+    basis_indices = get_basis(matrix, rank)
+    rng = np.random.default_rng(zlib.crc32(seed.encode("utf-8")))
+    if max_steps is not None:
+        result = OPTIMIZERS[optimizer](matrix, rank, basis_indices, rng, deadline, max_steps=max_steps)
+    else:
+        result = OPTIMIZERS[optimizer](matrix, rank, basis_indices, rng, deadline)
+    result["states"] = result["states"].tolist()
+    result["order"] = order
+    result["cpu_seconds"] = time.process_time() - start_cpu
+    return name, result
+
+
+def multi_start(pool, name, rank, optimizer="anneal", starts=8, budget=10.0, seed=0, max_steps=None):
+    """
+    在进程池里并行跑 starts 个带种子的起点（池须用 _init_balance_worker 初始化），共用 budget 秒的截止时间。
+    返回最好的结果（Jaccard 相同时取序号最小的起点），time_to_best 为从开始到该起点得到它的秒数，
+    cpu_seconds 为各起点的 CPU 时间之和。budget=None 且退火只按 max_steps 停止时，结果只取决于 seed。
+    """
+    check_optimizer(optimizer, budget, max_steps)
+    launch_time = time.time()
+    deadline = launch_time + budget if budget else None
+    tasks = [(name, f"{seed}-{start}-{name}", rank, optimizer, None, deadline, max_steps) for start in range(starts)]
+    results = [result for _, result in pool.imap(optimize_task, tasks)]
+    best = min(results, key=lambda result: result["value"])
+    best["time_to_best"] = best["best_time"] - launch_time
+    best["wall_seconds"] = time.time() - launch_time
+    best["cpu_seconds"] = sum(result["cpu_seconds"] for result in results)
+    best["starts"] = starts
+    return best
+
+
+def read_checkpoint_records(path):
+    """读 better_problem 的 jsonl 记录；进程被杀时最后一行可能只写了一半，截掉它以便续写"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    if end != len(data):
+        with open(path, "rb+") as f:
+            f.truncate(end)
+    return [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line.strip()]
+
+
+def save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
 
 PATH = "/data/TestcaseBenchmark/final/data/0903/"
-def better_problem(var_threshold=0, source_file="init.json", output_file="balance_v1.0.json", balance_metric="jaccard"):
+def better_problem(var_threshold=0, source_file="init.json", output_file="balance_v1.0.json", balance_metric="jaccard",
+                   max_turns=10000, patience=50, seed=0, processes=None, resume=False, optimizer="greedy", budget=None):
+    """
+    反复打乱每个未收敛题目的行顺序、重新取基并用 optimizer（OPTIMIZERS 中的名字，默认贪心）优化，保留最好的结果。
+    budget 为每个任务的秒数上限，"anneal" 必须设置。
+    每个题目记录重启次数（restarts）和连续没有改进的重启次数（stale），stale 达到 patience 即视为收敛，不再重启。
+    每次改进追加到 jsonl，每轮结束写 checkpoint（轮数和计数器）；resume=True 时重放 jsonl 里的改进并从上次的轮数继续。
+    """
+    check_optimizer(optimizer, budget)
     ds = json.load(open(PATH + source_file))
-    turn = 0
-    writer = open((PATH + output_file).replace("json", "jsonl"), "w")
+    jsonl_path = (PATH + output_file).replace("json", "jsonl")
+    checkpoint_path = (PATH + output_file).replace(".json", ".checkpoint.json")
     if balance_metric == "jaccard":
         balance_states_name = "balance_jaccard_row_sum"
         balance_value_name = "balance_jaccard"
@@ -112,49 +304,75 @@ def better_problem(var_threshold=0, source_file="init.json", output_file="balanc
     else:
         raise ValueError(f"Unknown balance_metric: {balance_metric}")
     logger = setup_logger()
-    logger.info(f"Starting better_problem with balance_metric={balance_metric}, var_threshold={var_threshold}")
-    
-    while turn < 10000:
-        turn += 1
-        logger.info(f"Turn {turn}...")
-        infos = []
-        for k, p in ds.items():
-            if balance_value_name not in p:
-                value_name = balance_metric
-            else:
-                value_name = balance_value_name
-            
-            if p[value_name] <= var_threshold or p["rank"] == len(p["wc"]):
-                continue
-            final_wc = p["wc"].copy()
-            random.shuffle(final_wc)
-            matrix = transform2matrix(final_wc)
-            basis_indices = get_basis(matrix, p["rank"])
-            infos.append([p["name"], matrix, p["rank"], basis_indices, balance_metric])
-        logger.info(f"Processing {len(infos)} problems with {balance_value_name} > {var_threshold}...")
-        if not infos:
-            logger.info("No more problems to process.")
-            break
-        pool = Pool(cpu_count()-4)
-        processed_count = 0
-        for name, basis, var, matrix_column_sum, matrix in tqdm(pool.imap_unordered(find_balance, infos), total=len(infos)):
-        # for name, basis, var, matrix_column_sum in tqdm(find_balance(info) for info in infos):
-            if balance_value_name not in ds[name]:
-                value_name = balance_metric
-            else:
-                value_name = balance_value_name
-            if var < ds[name][value_name]:
-                # print(f"{name}: {ds[name][balance_value_name] if balance_value_name in ds[name] else None} -> {var}", flush=True)
-                logger.info(f"{name}: {ds[name][value_name]} -> {var}")
-                final_wc = transform2aw(matrix)
-                ds[name][balance_wc_name] = final_wc
-                ds[name][balance_basis_name] = basis
-                ds[name][balance_value_name] = var
-                ds[name][balance_states_name] = matrix_column_sum
-                writer.write(json.dumps(ds[name]) + "\n")
-                processed_count += 1
-        logger.info(f"Turn {turn} completed. Updated {processed_count} problems.")
-    
+    logger.info(f"Starting better_problem with balance_metric={balance_metric}, var_threshold={var_threshold}, patience={patience}")
+
+    turn = 0
+    restarts = {name: 0 for name in ds}
+    stale = {name: 0 for name in ds}
+    if resume:
+        records = read_checkpoint_records(jsonl_path)
+        for record in records:
+            ds[record["name"]] = record
+        if os.path.exists(checkpoint_path):
+            checkpoint = json.load(open(checkpoint_path))
+            turn = checkpoint["turn"]
+            restarts.update(checkpoint["restarts"])
+            stale.update(checkpoint["stale"])
+        logger.info(f"Resuming from turn {turn} with {len(records)} recorded improvements")
+    writer = open(jsonl_path, "a" if resume else "w")
+
+    # 矩阵只在进程池启动时传给每个工作进程一次，任务里只有题目名和种子
+    matrices = {p["name"]: BitMatrix.from_aw(p["wc"]) for p in ds.values()}
+    if processes is None:
+        processes = max(1, cpu_count() - 4)
+    with Pool(processes, initializer=_init_balance_worker, initargs=(matrices,)) as pool:
+        while turn < max_turns:
+            turn += 1
+            logger.info(f"Turn {turn}...")
+            tasks = []
+            converged = 0
+            for k, p in ds.items():
+                if balance_value_name not in p:
+                    value_name = balance_metric
+                else:
+                    value_name = balance_value_name
+
+                if p[value_name] <= var_threshold or p["rank"] == len(p["wc"]):
+                    continue
+                if stale[p["name"]] >= patience:
+                    converged += 1
+                    continue
+                tasks.append((p["name"], f"{seed}-{turn}-{p['name']}", p["rank"], optimizer, budget, None, None))
+            logger.info(f"Processing {len(tasks)} problems with {balance_value_name} > {var_threshold} ({converged} converged after {patience} restarts without improvement)...")
+            if not tasks:
+                logger.info("No more problems to process.")
+                break
+            processed_count = 0
+            for name, result in tqdm(pool.imap_unordered(optimize_task, tasks), total=len(tasks)):
+                order, basis, var, matrix_column_sum = result["order"], result["basis"], result["value"], result["states"]
+                restarts[name] += 1
+                if balance_value_name not in ds[name]:
+                    value_name = balance_metric
+                else:
+                    value_name = balance_value_name
+                if var < ds[name][value_name]:
+                    logger.info(f"{name}: {ds[name][value_name]} -> {var} (restart {restarts[name]})")
+                    final_wc = [ds[name]["wc"][i] for i in order]
+                    ds[name][balance_wc_name] = final_wc
+                    ds[name][balance_basis_name] = basis
+                    ds[name][balance_value_name] = var
+                    ds[name][balance_states_name] = matrix_column_sum
+                    writer.write(json.dumps(ds[name]) + "\n")
+                    writer.flush()
+                    stale[name] = 0
+                    processed_count += 1
+                else:
+                    stale[name] += 1
+            os.fsync(writer.fileno())
+            save_checkpoint(checkpoint_path, {"turn": turn, "restarts": restarts, "stale": stale})
+            logger.info(f"Turn {turn} completed. Updated {processed_count} problems.")
+
+    writer.close()
     json.dump(ds, open(PATH + output_file, "w"), indent=4)
 
 
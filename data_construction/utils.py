@@ -1,7 +1,14 @@
 import numpy as np
 from typing import List
-import numpy as np
-from scipy.linalg import qr
+import ctypes
+import math
+import os
+import sys
+from functools import lru_cache
+
+# 编译 C 内核用的 cbuild.build_helper 在仓库根目录的 judge/ 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "judge"))
+
 
 def transform2matrix(s:List[str]) -> np.ndarray:
     matrix = []
@@ -12,6 +19,8 @@ def transform2matrix(s:List[str]) -> np.ndarray:
     return matrix_np
 
 def transform2aw(matrix:np.ndarray) -> List[str]:
+    if isinstance(matrix, BitMatrix):
+        return matrix.to_aw()
     aw_list = []
     for row in matrix:
         aw_str = ''.join(['W' if c == 1 else 'A' for c in row])
@@ -25,21 +34,522 @@ def print_aw(s:List[str]) -> List[str]:
         print(wc)
 
 
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount_sum(words):
+    """words（uint64）最后一维上的置位数之和"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    # numpy < 2.0：按字节查表
+    return _POPCOUNT_TABLE[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+class BitMatrix:
+    """
+    0/1 错误矩阵的位压缩表示：每行按列顺序压成 uint64 字（第 j 列为第 j // 64 个字的第 j % 64 位），
+    W 为 1、A 为 0，每个元素 1 bit（transform2matrix 的 int64 数组是 64 bit）。
+    用 matrix[indices] 取行，to_aw() 无损还原 A/W 字符串，cal_jaccard_similarity / get_rank / get_basis 等直接接受它。
+    """
+
+    def __init__(self, words, num_cols):
+        self.words = np.ascontiguousarray(words, dtype=np.uint64)
+        self.num_cols = int(num_cols)
+
+    @classmethod
+    def from_dense(cls, matrix):
+        matrix = np.asarray(matrix)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(matrix), -1)
+        num_rows, num_cols = matrix.shape
+        num_words = (num_cols + 63) // 64
+        packed = np.zeros((num_rows, num_words * 8), dtype=np.uint8)
+        packed[:, :(num_cols + 7) // 8] = np.packbits(matrix != 0, axis=1, bitorder="little")
+        return cls(packed.view("<u8").astype(np.uint64), num_cols)
+
+    @classmethod
+    def from_aw(cls, s:List[str]):
+        """A/W 字符串列表（等长）一次性转成位矩阵，'W' 为 1，其他字符为 0（与 transform2matrix 相同）"""
+        if not s:
+            return cls(np.zeros((0, 0), dtype=np.uint64), 0)
+        num_cols = len(s[0])
+        if any(len(wc) != num_cols for wc in s):
+            raise ValueError("A/W strings have different lengths")
+        chars = np.frombuffer("".join(s).encode("ascii"), dtype=np.uint8).reshape(len(s), num_cols)
+        return cls.from_dense(chars == ord("W"))
+
+    @property
+    def shape(self):
+        return (self.words.shape[0], self.num_cols)
+
+    def __len__(self):
+        return self.words.shape[0]
+
+    def __getitem__(self, rows):
+        """按行取子矩阵（下标数组、切片或布尔掩码），只支持行方向"""
+        if isinstance(rows, tuple):
+            rows, columns = rows
+            if not (isinstance(columns, slice) and columns == slice(None)):
+                raise IndexError("BitMatrix only supports row indexing")
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        return BitMatrix(self.words[rows], self.num_cols)
+
+    def to_dense(self, dtype=np.int64):
+        bits = np.unpackbits(self.words.astype("<u8").view(np.uint8), axis=1, count=self.num_cols, bitorder="little")
+        return bits.reshape(len(self), self.num_cols).astype(dtype)
+
+    def to_aw(self) -> List[str]:
+        chars = np.where(self.to_dense(np.uint8) == 1, ord("W"), ord("A")).astype(np.uint8)
+        text = chars.tobytes().decode("ascii")
+        return [text[i * self.num_cols:(i + 1) * self.num_cols] for i in range(len(self))]
+
+    def row_sums(self):
+        return popcount_sum(self.words)
+
+    def column_sums(self):
+        return self.to_dense(np.int64).sum(axis=0)
+
+    def intersections(self, other=None):
+        """len(self) x len(other) 的交集大小（按位与后数 1 的个数），分块计算控制内存"""
+        other = self if other is None else other
+        result = np.empty((len(self), len(other)), dtype=np.int64)
+        block = max(1, (1 << 22) // max(1, len(other) * self.words.shape[1]))
+        for start in range(0, len(self), block):
+            chunk = self.words[start:start + block, None, :] & other.words[None, :, :]
+            result[start:start + block] = popcount_sum(chunk)
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, BitMatrix) and self.num_cols == other.num_cols and np.array_equal(self.words, other.words)
+
+    def __repr__(self):
+        return f"BitMatrix(shape={self.shape})"
+
+
+# 精确秩：整数矩阵在素数 p 下消元，模 p 的秩不会超过有理数域上的秩 r，且只有 p 整除所有 r 阶子式时才会变小。
+# 所有试过的素数都给出 <= k 时，若真实秩 > k，这些素数都整除某个非零的 (k+1) 阶子式，
+# 所以素数之积超过 (k+1) 阶子式的 Hadamard 界时 k 就是精确的。
+# 素数 < 2^26：乘积 < 2^52，int64 里可以累加上千次再取模。
+PRIME_LIMIT = 1 << 26
+# 需要的素数超过这个数量时改用 Bareiss 无分数消元
+MAX_PRIMES = 64
+RANK_MODP_SRC = r"""
+#include <stdint.h>
+
+/* int64 里累加这么多个 (< 2^52) 乘积后整行取一次模 */
+#define LAZY_REDUCE_EVERY 1024
+
+static int64_t inv_mod(int64_t a, int64_t p) {
+    int64_t result = 1, e = p - 2;
+    a %= p;
+    while (e) {
+        if (e & 1) result = result * a % p;
+        a = a * a % p;
+        e >>= 1;
+    }
+    return result;
+}
+
+/* 非负的 v 对 p 取模，用浮点倒数估商代替整数除法（商的误差不超过 1） */
+static inline int64_t mod_p(int64_t v, int64_t p, double inv_p) {
+    int64_t r = v - (int64_t)((double)v * inv_p) * p;
+    if (r < 0) r += p;
+    if (r >= p) r -= p;
+    return r;
+}
+
+/*
+ * 按行顺序贪心选出模 p 线性无关的行，返回个数，selected 依次写入行下标。
+ * basis: max_rank x m 工作区（归一化的梯形行），pivots: max_rank，x: m。选够 max_rank 行即停止。
+ */
+int64_t greedy_rows_mod_p(const int64_t *a, int64_t n, int64_t m, int64_t p, int64_t max_rank,
+                          int64_t *selected, int64_t *basis, int64_t *pivots, int64_t *x) {
+    const double inv_p = 1.0 / (double)p;
+    int64_t rank = 0;
+    for (int64_t i = 0; i < n && rank < max_rank; i++) {
+        const int64_t *row = a + i * m;
+        for (int64_t j = 0; j < m; j++) {
+            int64_t v = row[j];
+            x[j] = (v >= 0 && v < p) ? v : ((v % p) + p) % p;
+        }
+        int64_t pending = 0;
+        for (int64_t k = 0; k < rank; k++) {
+            int64_t f = mod_p(x[pivots[k]], p, inv_p);
+            if (f == 0) continue;
+            f = p - f;
+            const int64_t *b = basis + k * m;
+            for (int64_t j = 0; j < m; j++) x[j] += f * b[j];
+            if (++pending == LAZY_REDUCE_EVERY) {
+                for (int64_t j = 0; j < m; j++) x[j] = mod_p(x[j], p, inv_p);
+                pending = 0;
+            }
+        }
+        int64_t pivot = -1;
+        for (int64_t j = 0; j < m; j++) {
+            x[j] = mod_p(x[j], p, inv_p);
+            if (pivot < 0 && x[j]) pivot = j;
+        }
+        if (pivot < 0) continue;
+        int64_t inv = inv_mod(x[pivot], p);
+        int64_t *b = basis + rank * m;
+        for (int64_t j = 0; j < m; j++) b[j] = mod_p(x[j] * inv, p, inv_p);
+        pivots[rank] = pivot;
+        selected[rank] = i;
+        rank++;
+    }
+    return rank;
+}
+"""
+
+_kernel = None
+
+
+def _is_prime(n):
+    if n < 2 or n % 2 == 0:
+        return n == 2
+    q = 3
+    while q * q <= n:
+        if n % q == 0:
+            return False
+        q += 2
+    return True
+
+
+@lru_cache(maxsize=None)
+def large_primes(count=MAX_PRIMES):
+    primes = []
+    n = PRIME_LIMIT - 1
+    while len(primes) < count:
+        if _is_prime(n):
+            primes.append(n)
+        n -= 2
+    return tuple(primes)
+
+
+def _get_kernel():
+    """编译 RANK_MODP_SRC（用 cbuild.build_helper，与 runner 的启动器一样只编译一次并缓存），编译不了时为 None，退回 numpy 实现"""
+    global _kernel
+    if _kernel is None:
+        _kernel = False
+        try:
+            from cbuild import build_helper
+            path = build_helper("rank-modp.so", RANK_MODP_SRC, [["-O3", "-shared", "-fPIC"], ["-O2", "-shared", "-fPIC"]])
+        except Exception:
+            path = None
+        if path:
+            lib = ctypes.CDLL(path)
+            lib.greedy_rows_mod_p.restype = ctypes.c_int64
+            lib.greedy_rows_mod_p.argtypes = [ctypes.c_void_p] + [ctypes.c_int64] * 4 + [ctypes.c_void_p] * 4
+            _kernel = lib
+    return _kernel or None
+
+
+def _integer_matrix(matrix):
+    """转成 C 连续的 int64 二维数组；不是整数矩阵时返回 None"""
+    if isinstance(matrix, BitMatrix):
+        return matrix.to_dense()
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    if not (np.issubdtype(matrix.dtype, np.integer) or matrix.dtype == bool):
+        rounded = np.rint(matrix)
+        if not np.array_equal(rounded, matrix):
+            return None
+        matrix = rounded
+    return np.ascontiguousarray(matrix, dtype=np.int64)
+
+
+def unique_rows(matrix):
+    """
+    去掉全零行和重复行，返回 (去重后的矩阵, 每行第一次出现的下标)，保持原来的行顺序。
+    0/1 矩阵按 np.packbits 压缩成字节后比较。
+    """
+    if matrix.shape[0] == 0 or matrix.shape[1] == 0:
+        return matrix[:0], np.zeros(0, dtype=np.int64)
+    if ((matrix == 0) | (matrix == 1)).all():
+        keys = np.packbits(matrix.astype(bool), axis=1)
+    else:
+        keys = matrix
+    keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+    _, first = np.unique(keys, return_index=True)
+    first = np.sort(first)
+    first = first[matrix[first].any(axis=1)]
+    return matrix[first], first
+
+
+def hadamard_bits(matrix):
+    """
+    返回数组 bits，bits[k - 1] 为任一 k 阶子式绝对值的 log2 上界（Hadamard 不等式）：
+    范数最大的 k 行（或 k 列）范数之积，行、列两个方向取较小值。
+    """
+    squares = matrix * matrix
+    size = min(matrix.shape)
+    row_norms = np.sort(squares.sum(axis=1))[::-1][:size]
+    col_norms = np.sort(squares.sum(axis=0))[::-1][:size]
+    bounds = np.minimum(np.log2(np.maximum(row_norms, 1)).cumsum(), np.log2(np.maximum(col_norms, 1)).cumsum())
+    return 0.5 * bounds
+
+
+def eliminate_mod_p(matrix, p):
+    """numpy 版本：matrix 的列按顺序做模 p 消元，返回主元列下标（编译不了 C 内核时使用）"""
+    m = matrix % p
+    n_rows, n_cols = m.shape
+    pivots = []
+    row = 0
+    for col in range(n_cols):
+        if row == n_rows:
+            break
+        nonzero = np.nonzero(m[row:, col])[0]
+        if len(nonzero) == 0:
+            continue
+        pivot = row + nonzero[0]
+        if pivot != row:
+            m[[row, pivot]] = m[[pivot, row]]
+        below = row + 1 + np.nonzero(m[row + 1:, col])[0]
+        if len(below):
+            m[below] = (m[below] * m[row, col] - m[below, col:col + 1] * m[row]) % p
+        pivots.append(col)
+        row += 1
+    return pivots
+
+
+def independent_rows(matrix, p, max_rank=None):
+    """按行顺序贪心选出模 p 线性无关的行（在有理数域上也无关），最多 max_rank 行，返回行下标列表"""
+    n, m = matrix.shape
+    if max_rank is None:
+        max_rank = min(n, m)
+    max_rank = min(max_rank, n, m)
+    if max_rank == 0:
+        return []
+    kernel = _get_kernel()
+    if kernel is None:
+        return eliminate_mod_p(matrix.T, p)[:max_rank]
+    # selected / pivots / x / basis 放在同一块工作区里，只取一次指针（ctypes 取指针比较慢）
+    work = np.empty(2 * max_rank + m + max_rank * m, dtype=np.int64)
+    address = work.ctypes.data
+    item = work.itemsize
+    rank = kernel.greedy_rows_mod_p(
+        matrix.ctypes.data, n, m, p, max_rank,
+        address, address + (2 * max_rank + m) * item, address + max_rank * item, address + 2 * max_rank * item
+    )
+    return work[:rank].tolist()
+
+
+def bareiss_rank(matrix):
+    """Bareiss 无分数消元（Python 大整数），精确但慢，素数不够用时的退路"""
+    m = [[int(x) for x in row] for row in matrix]
+    n_rows = len(m)
+    n_cols = len(m[0]) if n_rows else 0
+    rank = 0
+    prev = 1
+    for col in range(n_cols):
+        if rank == n_rows:
+            break
+        pivot = next((r for r in range(rank, n_rows) if m[r][col] != 0), None)
+        if pivot is None:
+            continue
+        m[rank], m[pivot] = m[pivot], m[rank]
+        for r in range(rank + 1, n_rows):
+            for c in range(col + 1, n_cols):
+                m[r][c] = (m[r][c] * m[rank][col] - m[r][col] * m[rank][c]) // prev
+            m[r][col] = 0
+        prev = m[rank][col]
+        rank += 1
+    return rank
+
+
 def get_rank(matrix):
-    rank = np.linalg.matrix_rank(matrix)
-    return rank.item()
+    """
+    matrix 在有理数域上的精确秩（替代浮点 SVD 的 np.linalg.matrix_rank）。
+    模一个素数消元，满秩即返回；否则继续换素数取最大值，直到素数之积超过 Hadamard 界。
+    """
+    integer_matrix = _integer_matrix(matrix)
+    if integer_matrix is None:
+        return np.linalg.matrix_rank(matrix).item()
+    rows = integer_matrix
+    # 行数远多于列数时（大量代码错误模式相同）先去重，消元的规模只剩不同的模式数
+    if rows.shape[0] > 2 * rows.shape[1]:
+        rows, _ = unique_rows(rows)
+    # 行多列少时选够列数个无关行就能提前结束
+    if rows.shape[0] < rows.shape[1]:
+        rows = np.ascontiguousarray(rows.T)
+    rank_bound = min(rows.shape)
+    rank = 0
+    bits = 0.0
+    bits_needed = None
+    for p in large_primes():
+        rank = max(rank, len(independent_rows(rows, p, rank_bound)))
+        if rank == rank_bound:
+            return rank
+        if bits_needed is None:
+            bits_needed = hadamard_bits(rows)
+        bits += math.log2(p)
+        if bits > bits_needed[rank]:
+            return rank
+    return bareiss_rank(rows)
 
 
 def get_basis(matrix, rank=None):
+    """
+    返回 rank 个线性无关行的下标：按行顺序贪心取与前面已选行无关的行。
+    模 p 下无关的整数行在有理数域上也无关，所以只需换素数直到选够 rank 行。
+    注意与原来列主元 QR（按列范数选主元）选出的基不同：现在总是取最靠前的无关行，
+    solve / verify 的初始基（以及由它开始的 find_balance 结果）会随之变化。
+    """
     if rank is None:
         rank = get_rank(matrix)
-    q, r, p = qr(matrix.T, pivoting=True)
-    basis_indices = p[:rank]
-    return basis_indices.tolist()
+    integer_matrix = _integer_matrix(matrix)
+    if integer_matrix is None:
+        # 非整数矩阵沿用列主元 QR
+        from scipy.linalg import qr
+        q, r, p = qr(np.asarray(matrix).T, pivoting=True)
+        return p[:rank].tolist()
+    rows, first = unique_rows(integer_matrix)
+    selected = []
+    for p in large_primes():
+        selected = independent_rows(rows, p, rank)
+        if len(selected) >= rank:
+            break
+    return first[selected].tolist()
+
+
+# 基变换（find_balance 的换行检查）：basis 为 matrix 行空间的一组基（r 行），每一行 x_k 都能唯一写成 x_k = sum_l c[k, l] * basis_l，
+# 把第 l 个基行换成第 k 行后仍满秩 <=> c[k, l] != 0。
+# c[k, l] = D / det(B_P)，D 为把 B_P（基在 r 个主元列上的子方阵）第 l 行换成 x_k 的 r 阶子式，所以在素数 p 下
+# c[k, l] 非零 <=> p 不整除 D。对若干素数维护模 p 的系数矩阵：任一素数下非零即可换；
+# 所有素数下都为零且素数之积超过 r 阶子式的 Hadamard 界时 D = 0，确实不能换。
+def matmul_mod_p(a, b, p):
+    """(a @ b) % p，a、b 的元素先取模到 [0, p)，按 1024 列一段累加，int64 不会溢出"""
+    a = a % p
+    b = b % p
+    result = np.zeros((a.shape[0], b.shape[1]), dtype=np.int64)
+    for start in range(0, a.shape[1], 1024):
+        result = (result + a[:, start:start + 1024] @ b[start:start + 1024]) % p
+    return result
+
+
+def inverse_mod_p(a, p):
+    """方阵 a 模 p 的逆（Gauss-Jordan），奇异时返回 None"""
+    n = a.shape[0]
+    m = np.concatenate([a % p, np.eye(n, dtype=np.int64)], axis=1)
+    for col in range(n):
+        nonzero = np.nonzero(m[col:, col])[0]
+        if len(nonzero) == 0:
+            return None
+        pivot = col + nonzero[0]
+        if pivot != col:
+            m[[col, pivot]] = m[[pivot, col]]
+        m[col] = m[col] * pow(int(m[col, col]), p - 2, p) % p
+        factors = m[:, col:col + 1].copy()
+        factors[col] = 0
+        m = (m - factors * m[col]) % p
+    return m[:, n:]
+
+
+def _exchange_coefficients(matrix, basis, p):
+    """所有行在 basis 下的坐标（模 p，n x r）；basis 模 p 不满秩时返回 None"""
+    rows = matrix[basis] % p
+    columns = independent_rows(np.ascontiguousarray(rows.T), p, len(basis))
+    if len(columns) < len(basis):
+        return None
+    inverse = inverse_mod_p(rows[:, columns], p)
+    if inverse is None:
+        return None
+    return matmul_mod_p(matrix[:, columns], inverse, p)
+
+
+def init_exchange(matrix, basis):
+    """
+    为 matrix（整数矩阵）和它行空间的一组基 basis（行下标）建立基变换状态，
+    之后用 swappable / exchange_rows 查询和执行换行，不必每次重新求秩。
+    """
+    integer_matrix = _integer_matrix(matrix)
+    if integer_matrix is None:
+        raise ValueError("basis exchange needs an integer matrix")
+    basis = [int(i) for i in basis]
+    exchange = {"matrix": integer_matrix, "basis": basis, "coefficients": {}, "swappable": None}
+    if not basis:
+        exchange["bits_needed"] = 0.0
+        return exchange
+    exchange["bits_needed"] = float(hadamard_bits(integer_matrix)[len(basis) - 1])
+    _fill_primes(exchange)
+    return exchange
+
+
+def _fill_primes(exchange):
+    """补足素数，使所用素数之积超过 Hadamard 界；基在某个素数下奇异时跳过该素数"""
+    bits = sum(math.log2(p) for p in exchange["coefficients"])
+    for p in large_primes():
+        if bits > exchange["bits_needed"]:
+            return
+        if p in exchange["coefficients"]:
+            continue
+        coefficients = _exchange_coefficients(exchange["matrix"], exchange["basis"], p)
+        if coefficients is not None:
+            exchange["coefficients"][p] = coefficients
+            bits += math.log2(p)
+    raise ValueError("basis exchange: not enough primes for the Hadamard bound")
+
+
+def swappable(exchange):
+    """n x r 的布尔矩阵：[k, l] 为真表示把第 l 个基行换成第 k 行后仍是一组基"""
+    if exchange["swappable"] is None:
+        mask = np.zeros((exchange["matrix"].shape[0], len(exchange["basis"])), dtype=bool)
+        for coefficients in exchange["coefficients"].values():
+            mask |= coefficients != 0
+        exchange["swappable"] = mask
+    return exchange["swappable"]
+
+
+def exchange_rows(exchange, i_idx, j):
+    """把第 i_idx 个基行换成第 j 行（须 swappable(exchange)[j, i_idx] 为真），按主元更新各素数下的坐标"""
+    coefficients = exchange["coefficients"]
+    exchange["basis"][i_idx] = int(j)
+    exchange["swappable"] = None
+    for p in list(coefficients):
+        c = coefficients[p]
+        pivot = int(c[j, i_idx])
+        if pivot == 0:
+            # 该素数整除新基的主子式，换一个素数重新建立
+            del coefficients[p]
+            continue
+        column = c[:, i_idx] * pow(pivot, p - 2, p) % p
+        c = (c - column[:, None] * c[j]) % p
+        c[:, i_idx] = column
+        coefficients[p] = c
+    _fill_primes(exchange)
+
+
+def jaccard_columns(matrix, rows, row_sums=None):
+    """
+    matrix 每一行与 rows 中各行的 Jaccard 相似度（n x len(rows)），元素与 cal_jaccard_similarity 的逐项结果相同，
+    行与自身的相似度记为 0。row_sums 为 matrix.sum(axis=1)，可以预先算好传入。
+    """
+    rows = np.asarray(rows)
+    if isinstance(matrix, BitMatrix):
+        if row_sums is None:
+            row_sums = matrix.row_sums()
+        intersection = matrix.intersections(matrix[rows])
+    else:
+        if row_sums is None:
+            row_sums = matrix.sum(axis=1)
+        intersection = matrix @ matrix[rows].T
+    union = row_sums[:, None] + row_sums[rows][None, :] - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union == 0, 1.0, intersection / union)
+    jaccard[rows, np.arange(len(rows))] = 0
+    return jaccard
+
 
 def cal_jaccard_similarity(temp_matrix):
-    intersection_matrix = temp_matrix @ temp_matrix.T
-    row_sums = np.sum(temp_matrix, axis=1, keepdims=True)
+    if isinstance(temp_matrix, BitMatrix):
+        # 交集为按位与后的置位数，结果与稠密矩阵逐位相同
+        intersection_matrix = temp_matrix.intersections()
+        row_sums = temp_matrix.row_sums()[:, None]
+    else:
+        intersection_matrix = temp_matrix @ temp_matrix.T
+        row_sums = np.sum(temp_matrix, axis=1, keepdims=True)
     union_matrix = row_sums + row_sums.T - intersection_matrix
     jaccard_matrix = np.where(union_matrix == 0, 1.0, intersection_matrix / union_matrix)
     np.fill_diagonal(jaccard_matrix, 0)
@@ -10,14 +10,14 @@ def verify_balance(input_file = ""):
             final_jaccard_wc = v["wc"]
             basis = v["basis_indices"]
             tmp_wc = [final_jaccard_wc[i] for i in basis]
-            tmp_matrix = transform2matrix(tmp_wc)
+            tmp_matrix = BitMatrix.from_aw(tmp_wc)
             balance_jaccard_row_sum = v["jaccard_row_sum"]
         else:
             balance_value = v["balance_jaccard"]
             final_jaccard_wc = v["final_jaccard_wc"]
             basis = v["balance_jaccard_basis"]
             tmp_wc = [final_jaccard_wc[i] for i in basis]
-            tmp_matrix = transform2matrix(tmp_wc)
+            tmp_matrix = BitMatrix.from_aw(tmp_wc)
             balance_jaccard_row_sum = v["balance_jaccard_row_sum"]
 
         balance_states, calculated_balance_value = cal_jaccard_similarity(tmp_matrix)
@@ -1,10 +1,19 @@
 import subprocess
 import tempfile
 import os
+import sys
 import resource
 import uuid
 import json
 
+# runner / compile_cache / async_engine / time_limits 与 data_construction/ 共用，放在仓库根目录的 judge/ 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "judge"))
+
+from runner import execute_steps, OLE_RETURNCODE
+from output_compare import outputs_match
+from test_store import StoredTests
+from time_limits import effective_timeout
+
 import random
 from decimal import Decimal
 import decimal
@@ -96,8 +105,57 @@ def is_decimal(s):
         
     return bool(re.match(r"^-?\d+\.\d+$", s))
 
+# --lazy_sample 时没有被 get_rank_result 抽到、因此跳过执行的测试
+NOT_RUN = "NR"
+# 超过 TLE 预算（infos["tle_budget"]）后没有执行、推断为 TLE 的测试；统计时按 TLE 计
+TLE_SKIPPED = "TLE_SKIP"
+
+def iter_testcases(test_cases, test_order=None):
+    """
+    按 test_order（原始下标，None 为文件顺序）产出 (下标, 输入, 期望输出)。
+    StoredTests 直接给出 mmap 里的 memoryview，不经过 str 解码；其余非 str 值与 test_store 一样转成 str
+    """
+    if test_order is None:
+        test_order = range(len(test_cases))
+    for idx in test_order:
+        if isinstance(test_cases, StoredTests):
+            input_data, output_data = test_cases.raw(idx)
+        else:
+            testcase = test_cases[idx]
+            if isinstance(testcase["input"], dict):
+                testcase = testcase["input"]
+            input_data, output_data = testcase["input"], testcase["output"]
+            if not isinstance(input_data, str):
+                input_data = str(input_data)
+            if not isinstance(output_data, str):
+                output_data = str(output_data)
+        yield idx, input_data, output_data
+
+def usage_fields(usage):
+    """runs 条目末尾的 [user CPU 秒, sys CPU 秒, 峰值 RSS KB]，拿不到 rusage 时为 None"""
+    if usage is None:
+        return [None, None, None]
+    return [round(usage.user, 6), round(usage.sys, 6), usage.maxrss_kb]
+
+def count_judged_testcases(test_cases):
+    """与 run_cpp_code_linux 的跳过规则一致（空输出的测试不评测），即完整运行时 status 列表的长度"""
+    count = 0
+    for testcase in test_cases:
+        if isinstance(testcase["input"], dict):
+            testcase = testcase["input"]
+        if testcase["output"] != "":
+            count += 1
+    return count
+
 import time
 def run_cpp_code_linux(infos, test_mode = False):
+    return execute_steps(run_cpp_code_steps(infos, test_mode))
+
+def run_cpp_code_steps(infos, test_mode = False):
+    """
+    run_cpp_code_linux 的判题过程。编译和运行测试不在这里执行，而是 yield 给驱动方：
+    runner.execute_steps（同步，Pool 引擎）或 async_engine（asyncio 引擎），结果结构相同。
+    """
     code = infos["code"]
     time_limit = infos["time_limit"]
     memory_limit = infos["memory_limit"]
@@ -105,61 +163,67 @@ def run_cpp_code_linux(infos, test_mode = False):
     infos["error"] = []
     infos["details"] = []
     infos["types"] = []
+    # 每个实际执行的测试记录 [测试下标, 结果, wall 秒, user CPU 秒, sys CPU 秒, 峰值 RSS KB]，
+    # kill_history 和 save_results 的资源统计用它
+    infos["runs"] = []
 
-    if isinstance(test_cases, str):
+    if infos.get("test_store"):
+        # parallel_exe.py 预先写好的共享测试 blob，只传路径
+        test_cases = StoredTests(infos["test_store"])
+    elif isinstance(test_cases, str):
         test_cases = get_testcases(test_cases)
-
+    # status 列表下标（跳过空输出后的序号）集合，None 表示全部执行
+    test_indices = infos.get("test_indices")
+    if test_indices is not None:
+        test_indices = set(test_indices)
+    # 测试执行顺序（原始下标），fail-fast 时按历史击杀率排序，None 表示文件顺序
+    ordered_cases = iter_testcases(test_cases, infos.get("test_order"))
+    # TLE 预算：累计（tle_consecutive 时为连续）tle_budget 个 TLE 后，剩下的测试不再执行，记为 TLE_SKIP；0 表示不限
+    tle_budget = infos.get("tle_budget", 0)
+    tle_consecutive = infos.get("tle_consecutive", False)
+    tle_count = 0
 
     with tempfile.TemporaryDirectory() as tmpdirname:
-        unique_id = uuid.uuid4()
-        cpp_file = os.path.join(tmpdirname, f"{unique_id}.cpp")
-        exe_file = os.path.join(tmpdirname, f"{unique_id}.out")
-
-        # Write C++ code to file
-        with open(cpp_file, "w") as f:
-            f.write(code)
-
-        # Compile the C++ code
-        # Compile the C++ code
+        # Compile the C++ code (相同源码/编译器/参数命中 compile_cache 时直接复用)
         optimization_level = infos['compileAndRunOptions']['O']
         if optimization_level == "fast":
             optimization_level = "2"
-        compile_result = subprocess.run(
-            ["g++", f"-O{optimization_level}", cpp_file, "-o", exe_file, f"-std={infos['compileAndRunOptions']['std']}"],
-            capture_output=True,
-            text=True
-        )
+        flags = [f"-O{optimization_level}", f"-std={infos['compileAndRunOptions']['std']}"]
+        compile_seconds, (exe_file, compile_stderr) = yield ("compile", code, flags, tmpdirname)
+        infos["compile_seconds"] = round(compile_seconds, 6)
 
-        if compile_result.returncode != 0:
+        if exe_file is None:
             infos["error"].append("CE")
-            infos["details"].append(compile_result.stderr)
+            infos["details"].append(compile_stderr)
             return infos
 
         memory_kb = int(memory_limit) * 1024 * 5
-        time_limit_int = int(time_limit) // 1000 + 3
-        cmd = f"ulimit -t {time_limit_int} && ulimit -v {memory_kb} && {exe_file}"
+        # --time_limits 校准过的题目用 infos["timeout"]，否则为 time_limit // 1000 + 3
+        time_limit_int = effective_timeout(infos)
         
         # cmd = f"{exe_file}"
-        for idx, testcase in enumerate(test_cases):
-            if isinstance(testcase["input"], dict):
-                testcase = testcase["input"]
-            
-            input_string = testcase["input"]
-            output_string = testcase["output"]
+        pos = -1
+        for idx, input_data, output_data in ordered_cases:
             ## TODO：暂时跳过了，需要清理空缺输出的
-            if output_string == "":
+            if len(output_data) == 0:
+                continue
+            pos += 1
+            if test_indices is not None and pos not in test_indices:
+                if not test_mode:
+                    infos["error"].append(NOT_RUN)
+                    infos["details"].append(f"{NOT_RUN}: Testcase:{idx}")
+                continue
+
+            if tle_budget and tle_count >= tle_budget:
+                infos["error"].append(TLE_SKIPPED)
+                infos["details"].append(f"{TLE_SKIPPED}: Testcase:{idx}")
                 continue
 
             error = ""
+            elapsed, result = yield ("run", exe_file, input_data, time_limit_int, memory_kb)
             try:
-                result = subprocess.run(
-                        cmd,
-                        input=input_string,
-                        text=True,
-                        capture_output=True,
-                        shell=True,
-                        timeout=time_limit_int
-                    )
+                if isinstance(result, Exception):
+                    raise result
                 
                 # 检查返回码
                 if result.returncode != 0:
@@ -169,6 +233,9 @@ def run_cpp_code_linux(infos, test_mode = False):
                     elif result.returncode == 124:  # timeout命令的超时返回码
                         error = "TLE"
                         details = f"{error}: Testcase:{idx}"
+                    elif result.returncode == OLE_RETURNCODE:  # SIGXFSZ - 输出超过上限
+                        error = "OLE"
+                        details = f"{error}: Testcase:{idx}"
                     else:
                         error = "RE"
                         details = f"{error}: Testcase:{idx}"
@@ -183,29 +250,18 @@ def run_cpp_code_linux(infos, test_mode = False):
                 details = f"{error}: Testcase:{idx}"
             
             if not error:
-                if isinstance(output_string, float):
-                    output_string = str(output_string)
-                expected_lines = [line.strip() for line in output_string.splitlines()]
-                actual_lines = [line.strip() for line in result.stdout.splitlines()]
-
-                # 移除空行
-                expected_lines = [line for line in expected_lines if line]
-                actual_lines = [line for line in actual_lines if line]
-                
-                # ## 合并为一行
-                actual_lines = (" ".join(actual_lines)).strip()
-                expected_lines = (" ".join(expected_lines)).strip()
-
-                # ## 小数保留 6 位
-                if is_decimal(actual_lines) and is_decimal(expected_lines):
-                    if abs(float(actual_lines) - float(expected_lines)) > 1e-6:
-                        error = "WA"
-                        details = f"{error}: Testcase:{idx}"  
-                else:
-                    if actual_lines != expected_lines:
-                        error = "WA"
-                        details = f"{error}: Testcase:{idx}"
+                if isinstance(output_data, str):
+                    output_data = output_data.encode()
+                # 按空白切分逐 token 比较（小数逐个 token 允许 1e-6 误差），第一个不一致处即停止
+                if not outputs_match(result.stdout, output_data):
+                    error = "WA"
+                    details = f"{error}: Testcase:{idx}"
             
+            infos["runs"].append([idx, error or "AC", round(elapsed, 6), *usage_fields(getattr(result, "usage", None))])
+            if error == "TLE":
+                tle_count += 1
+            elif tle_consecutive:
+                tle_count = 0
             if error:
                 infos["error"].append(error)
                 infos["details"].append(details)
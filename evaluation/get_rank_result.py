@@ -1,22 +1,45 @@
 import json
+import zlib
 
 import random
 
-def get_random_indices(array_length, num_indices):
+import numpy as np
+
+from excute_tool_linux import TLE_SKIPPED, NOT_RUN
+from verdict_store import has_verdicts, load_verdicts, verdicts_prefix
+
+RANK_MULTIPLIERS = 5
+# 表格里的状态列，verdict 矩阵中状态编码为这里的下标（AC = 0）
+STATUS_NAMES = ["AC", "CE", "WA", "RE", "TLE", "MLE", "OLE", "EXE"]
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+STATUS_CODES[TLE_SKIPPED] = STATUS_CODES["TLE"]
+
+def get_random_indices(array_length, num_indices, rng=random):
     # 确保抽取的数量不超过数组长度
     if num_indices > array_length:
-        return random.sample(range(array_length), array_length)
+        return rng.sample(range(array_length), array_length)
 
     # 使用 random.sample 抽取指定数量的索引
-    indexs = random.sample(range(array_length), num_indices)
-    random.shuffle(indexs)
+    indexs = rng.sample(range(array_length), num_indices)
+    rng.shuffle(indexs)
     return indexs
 
+def get_problem_test_indices(problem_id, array_length, rank, seed=None):
+    """
+    每道题抽取 rank * RANK_MULTIPLIERS 个测试下标。
+    给定 seed 时每道题用独立的 random.Random(f"{seed}-{problem_id}")，抽样结果与题目顺序无关，
+    parallel_exe.py --lazy_sample 用同一个函数预先算出需要执行的测试。
+    seed 为 None 时沿用全局 random（原始行为）。
+    """
+    rng = random if seed is None else random.Random(f"{seed}-{problem_id}")
+    return get_random_indices(array_length, rank * RANK_MULTIPLIERS, rng)
+
 def find_first_non_ac(array):
     for element in array:
         if element != "AC":
-            return element
-    return "AC" 
+            # parallel_exe.py --tle_budget 推断出的 TLE_SKIP 与执行得到的 TLE 一样统计
+            return "TLE" if element == TLE_SKIPPED else element
+    return "AC"
 
 test_als = ["lcb","ht","algo","crux","predo"]
 test_als = ['crux']
@@ -34,88 +57,294 @@ model_name_list = [
     # "Qwen2.5-32B-Instruct",
     # "Qwen2.5-Coder-7B-Instruct",
     # "Qwen2.5-Coder-14B-Instruct",
-    # "Qwen2.5-Coder-32B-Instruct",  
+    # "Qwen2.5-Coder-32B-Instruct",
 ]
 
-import os
-for model_name in model_name_list:
-    for test_al in test_als:
-        result_file = f"ALLmode_results/tcb-{model_name}-{test_al}-{test_al}-all.json"
-        if not os.path.exists(result_file):
-            print(f"{model_name}-{test_al} NOT EXSIT!")
-            continue 
-        results = json.load(open(result_file, "r", encoding="utf-8"))
-
-        rank_result = {
-            "rank1": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0},
-            "rank2": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0},
-            "rank3": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0},
-            "rank4": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0},
-            "rank5": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0},
-        }
-        success_k = {
-            "rank1": {"total": 0, "hacked": 0},
-            "rank2": {"total": 0, "hacked": 0},
-            "rank3": {"total": 0, "hacked": 0},
-            "rank4": {"total": 0, "hacked": 0},
-            "rank5": {"total": 0, "hacked": 0},
+def compute_rank_result(results, seed=None):
+    rank_result = {f"rank{i+1}": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"OLE":0,"EXE":0} for i in range(RANK_MULTIPLIERS)}
+    success_k = {f"rank{i+1}": {"total": 0, "hacked": 0} for i in range(RANK_MULTIPLIERS)}
+    for k, v in results.items():
+        rank = len(v['codes'])
+        if "sample_seed" in v and v["sample_seed"] != seed:
+            raise ValueError(f"{k} was executed with --lazy_sample --seed {v['sample_seed']}, got seed {seed}")
+
+        array_length = max([len(code['status']) for code in v['codes']])
+        tests_index = get_problem_test_indices(k, array_length, rank, seed)
+
+        for i in range(RANK_MULTIPLIERS):
+            nums_of_tests = rank * (i+1)
+            tests_index_rank_i = tests_index[:nums_of_tests]
+            ## 每道题计算 rate
+            hacked = 0
+            status_present = {
+                "AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"OLE":0,"EXE":0
+            }
+
+            success_k[f"rank{i+1}"]["total"] += rank
+            if array_length == 0:
+                status_present['AC'] += rank
+            else:
+                for code in v['codes']:
+                    tests_status = [code['status'][i] for i in tests_index_rank_i] if max(tests_index_rank_i) < len(code['status']) else code['status']
+
+                    status_present[find_first_non_ac(tests_status)] += 1
+                    if find_first_non_ac(tests_status) != "AC":
+                        hacked += 1
+                success_k[f"rank{i+1}"]["hacked"] += hacked / rank
+
+            for key, value in status_present.items():
+                rank_result[f"rank{i+1}"][key] += (value / rank)
+    return rank_result, success_k
+
+def compute_fail_fast_result(results):
+    """
+    --fail_fast 的结果：每个代码的 status 被截断为第一个非 AC（全部通过则为 ["AC"]），
+    只能算出整套测试的 hack rate，不能按 k*rank 抽样，所以只输出一行 "all"。
+    """
+    rank_result = {"all": {"AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"OLE":0,"EXE":0}}
+    success_k = {"all": {"total": 0, "hacked": 0}}
+    for k, v in results.items():
+        rank = len(v['codes'])
+        hacked = 0
+        status_present = {
+            "AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"OLE":0,"EXE":0
         }
-        for k, v in results.items():
-            rank = len(v['codes'])
-
-            array_length = max([len(code['status']) for code in v['codes']])
-            tests_index = get_random_indices(array_length, rank * 5)
-
-            for i in range(5):
-                nums_of_tests = rank * (i+1)
-                tests_index_rank_i = tests_index[:nums_of_tests]
-                ## 每道题计算 rate
-                hacked = 0
-                status_present = {
-                    "AC":0, "CE": 0, "WA":0, "RE": 0, "TLE":0, "MLE":0,"EXE":0
-                }
-
-                success_k[f"rank{i+1}"]["total"] += rank
-                if array_length == 0:
-                    status_present['AC'] += rank
-                else:
-                    for code in v['codes']:
-                        tests_status = [code['status'][i] for i in tests_index_rank_i] if max(tests_index_rank_i) < len(code['status']) else code['status']
-
-                        status_present[find_first_non_ac(tests_status)] += 1
-                        if find_first_non_ac(tests_status) != "AC":
-                            hacked += 1
-                    success_k[f"rank{i+1}"]["hacked"] += hacked / rank
-
-                for key, value in status_present.items():
-                    rank_result[f"rank{i+1}"][key] += (value / rank)
-
-        # 创建 Markdown 表格
-        algorithm_model = f"{test_al}|{model_name}"
-
-        # 创建 Markdown 表格
-        markdown_table = "| Algorithm | Model | Rank | AC | CE | WA | RE | TLE | MLE | EXE | Hack Rate |\n"
-        markdown_table += "|----------|--------|------|----|----|----|----|-----|-----|-----|-----------|\n"
-
-        for rank in rank_result:
-            total = success_k[rank]["total"]
-            hacked = success_k[rank]["hacked"]
-            hack_rate = (hacked / len(results) * 100) if total > 0 else 0
-            hack_rate = round(hack_rate, 2)  # 保留两位小数
-
-            # 计算每个状态的百分比和数量
-            status_percentages = []
-            for key in rank_result[rank]:
-                count = rank_result[rank][key]
-                percentage = (count / len(results) * 100)
-                status_percentages.append(f"{percentage:.2f}%")
-
-            # 将每个状态的百分比和数量组合在一起
-            markdown_table += f"| {algorithm_model} | {rank} | " + " | ".join(status_percentages) + f" | {hack_rate}% |\n"
-
-        # 保存到 .md 文件
-        os.makedirs(f"./rank_md", exist_ok=True)
-        with open(f"./rank_md/rank_result-{model_name}-{test_al}-main_result.md", "w") as file:
-            file.write(markdown_table)
-
-        print("Markdown 文件已生成: rank_result.md")
\ No newline at end of file
+        success_k["all"]["total"] += rank
+        for status in first_non_ac_statuses(v):
+            status_present[status] += 1
+            if status != "AC":
+                hacked += 1
+        success_k["all"]["hacked"] += hacked / rank
+        for key, value in status_present.items():
+            rank_result["all"][key] += (value / rank)
+    return rank_result, success_k
+
+def first_non_ac_statuses(v):
+    """每个代码的第一个非 AC 状态；load_results(statuses=False) 读出的结果没有 status 列表，从 verdict 矩阵取"""
+    if all('status' in code for code in v['codes']):
+        return [find_first_non_ac(code['status']) for code in v['codes']]
+    statuses = []
+    for row, length in zip(v["verdicts"], v["lengths"]):
+        failed = row[:length][row[:length] != STATUS_CODES["AC"]]
+        statuses.append(STATUS_NAMES[failed[0]] if len(failed) else "AC")
+    return statuses
+
+def verdict_matrix(v):
+    """
+    一道题的 verdict 矩阵 (代码数, 测试数)，int8 状态编码。
+    status 比最长的短的代码（CE、EXE 等）整行填它的第一个非 AC 状态，与 compute_rank_result 抽样越界时的处理一致。
+    """
+    if "verdicts" in v:
+        return stored_verdict_matrix(v)
+    array_length = max([len(code['status']) for code in v['codes']])
+    matrix = np.zeros((len(v['codes']), array_length), dtype=np.int8)
+    for row, code in zip(matrix, v['codes']):
+        status = code['status']
+        if NOT_RUN in status:
+            raise ValueError(f"{v['problem_id']} has tests that were not run (--lazy_sample), bootstrap needs full results")
+        if len(status) == array_length:
+            row[:] = [STATUS_CODES[sta] for sta in status]
+        else:
+            row[:] = STATUS_CODES[find_first_non_ac(status)]
+    return matrix
+
+def stored_verdict_matrix(v):
+    """verdict_store.load_verdicts(prefix, STATUS_CODES) 读出的矩阵，不在 STATUS_CODES 里的状态（NR）和填充位为 PAD"""
+    matrix = v["verdicts"].astype(np.int8)
+    lengths = v["lengths"]
+    if (matrix[np.arange(matrix.shape[1]) < lengths[:, None]] < 0).any():
+        raise ValueError(f"{v['problem_id']} has tests that were not run (--lazy_sample), bootstrap needs full results")
+    for row, length in zip(matrix, lengths):
+        if length < matrix.shape[1]:
+            failed = row[:length][row[:length] != STATUS_CODES["AC"]]
+            row[:] = failed[0] if len(failed) else STATUS_CODES["AC"]
+    return matrix
+
+def load_results(result_file, statuses=True):
+    """
+    优先读 verdict_store 的压缩结果（parallel_exe.py 会一起写出，或用 verdict_store.py 转换），否则读 json。
+    statuses=False 时不还原 status 字符串，只够 --bootstrap / --exact 使用
+    """
+    if has_verdicts(result_file):
+        return load_verdicts(verdicts_prefix(result_file), STATUS_CODES, statuses=statuses)
+    return json.load(open(result_file, "r", encoding="utf-8"))
+
+def bootstrap_problem(matrix, rank, problem_id, num_seeds, seed=0):
+    """
+    用 num_seeds 组独立抽样一次算完一道题：每组与 get_problem_test_indices 一样不放回地抽 rank * RANK_MULTIPLIERS 个测试，
+    返回 (num_seeds, RANK_MULTIPLIERS, 状态数) 的状态占比，第 k 行只看每组的前 rank * (k+1) 个测试。
+    抽样用 np.random.default_rng([seed, crc32(problem_id)])，与题目顺序无关。
+    """
+    shares = np.zeros((num_seeds, RANK_MULTIPLIERS, len(STATUS_NAMES)))
+    num_codes, array_length = matrix.shape
+    if array_length == 0:
+        shares[:, :, STATUS_CODES["AC"]] = 1.0
+        return shares
+    rng = np.random.default_rng([seed, zlib.crc32(problem_id.encode("utf-8"))])
+    num_tests = min(rank * RANK_MULTIPLIERS, array_length)
+    # 每行独立的随机排列取前 num_tests 个：(num_seeds, num_tests)
+    tests_index = np.argsort(rng.random((num_seeds, array_length)), axis=1)[:, :num_tests]
+    sampled = matrix[:, tests_index]
+    # 每个代码在每组抽样中第一个非 AC 的位置和状态：(num_codes, num_seeds)
+    non_ac = sampled != STATUS_CODES["AC"]
+    first_pos = np.where(non_ac.any(axis=2), non_ac.argmax(axis=2), num_tests)
+    first_status = np.take_along_axis(sampled, np.minimum(first_pos, num_tests - 1)[:, :, None], axis=2)[:, :, 0]
+    offsets = np.arange(num_seeds) * len(STATUS_NAMES)
+    for i in range(RANK_MULTIPLIERS):
+        status = np.where(first_pos < rank * (i + 1), first_status, STATUS_CODES["AC"])
+        counts = np.bincount((status + offsets).ravel(), minlength=num_seeds * len(STATUS_NAMES))
+        shares[:, i, :] = counts.reshape(num_seeds, len(STATUS_NAMES)) / num_codes
+    return shares
+
+def compute_bootstrap_result(results, num_seeds, seed=0, ci=95):
+    """
+    compute_rank_result 的多组抽样版本：每组抽样的状态占比 / hack rate 按题目平均，
+    返回 {rank{k}: {状态: {"mean", "low", "high"}}} 和 {rank{k}: {"mean", "low", "high"}}（百分比），
+    low / high 为 num_seeds 组结果的 ci% 分位区间。
+    """
+    total = np.zeros((num_seeds, RANK_MULTIPLIERS, len(STATUS_NAMES)))
+    for k, v in results.items():
+        if "sample_seed" in v:
+            raise ValueError(f"{k} was executed with --lazy_sample, bootstrap needs full results")
+        total += bootstrap_problem(verdict_matrix(v), len(v['codes']), k, num_seeds, seed)
+    shares = total / max(len(results), 1) * 100
+    hack_rates = 100 - shares[:, :, STATUS_CODES["AC"]]
+    tail = (100 - ci) / 2
+
+    def summarize(values):
+        low, high = np.percentile(values, [tail, 100 - tail])
+        return {"mean": float(values.mean()), "low": float(low), "high": float(high)}
+
+    rank_result, success_k = {}, {}
+    for i in range(RANK_MULTIPLIERS):
+        rank_result[f"rank{i+1}"] = {name: summarize(shares[:, i, code]) for code, name in enumerate(STATUS_NAMES)}
+        success_k[f"rank{i+1}"] = summarize(hack_rates[:, i])
+    return rank_result, success_k
+
+def exact_problem_curve(matrix):
+    """
+    一道题不抽样的期望状态占比：(测试数, 状态数) 数组，第 m-1 行为随机抽 m 个测试时各状态（第一个非 AC）的期望占比。
+    失败 f 个测试的代码被抽中至少一个失败测试的概率为 1 - C(n-f, m) / C(n, m)，
+    被 hack 时第一个非 AC 在它失败的测试里均匀分布，所以状态 s 的概率再乘 f_s / f。
+    """
+    num_codes, array_length = matrix.shape
+    counts = np.stack([np.bincount(row, minlength=len(STATUS_NAMES)) for row in matrix])
+    failed = array_length - counts[:, STATUS_CODES["AC"]]
+    # C(n-f, m) / C(n, m) = prod_{i<m} (n-f-i) / (n-i)，对所有 m 一次 cumprod
+    i = np.arange(array_length)
+    survive = np.cumprod(np.clip((array_length - failed[:, None] - i) / (array_length - i), 0, 1), axis=1)
+    status_given_hacked = counts / np.maximum(failed, 1)[:, None]
+    status_given_hacked[:, STATUS_CODES["AC"]] = 0
+    shares = (1 - survive).T @ status_given_hacked / num_codes
+    shares[:, STATUS_CODES["AC"]] = 1 - shares.sum(axis=1)
+    return shares
+
+def compute_exact_result(results, max_k=RANK_MULTIPLIERS):
+    """
+    compute_rank_result 的精确期望版本，返回结构相同（按题目累加），k 从 1 到 max_k；
+    max_k 为 None 时一直到所有题目都用完全部测试为止，即完整的 hack rate - 测试数曲线。
+    """
+    curves = []
+    for k, v in results.items():
+        if "sample_seed" in v:
+            raise ValueError(f"{k} was executed with --lazy_sample, exact metrics need full results")
+        matrix = verdict_matrix(v)
+        curves.append((len(v['codes']), exact_problem_curve(matrix) if matrix.shape[1] else None))
+    if max_k is None:
+        max_k = max([-(-len(curve) // rank) for rank, curve in curves if curve is not None], default=1)
+
+    rank_result = {f"rank{i+1}": dict.fromkeys(STATUS_NAMES, 0) for i in range(max_k)}
+    success_k = {f"rank{i+1}": {"total": 0, "hacked": 0} for i in range(max_k)}
+    for rank, curve in curves:
+        for i in range(max_k):
+            if curve is None:
+                shares = np.eye(len(STATUS_NAMES))[STATUS_CODES["AC"]]
+            else:
+                shares = curve[min(rank * (i + 1), len(curve)) - 1]
+            for code, name in enumerate(STATUS_NAMES):
+                rank_result[f"rank{i+1}"][name] += float(shares[code])
+            success_k[f"rank{i+1}"]["total"] += rank
+            success_k[f"rank{i+1}"]["hacked"] += float(1 - shares[STATUS_CODES["AC"]])
+    return rank_result, success_k
+
+def is_fail_fast_result(results):
+    return any(v.get("fail_fast") for v in results.values())
+
+def to_markdown(rank_result, success_k, num_problems, test_al, model_name):
+    # 创建 Markdown 表格
+    algorithm_model = f"{test_al}|{model_name}"
+
+    # 创建 Markdown 表格
+    markdown_table = "| Algorithm | Model | Rank | AC | CE | WA | RE | TLE | MLE | OLE | EXE | Hack Rate |\n"
+    markdown_table += "|----------|--------|------|----|----|----|----|-----|-----|-----|-----|-----------|\n"
+
+    for rank in rank_result:
+        total = success_k[rank]["total"]
+        hacked = success_k[rank]["hacked"]
+        hack_rate = (hacked / num_problems * 100) if total > 0 else 0
+        hack_rate = round(hack_rate, 2)  # 保留两位小数
+
+        # 计算每个状态的百分比和数量
+        status_percentages = []
+        for key in rank_result[rank]:
+            count = rank_result[rank][key]
+            percentage = (count / num_problems * 100)
+            status_percentages.append(f"{percentage:.2f}%")
+
+        # 将每个状态的百分比和数量组合在一起
+        markdown_table += f"| {algorithm_model} | {rank} | " + " | ".join(status_percentages) + f" | {hack_rate}% |\n"
+    return markdown_table
+
+def to_markdown_bootstrap(rank_result, success_k, num_seeds, ci, test_al, model_name):
+    algorithm_model = f"{test_al}|{model_name}"
+    markdown_table = f"| Algorithm | Model | Rank | AC | CE | WA | RE | TLE | MLE | OLE | EXE | Hack Rate | {ci:g}% CI ({num_seeds} seeds) |\n"
+    markdown_table += "|----------|--------|------|----|----|----|----|-----|-----|-----|-----|-----------|------------|\n"
+    for rank in rank_result:
+        status_percentages = [f"{rank_result[rank][key]['mean']:.2f}%" for key in STATUS_NAMES]
+        hack_rate = success_k[rank]
+        markdown_table += f"| {algorithm_model} | {rank} | " + " | ".join(status_percentages) + f" | {hack_rate['mean']:.2f}% | [{hack_rate['low']:.2f}%, {hack_rate['high']:.2f}%] |\n"
+    return markdown_table
+
+import os
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compute rank-multiplier metrics.")
+    parser.add_argument('--seed', type=int, default=None, help="per-problem sampling seed (must match parallel_exe.py --lazy_sample --seed)")
+    parser.add_argument('--result_dir', type=str, default="ALLmode_results", help="ALLmode_results, or rank_result for --fail_fast runs")
+    parser.add_argument('--bootstrap', type=int, default=0, help="number of sampling seeds to average (NumPy, mean and CI per k); 0: one sample, the original behavior")
+    parser.add_argument('--exact', action='store_true', help="expected metrics in closed form (no sampling), for every k up to the full test count")
+    parser.add_argument('--ci', type=float, default=95, help="confidence level of the --bootstrap interval (%%)")
+    args = parser.parse_args()
+
+    for model_name in model_name_list:
+        for test_al in test_als:
+            result_file = f"{args.result_dir}/tcb-{model_name}-{test_al}-{test_al}-all.json"
+            if not os.path.exists(result_file) and not has_verdicts(result_file):
+                print(f"{model_name}-{test_al} NOT EXSIT!")
+                continue
+            results = load_results(result_file, statuses=not (args.exact or args.bootstrap > 0))
+
+            if is_fail_fast_result(results):
+                rank_result, success_k = compute_fail_fast_result(results)
+                md_suffix = "fail_fast_result"
+                markdown_table = to_markdown(rank_result, success_k, len(results), test_al, model_name)
+            elif args.exact:
+                # 前 RANK_MULTIPLIERS 行与 main_result 对应，后面的行把曲线延伸到全部测试
+                rank_result, success_k = compute_exact_result(results, max_k=None)
+                md_suffix = "exact_result"
+                markdown_table = to_markdown(rank_result, success_k, len(results), test_al, model_name)
+            elif args.bootstrap > 0:
+                rank_result, success_k = compute_bootstrap_result(results, args.bootstrap, seed=args.seed or 0, ci=args.ci)
+                md_suffix = "bootstrap_result"
+                markdown_table = to_markdown_bootstrap(rank_result, success_k, args.bootstrap, args.ci, test_al, model_name)
+            else:
+                rank_result, success_k = compute_rank_result(results, seed=args.seed)
+                md_suffix = "main_result"
+                markdown_table = to_markdown(rank_result, success_k, len(results), test_al, model_name)
+
+            # 保存到 .md 文件
+            os.makedirs(f"./rank_md", exist_ok=True)
+            with open(f"./rank_md/rank_result-{model_name}-{test_al}-{md_suffix}.md", "w") as file:
+                file.write(markdown_table)
+
+            print("Markdown 文件已生成: rank_result.md")
@@ -0,0 +1,79 @@
+"""
+Per-problem record of which test inputs killed wrong codes in earlier runs.
+
+The history file maps problem_id -> sha1(test input) -> {"trials", "kills", "seconds"},
+accumulated from the per-test "runs" that run_cpp_code_linux stores in every result.
+prioritize() orders a problem's tests by descending (Laplace-smoothed) kill rate and,
+within a tie, by ascending average runtime, so fail-fast runs reach the first failing
+test as early as possible. Both take the problem's test hashes (test_hashes(), computed
+once per problem) rather than the tests themselves.
+"""
+import hashlib
+import json
+import os
+import uuid
+
+
+def test_hash(testcase):
+    if isinstance(testcase["input"], dict):
+        testcase = testcase["input"]
+    return hashlib.sha1(str(testcase["input"]).encode("utf-8")).hexdigest()
+
+
+def test_hashes(tests):
+    return [test_hash(testcase) for testcase in tests]
+
+
+def load_history(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f)
+    os.replace(tmp_path, path)
+
+
+def update_history(history, results, hashes_by_problem):
+    """results 为 run_cpp_code_linux 的返回列表，hashes_by_problem: problem_id -> test_hashes(测试列表)"""
+    for result in results:
+        runs = result.get("runs")
+        if not runs:
+            continue
+        problem_id = result["problem_id"]
+        hashes = hashes_by_problem[problem_id]
+        problem_history = history.setdefault(problem_id, {})
+        for idx, verdict, seconds, *_ in runs:
+            record = problem_history.setdefault(hashes[idx], {"trials": 0, "kills": 0, "seconds": 0.0})
+            record["trials"] += 1
+            record["kills"] += int(verdict != "AC")
+            record["seconds"] += seconds
+    return history
+
+
+def kill_rate(record):
+    # 没有记录的测试为 0.5，排在很少击杀的旧测试前面
+    if record is None:
+        return 0.5
+    return (record["kills"] + 1) / (record["trials"] + 2)
+
+
+def average_seconds(record):
+    if record is None or record["trials"] == 0:
+        return float("inf")
+    return record["seconds"] / record["trials"]
+
+
+def prioritize(problem_history, hashes):
+    """hashes 为 test_hashes(测试列表)，返回测试的原始下标，按历史击杀率降序、平均耗时升序排列"""
+    keys = []
+    for idx, key in enumerate(hashes):
+        record = problem_history.get(key)
+        keys.append((-kill_rate(record), average_seconds(record), idx))
+    keys.sort()
+    return [idx for _, _, idx in keys]
@@ -0,0 +1,123 @@
+"""
+Whitespace-insensitive output comparison on bytes.
+
+outputs_match(actual, expected) decides a test the way run_cpp_code_linux always has
+(whitespace-separated tokens must agree, decimals within 1e-6), but without decoding,
+splitting, stripping and joining the whole stdout first:
+  * identical buffers are accepted with a single memcmp;
+  * otherwise both buffers are tokenized in ~64 KB chunks cut at whitespace, and each
+    window of tokens is compared as a list (C speed); only a window that differs is
+    walked token by token, so the first real mismatch ends the comparison;
+  * two differing tokens that both look like decimals (-?\\d+\\.\\d+) match when their
+    values are within 1e-6, so multi-number outputs get the tolerance per token
+    instead of only when the whole output is a single number.
+
+Run `python output_compare.py` for a microbenchmark against the old text comparison.
+"""
+import re
+
+FLOAT_TOLERANCE = 1e-6
+CHUNK_SIZE = 1 << 16
+
+_DECIMAL = re.compile(rb"-?\d+\.\d+")
+_WHITESPACE = re.compile(rb"\s")
+
+
+def _token_chunks(data, chunk_size=CHUNK_SIZE):
+    """按约 chunk_size 字节切块（切点挪到下一个空白处），逐块产出 token 列表"""
+    start = 0
+    n = len(data)
+    while start < n:
+        end = start + chunk_size
+        if end < n:
+            m = _WHITESPACE.search(data, end)
+            end = m.start() if m else n
+        else:
+            end = n
+        tokens = bytes(data[start:end]).split()
+        start = end
+        if tokens:
+            yield tokens
+
+
+def tokens_match(actual_token, expected_token, tolerance=FLOAT_TOLERANCE):
+    if actual_token == expected_token:
+        return True
+    if _DECIMAL.fullmatch(actual_token) and _DECIMAL.fullmatch(expected_token):
+        return abs(float(actual_token) - float(expected_token)) <= tolerance
+    return False
+
+
+def outputs_match(actual, expected, tolerance=FLOAT_TOLERANCE):
+    """actual / expected 为 bytes 或 memoryview，按空白切分后逐 token 比较，遇到第一个不一致即返回 False"""
+    if actual == expected:
+        return True
+    actual_chunks = _token_chunks(actual)
+    expected_chunks = _token_chunks(expected)
+    actual_tokens, expected_tokens = [], []
+    i = j = 0
+    while True:
+        if i == len(actual_tokens):
+            actual_tokens, i = next(actual_chunks, None), 0
+        if j == len(expected_tokens):
+            expected_tokens, j = next(expected_chunks, None), 0
+        if actual_tokens is None or expected_tokens is None:
+            # 一方已经结束：另一方也必须没有剩余 token
+            return actual_tokens is None and expected_tokens is None
+        k = min(len(actual_tokens) - i, len(expected_tokens) - j)
+        if actual_tokens[i:i + k] != expected_tokens[j:j + k]:
+            for a, b in zip(actual_tokens[i:i + k], expected_tokens[j:j + k]):
+                if not tokens_match(a, b, tolerance):
+                    return False
+        i += k
+        j += k
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    def is_decimal(s):
+        try:
+            a = float(s)
+        except:
+            return False
+        return bool(re.match(r"^-?\d+\.\d+$", s))
+
+    def legacy_outputs_match(actual, expected):
+        # 原 run_cpp_code_linux 的比较：解码、按行 strip、去空行、拼成一行再比较
+        expected_lines = [line.strip() for line in expected.decode().splitlines()]
+        actual_lines = [line.strip() for line in actual.decode().splitlines()]
+        expected_lines = [line for line in expected_lines if line]
+        actual_lines = [line for line in actual_lines if line]
+        actual_lines = (" ".join(actual_lines)).strip()
+        expected_lines = (" ".join(expected_lines)).strip()
+        if is_decimal(actual_lines) and is_decimal(expected_lines):
+            return abs(float(actual_lines) - float(expected_lines)) <= 1e-6
+        return actual_lines == expected_lines
+
+    def bench(fn, actual, expected, repeat=5):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            verdict = fn(actual, expected)
+            best = min(best, time.perf_counter() - start)
+        return best, verdict
+
+    rng = random.Random(0)
+    numbers = [str(rng.randrange(10 ** 9)) for _ in range(1_000_000)]
+    lines = [" ".join(numbers[i:i + 10]) for i in range(0, len(numbers), 10)]
+    expected = ("\n".join(lines) + "\n").encode()
+    cases = {
+        "identical": bytes(bytearray(expected)),
+        "trailing spaces / CRLF": ("\r\n".join(line + " " for line in lines) + "\r\n").encode(),
+        "mismatch at first token": b"x" + expected[1:],
+        "mismatch at last token": expected[:-2] + b"x\n",
+        "one line per token": ("\n".join(numbers) + "\n").encode(),
+    }
+    print(f"expected output: {len(expected) / 2 ** 20:.1f} MiB, {len(numbers)} tokens")
+    print(f"{'case':<26}{'legacy (ms)':>12}{'bytes (ms)':>12}{'speedup':>10}  verdicts")
+    for name, actual in cases.items():
+        legacy_time, legacy_verdict = bench(legacy_outputs_match, actual, expected)
+        new_time, new_verdict = bench(outputs_match, actual, expected)
+        print(f"{name:<26}{legacy_time * 1e3:>12.1f}{new_time * 1e3:>12.1f}{legacy_time / new_time:>9.1f}x  {legacy_verdict}/{new_verdict}")
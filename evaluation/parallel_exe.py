@@ -1,8 +1,23 @@
 import os
+import sys
 import json
 from datetime import datetime
-from load_data import get_data, save_back_results
-from excute_tool_linux import run_cpp_code_linux
+# runner / compile_cache / async_engine / time_limits 与 data_construction/ 共用，放在仓库根目录的 judge/ 下
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "judge"))
+from load_data import get_data, save_back_results, get_testcases
+from excute_tool_linux import run_cpp_code_linux, run_cpp_code_steps, count_judged_testcases, NOT_RUN, TLE_SKIPPED
+from get_rank_result import get_problem_test_indices
+from kill_history import load_history, save_history, update_history, prioritize, test_hashes
+from test_store import write_store, close_stores
+from time_limits import load_time_limits, apply_time_limits
+from verdict_store import write_verdicts, verdicts_prefix
+from result_journal import ResultJournal, index_journal, iter_sorted, pending_items, write_json_list
+import shutil
+import tempfile
+import compile_cache
+import runner
+import async_engine
+from itertools import chain
 from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
 import logging
@@ -24,102 +39,195 @@ def setup_logging():
 import time
 def process_code_with_logging(data_item):
     """包装函数，用于添加日志"""
-    problem_id = data_item["problem_id"]
-    code_id = data_item["code_id"]
-
     try:
         result = run_cpp_code_linux(data_item, test_mode)
-        status = result.get("error", "Unknown")
-        logger.info(f"执行完成 - 问题ID: {problem_id}, 代码ID: {code_id}, 状态: {status}")
-        return result
     except Exception as e:
-        logger.error(f"执行异常 - 问题ID: {problem_id}, 代码ID: {code_id}, 错误: {str(e)}")
+        result = e
+    return finish_code(data_item, result)
+
+def process_batch_async(batch):
+    """asyncio 引擎：当前进程用一个事件循环跑完一批代码，最多 engine_concurrency 个进程同时运行"""
+    outcomes = async_engine.run_items(batch, lambda item: run_cpp_code_steps(item, test_mode), engine_concurrency)
+    return [finish_code(data_item, outcome) for data_item, outcome in zip(batch, outcomes)]
+
+def finish_code(data_item, outcome):
+    """outcome 为 run_cpp_code_linux 的返回值，或执行时抛出的异常"""
+    problem_id = data_item["problem_id"]
+    code_id = data_item["code_id"]
+
+    if isinstance(outcome, Exception):
+        logger.error(f"执行异常 - 问题ID: {problem_id}, 代码ID: {code_id}, 错误: {str(outcome)}")
         data_item["error"] = ["EXE"]
-        data_item["details"] = str(e)
+        data_item["details"] = str(outcome)
         return data_item
+    status = outcome.get("error", "Unknown")
+    logger.info(f"执行完成 - 问题ID: {problem_id}, 代码ID: {code_id}, 状态: {status}")
+    return outcome
 
 
+SLOWEST_TESTS = 5
+
+def add_resources(resources, result):
+    """把一个代码的编译耗时和 runs 里的 rusage 累加到所在题目的资源统计"""
+    resources["compile_seconds"] += result.get("compile_seconds", 0.0)
+    for run in result.get("runs", []):
+        idx, verdict, wall = run[:3]
+        # 旧 journal 里的 runs 只有前三项
+        user, sys_cpu, maxrss_kb = run[3:6] if len(run) >= 6 else (None, None, None)
+        resources["run_wall_seconds"] += wall
+        resources["run_cpu_seconds"] += (user or 0.0) + (sys_cpu or 0.0)
+        resources["peak_rss_kb"] = max(resources["peak_rss_kb"], maxrss_kb or 0)
+        test_walls = resources["test_wall_seconds"]
+        test_walls[idx] = max(test_walls.get(idx, 0.0), wall)
+
+def finish_resources(resources):
+    test_walls = resources.pop("test_wall_seconds")
+    # 各测试在所有代码中的最长 wall 时间，取最慢的几个：[测试下标, 秒]
+    resources["slowest_tests"] = sorted(([idx, wall] for idx, wall in test_walls.items()), key=lambda x: -x[1])[:SLOWEST_TESTS]
+    for key in ("compile_seconds", "run_wall_seconds", "run_cpu_seconds"):
+        resources[key] = round(resources[key], 3)
+    return resources
+
+def summarize_resources(problem_results):
+    """整次运行的编译 / 运行耗时拆分，以及全局最慢的测试 [题目, 测试下标, 秒]"""
+    total = {"compile_seconds": 0.0, "run_wall_seconds": 0.0, "run_cpu_seconds": 0.0}
+    slowest = []
+    for problem_id, problem_data in problem_results.items():
+        resources = problem_data["resources"]
+        for key in total:
+            total[key] += resources[key]
+        slowest.extend([problem_id, idx, wall] for idx, wall in resources["slowest_tests"])
+    slowest.sort(key=lambda x: -x[2])
+    return total, slowest[:SLOWEST_TESTS]
+
+def write_json_entry(f, first, key, value):
+    """流式写出与 json.dump(dict, f, indent=3) 相同格式的一项，first 为第一项时写开头的 {"""
+    item = json.dumps(value, indent=3).replace("\n", "\n   ")
+    f.write(("{\n" if first else ",\n") + "   " + json.dumps(key) + ": " + item)
+
 def save_results(results, correct_code_output_file, output_file):
-    """保存结果到文件"""
+    """
+    保存结果到文件。results 须按 problem_id 分组（iter_sorted 的顺序），每个题目读完即写出，
+    内存里只保留返回用的 problem_results，其中的代码记录不含源码 code。
+    """
 
     # 初始化结果字典
     problem_results = {}
-    status_counts = {"AC": 0, "CE": 0, "TLE": 0, "MLE": 0, "RE": 0, "WA": 0, "EXE": 0}
+    status_counts = {"AC": 0, "CE": 0, "TLE": 0, "MLE": 0, "OLE": 0, "RE": 0, "WA": 0, "EXE": 0}
 
-    # 分类归整结果
-    for result in results:
-        problem_id = result["problem_id"]
-        code_id = result["code_id"]
-        status = result.get("error", [])
+    with open(output_file, "w", encoding="utf-8") as all_f, open(correct_code_output_file, "w", encoding="utf-8") as correct_f:
+        has_correct = False
 
-        if len(status) == [] or all(sta == "AC" for sta in status):
-            status_counts['AC'] += 1
-        else:
-            sta = [x for x in status if x != "AC"][0]
-            status_counts[sta] += 1
-
-        # 加入问题结果集
-        if problem_id not in problem_results:
-            problem_results[problem_id] = {
-                "problem_id": problem_id,
-                "codes": [],
-                "time_limit": result["time_limit"],
-                "memory_limit": result["memory_limit"],
-                "test_cases": result["test_cases"]
-            }
-
-        # 添加代码执行结果
-        problem_results[problem_id]["codes"].append({
-            "code_id": code_id,
-            "code": result["code"],
-            "status": status,
-            "details": result.get("details", ""),
-        })
-        # 保存完整结果
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(problem_results, f, indent=3)
-
-    # 保存正确的代码（AC状态）
-    correct_codes = {}
-    for problem_id, problem_data in problem_results.items():
-        correct_problem_codes = []
-        for code_info in problem_data["codes"]:
-            if all(status == "AC" for status in code_info["status"]):
-                correct_problem_codes.append({
-                    "code_id": code_info["code_id"],
-                    "code": code_info["code"]
+        def flush(problem_data):
+            nonlocal has_correct
+            finish_resources(problem_data["resources"])
+            # 保存完整结果
+            write_json_entry(all_f, not problem_results, problem_data["problem_id"], problem_data)
+
+            # 保存正确的代码（AC状态）
+            correct_problem_codes = []
+            for code_info in problem_data["codes"]:
+                if all(status in ("AC", NOT_RUN) for status in code_info["status"]):
+                    correct_problem_codes.append({
+                        "code_id": code_info["code_id"],
+                        "code": code_info["code"]
+                    })
+            if correct_problem_codes:
+                write_json_entry(correct_f, not has_correct, problem_data["problem_id"], {
+                    "problem_id": problem_data["problem_id"],
+                    "codes": correct_problem_codes,
+                    "time_limit": problem_data["time_limit"],
+                    "memory_limit": problem_data["memory_limit"],
+                    "test_cases": problem_data["test_cases"]
                 })
+                has_correct = True
+
+            for code_info in problem_data["codes"]:
+                del code_info["code"]
+            problem_results[problem_data["problem_id"]] = problem_data
+
+        # 分类归整结果
+        current = None
+        for result in results:
+            problem_id = result["problem_id"]
+            code_id = result["code_id"]
+            status = result.get("error", [])
 
-        if correct_problem_codes:
-            correct_codes[problem_id] = {
-                "problem_id": problem_id,
-                "codes": correct_problem_codes,
-                "time_limit": problem_data["time_limit"],
-                "memory_limit": problem_data["memory_limit"],
-                "test_cases": problem_data["test_cases"]
-            }
+            # NR（--lazy_sample 未执行的测试）不算失败
+            if len(status) == [] or all(sta in ("AC", NOT_RUN) for sta in status):
+                status_counts['AC'] += 1
+            else:
+                sta = [x for x in status if x not in ("AC", NOT_RUN)][0]
+                # 推断出的 TLE_SKIP 按 TLE 计
+                status_counts["TLE" if sta == TLE_SKIPPED else sta] += 1
 
-    # 保存正确代码结果
-    with open(correct_code_output_file, "w", encoding="utf-8") as f:
-        json.dump(correct_codes, f, indent=3)
+            # 加入问题结果集
+            if current is None or current["problem_id"] != problem_id:
+                if problem_id in problem_results:
+                    raise ValueError(f"results are not grouped by problem_id: {problem_id} seen twice")
+                if current is not None:
+                    flush(current)
+                current = {
+                    "problem_id": problem_id,
+                    "codes": [],
+                    "time_limit": result["time_limit"],
+                    "memory_limit": result["memory_limit"],
+                    "test_cases": result["test_cases"],
+                    # 编译 / 运行耗时、CPU、峰值内存汇总（来自 compile_seconds 和 runs）
+                    "resources": {"compile_seconds": 0.0, "run_wall_seconds": 0.0, "run_cpu_seconds": 0.0, "peak_rss_kb": 0, "test_wall_seconds": {}},
+                }
+                if "sample_seed" in result:
+                    current["sample_seed"] = result["sample_seed"]
+                # fail-fast 结果的 status 只有第一个非 AC（或一个 AC），不能再按测试下标抽样
+                if result.get("fail_fast"):
+                    current["fail_fast"] = True
+
+            add_resources(current["resources"], result)
+
+            # 添加代码执行结果
+            current["codes"].append({
+                "code_id": code_id,
+                "code": result["code"],
+                "status": status,
+                "details": result.get("details", ""),
+            })
+        if current is not None:
+            flush(current)
+        all_f.write("\n}" if problem_results else "{}")
+        correct_f.write("\n}" if has_correct else "{}")
 
     # 返回状态统计
     return status_counts, problem_results
 
 
+DEFAULT_KILL_HISTORY = "ALLmode_results/kill_history.json"
+
 rank_p = 5
 if __name__ == "__main__":
     import argparse
 
     # 创建一个解析器
     parser = argparse.ArgumentParser(description="Process testcase algorithm and model name.")
-    test_mode = False
     # 添加命令行参数
     parser.add_argument('--testcase_alg', type=str, default="crux", help="Algorithm for testcase.")
     parser.add_argument('--model_name', type=str, default="claude-sonnet-4-20250514-thinking", help="Model name.")
     parser.add_argument('--cpu', type=int, default=50, help="cpu count")
     parser.add_argument('--prefix_url', type=str, default='./', help="testcase path")
     parser.add_argument('--data_path', type=str, default='TestcaseBench-v29.json', help="TC-Bench data path")
+    parser.add_argument('--compile_cache_dir', type=str, default="", help="compiled binary cache dir (e.g. ~/.cache/tcb-compile), empty: no cache")
+    parser.add_argument('--compile_cache_gb', type=float, default=20, help="compiled binary cache size limit (GB)")
+    parser.add_argument('--fail_fast', action='store_true', help="stop each code at its first non-AC test (results saved to rank_result/)")
+    parser.add_argument('--kill_history', type=str, default=None, help=f"per-problem test kill history, used to order tests under --fail_fast (default {DEFAULT_KILL_HISTORY} with --fail_fast, off otherwise); empty to disable")
+    parser.add_argument('--lazy_sample', action='store_true', help="only run the tests get_rank_result.py will sample (needs --seed)")
+    parser.add_argument('--seed', type=int, default=None, help="per-problem sampling seed, pass the same --seed to get_rank_result.py")
+    parser.add_argument('--resume', action='store_true', help="skip (problem_id, code_id) pairs already in the result journal")
+    parser.add_argument('--runner', type=str, default="shell", choices=runner.RUNNERS, help="shell: bash + ulimit (original), direct: exec binary with setrlimit, forkserver: fork per test")
+    parser.add_argument('--output_limit_mb', type=float, default=0, help="per-test stdout/stderr size cap (MB), larger output is judged OLE; 0: no cap (default)")
+    parser.add_argument('--engine', type=str, default="pool", choices=["pool", "asyncio"], help="pool: one worker process per running binary, asyncio: --engine_procs event loops keep --cpu binaries in flight")
+    parser.add_argument('--engine_procs', type=int, default=2, help="number of Python processes for --engine asyncio")
+    parser.add_argument('--time_limits', type=str, default="", help="per-problem timeouts from time_limits.py; empty: time_limit // 1000 + 3 seconds")
+    parser.add_argument('--tle_budget', type=int, default=0, help="after this many TLEs of one code, record its remaining tests as TLE_SKIP without running them; 0 disables")
+    parser.add_argument('--tle_budget_mode', type=str, default="consecutive", choices=["consecutive", "total"], help="count consecutive TLEs (reset by any other verdict) or all TLEs of the code")
 
     # 解析命令行参数
     args = parser.parse_args()
@@ -130,6 +238,13 @@ if __name__ == "__main__":
     cpu = args.cpu
     prefix_url = args.prefix_url
     data_path = args.data_path
+    # fail-fast: run_cpp_code_linux 在第一个非 AC 测试处返回，status 只保留这一个结果
+    test_mode = args.fail_fast
+    compile_cache.configure(args.compile_cache_dir, max_bytes=args.compile_cache_gb * 1024 ** 3)
+    runner.configure(args.runner, output_limit=args.output_limit_mb * 1024 ** 2)
+    # asyncio 引擎每个进程同时运行的编译 / 测试进程数，合计约为 cpu
+    engine_procs = max(1, min(args.engine_procs, cpu))
+    engine_concurrency = -(-cpu // engine_procs)
 
     datasets_name = f"tcb-{model_name}-{testcase_alg}"
 
@@ -139,34 +254,124 @@ if __name__ == "__main__":
 
     data = get_data(name=datasets_name, data_path=data_path, prefix_dir=f"{prefix_url}/save_tests_{model_name}-fliter/{testcase_alg}/", testcase_alg=testcase_alg)
     logger.info(f"加载了 {len(data)} 个代码项目")
+    if args.time_limits:
+        applied = apply_time_limits(data, load_time_limits(args.time_limits))
+        logger.info(f"{args.time_limits}: {applied}/{len(data)} 个代码项目使用校准的超时")
+
+    # 每道题的测试只解析一次，写成 mmap 共享的 blob，worker 只拿到 blob 路径
+    store_dir = tempfile.mkdtemp(prefix="tcb-tests-")
+    tests_by_problem = {}
+    for item in data:
+        problem_id = item["problem_id"]
+        if problem_id not in tests_by_problem:
+            blob_path = os.path.join(store_dir, f"{len(tests_by_problem)}.bin")
+            tests_by_problem[problem_id] = write_store(get_testcases(item["test_cases"]), blob_path)
+        item["test_store"] = tests_by_problem[problem_id].blob_path
+    logger.info(f"测试已写入共享存储 {store_dir}（{len(tests_by_problem)} 道题）")
 
-    logger.info(f"使用 {cpu} 个CPU核心进行并行处理")
+    if args.tle_budget > 0:
+        for item in data:
+            item["tle_budget"] = args.tle_budget
+            item["tle_consecutive"] = args.tle_budget_mode == "consecutive"
+        logger.info(f"TLE 预算：{args.tle_budget} 个{'连续' if args.tle_budget_mode == 'consecutive' else ''} TLE 后跳过剩余测试（记为 {TLE_SKIPPED}）")
+
+    if args.lazy_sample:
+        if args.seed is None:
+            parser.error("--lazy_sample requires --seed")
+        if args.fail_fast:
+            parser.error("--lazy_sample and --fail_fast cannot be combined")
+        # 先按 get_rank_result.py 的规则固定每道题的抽样，只执行 k=1..5 会用到的测试
+        sampled = {}
+        for item in data:
+            problem_id = item["problem_id"]
+            if problem_id not in sampled:
+                array_length = count_judged_testcases(tests_by_problem[problem_id])
+                sampled[problem_id] = (array_length, sorted(get_problem_test_indices(problem_id, array_length, item["rank"], args.seed)))
+            item["test_indices"] = sampled[problem_id][1]
+            item["sample_seed"] = args.seed
+        total_tests = sum(n for n, _ in sampled.values())
+        run_tests = sum(len(indices) for _, indices in sampled.values())
+        logger.info(f"lazy sample: 每个代码执行 {run_tests}/{total_tests} 个测试（按题目求和）")
+
+    # 击杀历史默认只在 fail-fast 时使用（排序测试）和更新，其他模式须显式传 --kill_history
+    kill_history_path = args.kill_history if args.kill_history is not None else (DEFAULT_KILL_HISTORY if test_mode else "")
+    if kill_history_path:
+        history = load_history(kill_history_path)
+        # 每道题的测试只哈希一次，排序和更新历史共用
+        hashes_by_problem = {problem_id: test_hashes(tests) for problem_id, tests in tests_by_problem.items()}
+        if test_mode:
+            # fail-fast 时先跑历史上最容易击杀错误代码、且最便宜的测试
+            test_orders = {problem_id: prioritize(history.get(problem_id, {}), hashes) for problem_id, hashes in hashes_by_problem.items()}
+            for item in data:
+                item["test_order"] = test_orders[item["problem_id"]]
+            logger.info(f"按 {kill_history_path} 的历史击杀率排序测试")
+
+    save_dir = "ALLmode_results" if not test_mode else "rank_result"
+    os.makedirs(save_dir, exist_ok=True)
+    # 每个结果完成后立即追加到 journal，--resume 时跳过已经完成的 (problem_id, code_id)
+    journal_path = f"{save_dir}/{datasets_name}-{testcase_alg}.journal.jsonl"
+    data, num_done = pending_items(journal_path, data, args.resume)
+    if args.resume:
+        logger.info(f"--resume: journal 中已有 {num_done} 个结果，剩余 {len(data)} 个代码项目")
+
+    if args.engine == "asyncio":
+        logger.info(f"使用 asyncio 引擎：{engine_procs} 个进程，每个进程最多 {engine_concurrency} 个并发")
+    else:
+        logger.info(f"使用 {cpu} 个CPU核心进行并行处理")
     import time
 
     # 记录开始时间
     start_time = time.time()
 
-    with Pool(cpu) as pool:
-        results = list(tqdm(
-            pool.imap_unordered(process_code_with_logging, data),
+    session_keys = set()
+    with ResultJournal(journal_path) as journal, Pool(engine_procs if args.engine == "asyncio" else cpu) as pool:
+        if args.engine == "asyncio":
+            results = chain.from_iterable(pool.imap_unordered(process_batch_async, async_engine.split_batches(data, engine_concurrency)))
+        else:
+            results = pool.imap_unordered(process_code_with_logging, data)
+        for result in tqdm(
+            results,
             total=len(data),
             desc="执行进度"
-        ))
+        ):
+            result.pop("test_store", None)
+            if test_mode:
+                result["fail_fast"] = True
+            journal.append(result)
+            session_keys.add((result["problem_id"], result["code_id"]))
     end_time = time.time()
 
     # 计算并打印执行时间
     execution_time = end_time - start_time
-    results = sorted(results, key=lambda x: (x["problem_id"], x["code_id"]))
+    journal_index = index_journal(journal_path)
+    if test_mode:
+        # 被击杀的代码在第几个测试处失败
+        executed = [len(result["runs"]) for result in iter_sorted(journal_path, journal_index) if result.get("runs") and result["runs"][-1][1] != "AC"]
+        logger.info(f"fail-fast: 被 hack 的代码平均在第 {sum(executed) / max(len(executed), 1):.2f} 个测试处失败")
+    if args.tle_budget > 0:
+        skipped = sum(result.get("error", []).count(TLE_SKIPPED) for result in iter_sorted(journal_path, journal_index))
+        logger.info(f"TLE 预算：共跳过 {skipped} 个测试")
+    if kill_history_path:
+        # 只累加本次运行的结果，避免 --resume 时重复统计
+        save_history(update_history(history, iter_sorted(journal_path, journal_index, keys=session_keys), hashes_by_problem), kill_history_path)
+        logger.info(f"击杀历史已更新: {kill_history_path}")
+    tests_by_problem.clear()
+    close_stores()
+    shutil.rmtree(store_dir, ignore_errors=True)
     logger.info("所有代码执行完成，开始保存结果...")
-    save_dir = "ALLmode_results" if not test_mode else "rank_result"
-    os.makedirs("ALLmode_results", exist_ok=True)
 
-    json.dump(results, open(f"{save_dir}/{datasets_name}-{testcase_alg}.json", "w", encoding="utf-8"), indent=4, ensure_ascii=False)
+    write_json_list(f"{save_dir}/{datasets_name}-{testcase_alg}.json", iter_sorted(journal_path, journal_index))
     logger.info(f"结果已保存到 {save_dir}/{datasets_name}-{testcase_alg}.json")
-    status_counts, problem_results = save_results(results,correct_code_output_file=f"{save_dir}/{datasets_name}-{testcase_alg}-correct.json", output_file=f"{save_dir}/{datasets_name}-{testcase_alg}-all.json")
+    status_counts, problem_results = save_results(iter_sorted(journal_path, journal_index), correct_code_output_file=f"{save_dir}/{datasets_name}-{testcase_alg}-correct.json", output_file=f"{save_dir}/{datasets_name}-{testcase_alg}-all.json")
+    # get_rank_result.py 优先读取的紧凑 verdict 矩阵
+    write_verdicts(problem_results, verdicts_prefix(f"{save_dir}/{datasets_name}-{testcase_alg}-all.json"))
     for status, count in status_counts.items():
-        percentage = (count / len(results)) * 100
+        percentage = (count / max(len(journal_index), 1)) * 100
         logger.info(f"{status}: {count} ({percentage:.2f}%)")
+    total_resources, slowest_tests = summarize_resources(problem_results)
+    logger.info(f"编译 {total_resources['compile_seconds']:.1f}s，运行 wall {total_resources['run_wall_seconds']:.1f}s / CPU {total_resources['run_cpu_seconds']:.1f}s")
+    for problem_id, idx, wall in slowest_tests:
+        logger.info(f"慢测试 - 问题ID: {problem_id}, 测试: {idx}, 最长 {wall:.3f}s")
     logger.info("结果还原到原始格式并保存...")
     save_back_results(problem_results, data_path=data_path, name=f"{datasets_name}-{testcase_alg}", save_dir=save_dir)
     logger.info("结果还原完成，保存到原始文件")
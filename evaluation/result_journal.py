@@ -0,0 +1,130 @@
+"""
+Append-only JSONL journal of run_cpp_code_linux results.
+
+parallel_exe.py appends every result as soon as its task finishes (flushed per line,
+fsync'd in batches), so a crashed or preempted run loses at most the last batch and
+can be continued with --resume. The final outputs are then built by streaming the
+journal in (problem_id, code_id) order instead of holding every result in memory.
+"""
+import json
+import os
+import time
+
+
+class ResultJournal:
+    def __init__(self, path, fsync_every=64, fsync_seconds=5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        _drop_partial_line(path)
+        self.f = open(path, "a", encoding="utf-8")
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def append(self, result):
+        self.f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.time() - self.last_sync >= self.fsync_seconds:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _drop_partial_line(path):
+    """进程被杀时最后一行可能只写了一半，续写前截掉"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data_end = f.seek(0, os.SEEK_END)
+        if data_end == 0:
+            return
+        f.seek(data_end - 1)
+        if f.read(1) == b"\n":
+            return
+        position = data_end
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def result_key(result):
+    return (result["problem_id"], result["code_id"])
+
+
+def index_journal(path):
+    """返回 (problem_id, code_id) -> 行偏移，同一个 key 出现多次时以最后一次为准"""
+    index = {}
+    if not os.path.exists(path):
+        return index
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.endswith(b"\n"):
+                try:
+                    index[result_key(json.loads(line))] = offset
+                except (ValueError, KeyError):
+                    pass
+            offset += len(line)
+    return index
+
+
+def completed_keys(path):
+    return set(index_journal(path))
+
+
+def pending_items(path, items, resume):
+    """
+    resume 时返回 journal 里还没有结果的 items（按 (problem_id, code_id)，写了一半的最后一行不算完成）和已完成的数量；
+    否则删掉旧 journal，返回全部 items
+    """
+    if not resume:
+        if os.path.exists(path):
+            os.remove(path)
+        return items, 0
+    done = completed_keys(path)
+    return [item for item in items if result_key(item) not in done], len(done)
+
+
+def iter_sorted(path, index=None, keys=None):
+    """按 (problem_id, code_id) 顺序逐条读出结果；keys 不为空时只读这些结果"""
+    if index is None:
+        index = index_journal(path)
+    with open(path, "rb") as f:
+        for key in sorted(index):
+            if keys is not None and key not in keys:
+                continue
+            f.seek(index[key])
+            yield json.loads(f.readline())
+
+
+def write_json_list(path, results):
+    """流式写出与 json.dump(results, f, indent=4, ensure_ascii=False) 相同格式的列表"""
+    with open(path, "w", encoding="utf-8") as f:
+        first = True
+        for result in results:
+            item = json.dumps(result, indent=4, ensure_ascii=False)
+            f.write(("[\n" if first else ",\n") + "\n".join("    " + line for line in item.split("\n")))
+            first = False
+        f.write("[]" if first else "\n]")
@@ -0,0 +1,109 @@
+"""
+Per-problem test-case blobs shared with the Pool workers through mmap.
+
+parallel_exe.py parses each tests-{tcb_id}.jsonl once and writes it to one blob:
+    b"TCBS" | uint64 n | n x (input offset, input length, output offset, output length) | data
+Workers only receive the blob path; they mmap it once per process (the page cache is
+shared by every worker) and decode a test's input/output lazily from its offsets, so
+no worker re-reads or re-parses the JSONL and nothing but the path is pickled per code.
+"""
+import mmap
+import os
+import struct
+from array import array
+
+STORE_MAGIC = b"TCBS"
+_HEADER = struct.Struct("=4sQ")
+
+_open_stores = {}
+
+
+def _normalize(testcase):
+    # 与 run_cpp_code_linux 一致：input 为 dict 时取内层，float 输出转成字符串
+    if isinstance(testcase["input"], dict):
+        testcase = testcase["input"]
+    input_string = testcase["input"]
+    output_string = testcase["output"]
+    if not isinstance(input_string, str):
+        input_string = str(input_string)
+    if not isinstance(output_string, str):
+        output_string = str(output_string)
+    return input_string.encode("utf-8"), output_string.encode("utf-8")
+
+
+def write_store(tests, blob_path):
+    """把解析好的测试列表写成 blob，返回 StoredTests 视图"""
+    encoded = [_normalize(testcase) for testcase in tests]
+    offsets = array("Q")
+    position = _HEADER.size + 4 * 8 * len(encoded)
+    for input_bytes, output_bytes in encoded:
+        offsets.extend([position, len(input_bytes)])
+        position += len(input_bytes)
+        offsets.extend([position, len(output_bytes)])
+        position += len(output_bytes)
+    tmp_path = f"{blob_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(STORE_MAGIC, len(encoded)))
+        f.write(offsets.tobytes())
+        for input_bytes, output_bytes in encoded:
+            f.write(input_bytes)
+            f.write(output_bytes)
+    os.replace(tmp_path, blob_path)
+    return StoredTests(blob_path)
+
+
+def open_store(blob_path):
+    """每个进程只 mmap 一次；fork 出来的 worker 直接继承主进程的映射"""
+    if blob_path not in _open_stores:
+        with open(blob_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        magic, n = _HEADER.unpack_from(buf, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{blob_path} is not a test store")
+        offsets = array("Q")
+        offsets.frombytes(buf[_HEADER.size:_HEADER.size + 4 * 8 * n])
+        _open_stores[blob_path] = (buf, offsets)
+    return _open_stores[blob_path]
+
+
+def close_stores():
+    for buf, _ in _open_stores.values():
+        if isinstance(buf, mmap.mmap):
+            try:
+                buf.close()
+            except BufferError:
+                # 还有 memoryview 引用时交给 GC
+                pass
+    _open_stores.clear()
+
+
+class StoredTests:
+    """按需解码的测试列表，元素与 jsonl 里的一行相同：{"input": str, "output": str}"""
+
+    def __init__(self, blob_path):
+        self.blob_path = blob_path
+        self.buf, self.offsets = open_store(blob_path)
+
+    def __len__(self):
+        return len(self.offsets) // 4
+
+    def raw(self, idx):
+        """返回 (input, output) 的 memoryview，不做拷贝"""
+        in_off, in_len, out_off, out_len = self.offsets[4 * idx:4 * idx + 4]
+        view = memoryview(self.buf)
+        return view[in_off:in_off + in_len], view[out_off:out_off + out_len]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        input_bytes, output_bytes = self.raw(idx)
+        return {"input": str(input_bytes, "utf-8"), "output": str(output_bytes, "utf-8")}
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
@@ -0,0 +1,137 @@
+"""
+Compact verdict-matrix copy of a `*-all.json` result file.
+
+The -all.json files carry every code's source and per-test details, pretty-printed,
+so get_rank_result.py spends seconds parsing text it never uses. write_verdicts()
+stores only what the metrics need:
+
+    {prefix}.verdicts.npy   uint8, every problem's (codes x tests) verdict matrix,
+                            flattened and concatenated (np.load(..., mmap_mode="r"))
+    {prefix}.verdicts.json  manifest: status names (the uint8 codes index into it),
+                            and per problem its offset / shape / per-code status
+                            lengths / code ids plus time_limit, memory_limit,
+                            sample_seed, fail_fast
+
+Rows shorter than the problem's longest status list (CE, EXE, ...) are padded with
+PAD. load_verdicts() returns the same {problem_id: {"codes": [{"status": [...]}]}}
+shape get_rank_result.py reads from JSON, with each problem's matrix and status
+lengths attached as "verdicts" / "lengths". The NumPy metrics only need those, so
+with statuses=False the status strings are not rebuilt at all.
+
+`python verdict_store.py X-all.json [...]` converts existing result files.
+"""
+import json
+import os
+
+import numpy as np
+
+PAD = 255
+# 固定在前面的状态，其他状态（NR、TLE_SKIP 等）写入时按出现顺序追加
+BASE_STATUSES = ["AC", "CE", "WA", "RE", "TLE", "MLE", "OLE", "EXE"]
+_PROBLEM_FIELDS = ("time_limit", "memory_limit", "sample_seed", "fail_fast")
+
+
+def verdicts_prefix(result_file):
+    """X-all.json -> X-all"""
+    return result_file[:-len(".json")] if result_file.endswith(".json") else result_file
+
+
+def has_verdicts(result_file):
+    """压缩文件存在且不比 json 旧时才使用，避免重新运行后读到过期的结果"""
+    prefix = verdicts_prefix(result_file)
+    paths = [f"{prefix}.verdicts.npy", f"{prefix}.verdicts.json"]
+    if not all(os.path.exists(path) for path in paths):
+        return False
+    if os.path.exists(result_file):
+        return min(os.path.getmtime(path) for path in paths) >= os.path.getmtime(result_file)
+    return True
+
+
+def write_verdicts(problem_results, prefix):
+    """problem_results 为 save_results 返回（或 -all.json 读出）的 {problem_id: {...}}"""
+    statuses = list(BASE_STATUSES)
+    status_codes = {name: code for code, name in enumerate(statuses)}
+    problems = {}
+    chunks = []
+    offset = 0
+    for problem_id, v in problem_results.items():
+        lengths = [len(code["status"]) for code in v["codes"]]
+        matrix = np.full((len(lengths), max(lengths, default=0)), PAD, dtype=np.uint8)
+        for row, code in zip(matrix, v["codes"]):
+            for status in code["status"]:
+                if status not in status_codes:
+                    status_codes[status] = len(statuses)
+                    statuses.append(status)
+            row[:len(code["status"])] = [status_codes[status] for status in code["status"]]
+        entry = {"offset": offset, "shape": list(matrix.shape), "lengths": lengths, "code_ids": [code["code_id"] for code in v["codes"]]}
+        for field in _PROBLEM_FIELDS:
+            if field in v:
+                entry[field] = v[field]
+        problems[problem_id] = entry
+        chunks.append(matrix.ravel())
+        offset += matrix.size
+    if len(statuses) >= PAD:
+        raise ValueError(f"too many distinct statuses: {len(statuses)}")
+
+    data = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)
+    tmp_npy, tmp_json = f"{prefix}.verdicts.tmp.npy", f"{prefix}.verdicts.json.tmp"
+    np.save(tmp_npy, data)
+    with open(tmp_json, "w", encoding="utf-8") as f:
+        json.dump({"statuses": statuses, "problems": problems}, f)
+    os.replace(tmp_npy, f"{prefix}.verdicts.npy")
+    os.replace(tmp_json, f"{prefix}.verdicts.json")
+
+
+def load_verdicts(prefix, status_codes=None, statuses=True):
+    """
+    读回 {problem_id: {"problem_id", "codes": [{"code_id", "status"}], "verdicts", "lengths", ...}}，题目顺序与写入时相同。
+    status_codes 为 名称 -> 编码 时，"verdicts" 为按该编码转换的矩阵（不在其中的状态映射为 PAD），
+    否则为文件里的原始编码。statuses=False 时 codes 里只有 code_id，不还原 status 字符串列表。
+    """
+    with open(f"{prefix}.verdicts.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    data = np.load(f"{prefix}.verdicts.npy", mmap_mode="r")
+    names = np.array(manifest["statuses"] + [None], dtype=object)
+    if status_codes is not None:
+        lut = np.full(256, PAD, dtype=np.uint8)
+        for code, name in enumerate(manifest["statuses"]):
+            lut[code] = status_codes.get(name, PAD)
+    results = {}
+    for problem_id, entry in manifest["problems"].items():
+        num_codes, num_tests = entry["shape"]
+        matrix = data[entry["offset"]:entry["offset"] + num_codes * num_tests].reshape(num_codes, num_tests)
+        codes = []
+        for row, length, code_id in zip(matrix, entry["lengths"], entry["code_ids"]):
+            codes.append({"code_id": code_id, "status": names[row[:length]].tolist()} if statuses else {"code_id": code_id})
+        v = {
+            "problem_id": problem_id,
+            "codes": codes,
+            "verdicts": matrix if status_codes is None else lut[matrix],
+            "lengths": np.array(entry["lengths"], dtype=np.int64),
+        }
+        for field in _PROBLEM_FIELDS:
+            if field in entry:
+                v[field] = entry[field]
+        results[problem_id] = v
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Convert *-all.json result files to the compact verdict format.")
+    parser.add_argument('result_files', nargs='+', help="ALLmode_results/*-all.json files")
+    args = parser.parse_args()
+
+    for result_file in args.result_files:
+        start_time = time.perf_counter()
+        results = json.load(open(result_file, "r", encoding="utf-8"))
+        json_seconds = time.perf_counter() - start_time
+        prefix = verdicts_prefix(result_file)
+        write_verdicts(results, prefix)
+        start_time = time.perf_counter()
+        load_verdicts(prefix, statuses=False)
+        npy_seconds = time.perf_counter() - start_time
+        size = os.path.getsize(f"{prefix}.verdicts.npy") + os.path.getsize(f"{prefix}.verdicts.json")
+        print(f"{result_file}: {os.path.getsize(result_file) / 2 ** 20:.1f} MiB -> {size / 2 ** 20:.2f} MiB, metrics load {json_seconds:.3f}s -> {npy_seconds:.3f}s")
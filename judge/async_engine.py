@@ -0,0 +1,68 @@
+"""
+asyncio execution engine for the run_cpp_code_steps() generators.
+
+Instead of one Pool worker per running binary (each blocked in subprocess.run), a few
+Python processes each run an event loop that keeps up to `concurrency` compiles /
+test binaries in flight at once. A semaphore bounds the in-flight binaries, test
+processes are started like run_test's (same timeout and rlimits) and awaited through
+their pidfd, and compiles run in a thread pool. The generators are the same ones
+runner.execute_steps drives, so every item ends up with exactly the result structure
+of run_cpp_code_linux.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import compile_cache
+import runner
+
+
+async def run_step_async(request, slots):
+    """runner.run_step 的 asyncio 版本，slots 限制同时运行的编译器 / 测试进程数"""
+    async with slots:
+        start_time = time.perf_counter()
+        if request[0] == "compile":
+            loop = asyncio.get_running_loop()
+            compiled = await loop.run_in_executor(None, compile_cache.compile_cpp, *request[1:])
+            return time.perf_counter() - start_time, compiled
+        try:
+            result = await runner.run_test_async(*request[1:])
+        except Exception as e:
+            result = e
+        return time.perf_counter() - start_time, result
+
+
+async def execute_steps_async(steps, slots):
+    reply = None
+    try:
+        while True:
+            try:
+                request = steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply = await run_step_async(request, slots)
+    finally:
+        steps.close()
+
+
+async def _run_all(items, make_steps, concurrency):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency))
+    slots = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(
+        *(execute_steps_async(make_steps(item), slots) for item in items),
+        return_exceptions=True
+    )
+
+
+def run_items(items, make_steps, concurrency):
+    """
+    在当前进程里用一个事件循环跑完 items，make_steps(item) 返回该 item 的 run_cpp_code_steps 生成器。
+    返回与 items 一一对应的结果，某个 item 抛出异常时对应位置是异常对象。
+    """
+    return asyncio.run(_run_all(items, make_steps, max(1, concurrency)))
+
+
+def split_batches(items, concurrency):
+    """把任务切成小批分给各个进程，每批够 concurrency 个槽位轮转几次，结果可以边跑边落盘"""
+    batch_size = max(1, concurrency * 4)
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
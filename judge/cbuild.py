@@ -0,0 +1,89 @@
+"""
+Build the small C helpers the judge and the matrix code load or exec: runner's rlimit
+launcher and fork-server LD_PRELOAD library, utils' mod-p rank kernel.
+
+build_helper() compiles a C source with gcc once per (compiler version, source) and
+reuses the result. Helpers are executed / dlopen'ed, so they are only kept in a directory
+private to the current user (the compile cache directory, or a per-uid 0700 directory under
+the system temp directory) and only reused if owned by the current user and not writable
+by anyone else.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import uuid
+
+import compile_cache
+
+
+def _is_private(path, is_dir):
+    """path 是当前用户所有、组和其他人不可写的普通文件 / 目录（不跟随符号链接）"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    kind_ok = stat.S_ISDIR(st.st_mode) if is_dir else stat.S_ISREG(st.st_mode)
+    return kind_ok and st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+_fallback_helper_dir = None
+
+
+def _helper_dir():
+    """
+    小工具所在目录：开启 compile_cache 时用缓存目录，否则用系统临时目录下按 uid 区分、权限 0700 的目录。
+    目录不属于当前用户或别人可写（例如被他人抢先创建）时，改用本进程私有的 mkdtemp 目录。
+    """
+    global _fallback_helper_dir
+    helper_dir = compile_cache.CACHE_DIR
+    if not helper_dir:
+        helper_dir = os.path.join(tempfile.gettempdir(), f"tcb-helpers-{os.getuid()}")
+        try:
+            os.mkdir(helper_dir, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            helper_dir = None
+    if helper_dir and _is_private(helper_dir, is_dir=True):
+        return helper_dir
+    if _fallback_helper_dir is None:
+        _fallback_helper_dir = tempfile.mkdtemp(prefix="tcb-helpers-")
+        atexit.register(shutil.rmtree, _fallback_helper_dir, True)
+    return _fallback_helper_dir
+
+
+def build_helper(name, src, flag_sets):
+    """
+    编译运行用的 C 小工具，依次尝试 flag_sets 里的参数，全部失败返回 None。
+    启动器、fork server 的 LD_PRELOAD 库等都会被直接执行 / 加载，所以只复用当前用户自己的私有目录里
+    属于自己且别人不可写的文件，见 _helper_dir()。
+    """
+    digest = hashlib.sha256((compile_cache.compiler_version("gcc") + src).encode("utf-8")).hexdigest()[:16]
+    helper_path = os.path.join(_helper_dir(), f"tcb-{name}-{digest}")
+    if _is_private(helper_path, is_dir=False):
+        return helper_path
+    build_dir = tempfile.mkdtemp()
+    try:
+        src_file = os.path.join(build_dir, f"{name}.c")
+        with open(src_file, "w") as f:
+            f.write(src)
+        out_file = os.path.join(build_dir, name)
+        for flags in flag_sets:
+            result = subprocess.run(
+                ["gcc", *flags, src_file, "-o", out_file],
+                capture_output=True,
+                text=True
+            )
+            if result.returncode == 0:
+                tmp_dst = f"{helper_path}.{uuid.uuid4().hex}.tmp"
+                shutil.copyfile(out_file, tmp_dst)
+                os.chmod(tmp_dst, 0o700)
+                os.replace(tmp_dst, helper_path)
+                return helper_path
+        return None
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
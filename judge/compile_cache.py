@@ -0,0 +1,318 @@
+"""
+Content-addressed on-disk cache for compiled submissions.
+
+Entries are keyed by sha256(compiler version, compile flags, source) and stored as
+    {cache_dir}/{key[:2]}/{key}.out   compiled binary
+    {cache_dir}/{key[:2]}/{key}.ce    compiler stderr of a failed compile (CE)
+Writes go through a temp file + os.replace, so concurrent Pool workers never see a
+half-written entry. Hits refresh the mtime, and eviction drops the least recently
+used entries once the cache grows past max_bytes. compile_cpp() hands out a hard link
+(or copy) of the cached binary inside the caller's workdir, so evicting an entry never
+pulls a binary out from under a test that is still running.
+
+Sources whose first include is <bits/stdc++.h> are compiled against a precompiled
+header built once per (compiler, flags) under {cache_dir}/pch/. g++ silently ignores
+a PCH that does not match; a compile that fails with a PCH error (invalid or unreadable
+.gch) is retried without it, any other failure is a CE as it stands. The PCH directories
+count towards max_bytes and are evicted with the other entries, least recently used first.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import time
+import uuid
+from functools import lru_cache
+
+CACHE_DIR = None
+MAX_CACHE_BYTES = 20 * 1024 ** 3
+# 每个进程写入多少次后检查一次缓存大小
+EVICT_EVERY = 64
+# 最近用过的条目不淘汰，避免刚写入的条目被反复淘汰、重新编译
+EVICT_GRACE_SECONDS = 600
+
+PCH_HEADER = "bits/stdc++.h"
+_PCH_INCLUDE_RE = re.compile(r"#\s*include\s*<bits/stdc\+\+\.h>")
+# 预编译头本身的问题（.gch 无效 / 版本不符 / 读不了），这类失败才退回不带 PCH 重新编译
+_PCH_ERROR_RE = re.compile(r"\.gch\b|precompiled header|\bPCH\b", re.IGNORECASE)
+
+_inserts = 0
+
+
+def configure(cache_dir, max_bytes=None):
+    """cache_dir 为空时关闭缓存（回到每次临时目录编译）"""
+    global CACHE_DIR, MAX_CACHE_BYTES
+    CACHE_DIR = os.path.abspath(os.path.expanduser(cache_dir)) if cache_dir else None
+    if max_bytes is not None:
+        MAX_CACHE_BYTES = int(max_bytes)
+    if CACHE_DIR:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+
+@lru_cache(maxsize=None)
+def compiler_version(compiler="g++"):
+    result = subprocess.run([compiler, "--version"], capture_output=True, text=True)
+    return result.stdout
+
+
+def cache_key(source, flags, compiler="g++"):
+    h = hashlib.sha256()
+    h.update(compiler_version(compiler).encode("utf-8"))
+    h.update(b"\0")
+    h.update("\0".join(flags).encode("utf-8"))
+    h.update(b"\0")
+    h.update(source.encode("utf-8", errors="surrogateescape"))
+    return h.hexdigest()
+
+
+def _entry_path(key, suffix):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}{suffix}")
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _atomic_store(path, src_file=None, text=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if src_file is not None:
+            shutil.copy2(src_file, tmp_path)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _link_into(path, workdir):
+    """把缓存里的可执行文件硬链接到 workdir（跨文件系统时复制），运行的是这份，淘汰缓存条目不影响它"""
+    dst = os.path.join(workdir, os.path.basename(path))
+    try:
+        os.link(path, dst)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(path, dst)
+    return dst
+
+
+def lookup(key):
+    """返回 (exe_file, stderr, hit)；未命中时 hit 为 False"""
+    exe_path = _entry_path(key, ".out")
+    if os.path.exists(exe_path):
+        _touch(exe_path)
+        return exe_path, "", True
+    ce_path = _entry_path(key, ".ce")
+    try:
+        with open(ce_path, "r", encoding="utf-8") as f:
+            stderr = f.read()
+    except OSError:
+        return None, "", False
+    _touch(ce_path)
+    return None, stderr, True
+
+
+def _tree_usage(path):
+    """目录下所有文件的 (总字节数, 最新 mtime)"""
+    size, mtime = 0, 0.0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            size += st.st_size
+            mtime = max(mtime, st.st_mtime)
+    return size, mtime
+
+
+def evict(max_bytes=None):
+    """按 mtime 做 LRU 淘汰，直到缓存回落到 max_bytes 的 90%；pch/ 下每组预编译头整体作为一个条目"""
+    if not CACHE_DIR:
+        return
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    lock_file = open(os.path.join(CACHE_DIR, ".lock"), "w")
+    try:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # 其他 worker 正在淘汰
+            return
+        entries = []
+        total = 0
+        pch_root = os.path.join(CACHE_DIR, "pch")
+        if os.path.isdir(pch_root):
+            for pch in os.scandir(pch_root):
+                if pch.is_dir(follow_symlinks=False):
+                    size, mtime = _tree_usage(pch.path)
+                    entries.append((mtime, size, pch.path))
+                    total += size
+        for shard in os.scandir(CACHE_DIR):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp") or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        now = time.time()
+        target = int(max_bytes * 0.9)
+        for mtime, size, path in entries:
+            if total <= target:
+                break
+            if now - mtime < EVICT_GRACE_SECONDS:
+                break
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+    finally:
+        lock_file.close()
+
+
+def _record_insert():
+    global _inserts
+    _inserts += 1
+    if _inserts % EVICT_EVERY == 0:
+        evict()
+
+
+def can_use_pch(source):
+    """第一个非空、非注释行就是 #include <bits/stdc++.h> 时才能用预编译头"""
+    in_block_comment = False
+    for line in source.splitlines():
+        line = line.strip()
+        if in_block_comment:
+            if "*/" not in line:
+                continue
+            line = line.split("*/", 1)[1].strip()
+            in_block_comment = False
+        if line.startswith("/*"):
+            if "*/" not in line:
+                in_block_comment = True
+                continue
+            line = line.split("*/", 1)[1].strip()
+        if not line or line.startswith("//"):
+            continue
+        return bool(_PCH_INCLUDE_RE.match(line))
+    return False
+
+
+def get_pch_dir(flags, compiler="g++"):
+    """
+    返回包含 bits/stdc++.h.gch 的目录（作为 -I 传给 g++），每组 (编译器, flags) 只构建一次。
+    构建失败时写入 .failed 标记，之后直接返回 None。
+    """
+    if not CACHE_DIR:
+        return None
+    key = cache_key("#include <bits/stdc++.h>\n", flags, compiler)[:16]
+    pch_dir = os.path.join(CACHE_DIR, "pch", key)
+    gch_file = os.path.join(pch_dir, f"{PCH_HEADER}.gch")
+    failed_file = os.path.join(pch_dir, ".failed")
+    if os.path.exists(gch_file):
+        # 刷新 mtime，evict 按它判断这组预编译头是否最近用过
+        _touch(gch_file)
+        return pch_dir
+    if os.path.exists(failed_file):
+        return None
+
+    os.makedirs(os.path.dirname(gch_file), exist_ok=True)
+    with open(os.path.join(pch_dir, ".lock"), "w") as lock_file:
+        # 同一时刻只让一个 worker 构建，其余 worker 等它完成
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(gch_file):
+            return pch_dir
+        if os.path.exists(failed_file):
+            return None
+        stub_file = os.path.join(pch_dir, f"stub.{uuid.uuid4().hex}.h")
+        tmp_gch = f"{gch_file}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(stub_file, "w") as f:
+                f.write(f"#include <{PCH_HEADER}>\n")
+            result = subprocess.run(
+                [compiler, *flags, "-x", "c++-header", stub_file, "-o", tmp_gch],
+                capture_output=True,
+                text=True
+            )
+            if result.returncode != 0:
+                open(failed_file, "w").close()
+                return None
+            os.replace(tmp_gch, gch_file)
+        finally:
+            for path in (stub_file, tmp_gch):
+                if os.path.exists(path):
+                    os.remove(path)
+    return pch_dir
+
+
+def compile_cpp(source, flags, workdir, compiler="g++"):
+    """
+    编译 source，返回 (exe_file, stderr)。编译失败时 exe_file 为 None。
+    exe_file 总在 workdir 下：缓存命中时是缓存条目的硬链接（或副本），workdir 存在期间都可以运行。
+    """
+    key = cache_key(source, flags, compiler) if CACHE_DIR else uuid.uuid4().hex
+    if CACHE_DIR:
+        exe_file, stderr, hit = lookup(key)
+        if hit:
+            if exe_file is None:
+                return None, stderr
+            try:
+                return _link_into(exe_file, workdir), ""
+            except FileNotFoundError:
+                # 查到之后、链接之前被其他 worker 淘汰了，重新编译
+                pass
+
+    cpp_file = os.path.join(workdir, f"{key}.cpp")
+    exe_file = os.path.join(workdir, f"{key}.out")
+    with open(cpp_file, "w") as f:
+        f.write(source)
+
+    pch_dir = get_pch_dir(flags, compiler) if can_use_pch(source) else None
+    compile_result = None
+    if pch_dir is not None:
+        compile_result = subprocess.run(
+            [compiler, *flags, "-I", pch_dir, cpp_file, "-o", exe_file],
+            capture_output=True,
+            text=True
+        )
+    if compile_result is None or (compile_result.returncode != 0 and _PCH_ERROR_RE.search(compile_result.stderr)):
+        # 不能用 PCH，或者预编译头本身出错时退回普通编译；代码本身的 CE 不重复编译
+        compile_result = subprocess.run(
+            [compiler, *flags, cpp_file, "-o", exe_file],
+            capture_output=True,
+            text=True
+        )
+
+    if not CACHE_DIR:
+        if compile_result.returncode != 0:
+            return None, compile_result.stderr
+        return exe_file, ""
+
+    if compile_result.returncode != 0:
+        _atomic_store(_entry_path(key, ".ce"), text=compile_result.stderr)
+        _record_insert()
+        return None, compile_result.stderr
+
+    _atomic_store(_entry_path(key, ".out"), src_file=exe_file)
+    _record_insert()
+    return exe_file, ""
@@ -0,0 +1,714 @@
+"""
+Run one compiled test binary on one test case.
+
+"direct" applies the CPU / address-space limits with setrlimit and then execs the
+binary from a tiny static C launcher (built once), so the spawn stays a plain
+vfork + exec instead of a Python preexec_fn fork. "shell" is the original `ulimit -t .. && ulimit -v .. && exe`
+through bash and stays the default. "forkserver" starts the binary once with a small LD_PRELOAD shim that
+stops it before main and forks one child per test (AFL-style), which saves the exec,
+dynamic-linking and libstdc++ start-up cost on every test; binaries the shim cannot
+attach to (e.g. static builds) fall back to "direct".
+
+All runners return a subprocess.CompletedProcess whose returncode follows the shell
+convention (128 + signal number for a killed child), so the callers' verdict mapping
+(137 -> MLE, 124 -> TLE, 153 -> OLE, other non-zero -> RE) is the same for every runner.
+
+Input and output are raw bytes. Small inputs go through a pipe, inputs above
+INPUT_FILE_THRESHOLD are written to an unlinked temporary file the child reads directly.
+stdout / stderr always go to temporary files instead of the worker's memory. With
+OUTPUT_LIMIT set (off by default) they are capped with RLIMIT_FSIZE, so a wrong code
+printing gigabytes is killed by SIGXFSZ (reported as OLE_RETURNCODE).
+
+Every result carries `usage` = Usage(user CPU s, sys CPU s, peak RSS KB) of the test
+process. The launcher forks the binary itself and reports the child's wait4 status and
+rusage over a pipe (a child exec'd straight from the Python worker would inherit the
+worker's RSS high-water mark); the fork server reports the same numbers from its own
+wait4. Exits are awaited through a pidfd where the kernel has one. The shell runner
+only reports CPU times.
+
+The executors' run_cpp_code_steps() generators do not spawn anything themselves: they
+yield ("compile", ...) / ("run", ...) steps. execute_steps() performs them with
+compile_cpp / run_test (one blocking process per test, the Pool engine), while
+async_engine.py performs them with run_test_async on an event loop.
+"""
+import asyncio
+import atexit
+import math
+import os
+import resource
+import select
+import shutil
+import signal
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import compile_cache
+from cbuild import build_helper
+
+RUNNERS = ["direct", "shell", "forkserver"]
+RUNNER = "shell"
+# stdout / stderr 各自的大小上限（字节），0 表示不限（默认，不产生 OLE）
+OUTPUT_LIMIT = 0
+# 超过这个大小的输入写成临时文件作为 stdin，不经过管道
+INPUT_FILE_THRESHOLD = 1024 ** 2
+# 输出超限：被 SIGXFSZ 杀死，或忽略该信号后写满上限
+OLE_RETURNCODE = 128 + signal.SIGXFSZ
+# 一个测试进程的资源占用：user / sys CPU 秒，峰值 RSS（KB）
+Usage = namedtuple("Usage", ["user", "sys", "maxrss_kb"])
+
+
+def configure(runner, output_limit=None):
+    global RUNNER, OUTPUT_LIMIT
+    if runner not in RUNNERS:
+        raise ValueError(f"Unknown runner: {runner}")
+    RUNNER = runner
+    if output_limit is not None:
+        OUTPUT_LIMIT = int(output_limit)
+
+
+LAUNCHER_SRC = r"""
+#include <errno.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+/*
+ * usage: launcher <cpu seconds> <address space bytes> <file size bytes, 0 = unlimited> <report fd> <exe> [args...]
+ *
+ * exe runs in a child forked from this small static process (so the Python worker's memory
+ * does not show up in its maxrss) with the limits applied. When it exits the launcher writes
+ * {wait status, user us, sys us, maxrss KB} to <report fd>. SIGTERM kills the child and still
+ * reports; if the launcher itself is killed, the child gets SIGKILL through PDEATHSIG.
+ */
+static volatile pid_t child;
+
+static void on_term(int sig) {
+    (void)sig;
+    if (child > 0) kill(child, SIGKILL);
+}
+
+int main(int argc, char **argv) {
+    struct rlimit rl;
+    struct rusage ru;
+    int status, report;
+    pid_t parent = getpid();
+    if (argc < 6) return 127;
+    report = atoi(argv[4]);
+    signal(SIGTERM, on_term);
+    child = fork();
+    if (child < 0) return 127;
+    if (child == 0) {
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (getppid() != parent) _exit(127);
+        signal(SIGTERM, SIG_DFL);
+        close(report);
+        rl.rlim_cur = rl.rlim_max = strtoull(argv[1], 0, 10);
+        if (setrlimit(RLIMIT_CPU, &rl) != 0) _exit(127);
+        rl.rlim_cur = rl.rlim_max = strtoull(argv[2], 0, 10);
+        if (setrlimit(RLIMIT_AS, &rl) != 0) _exit(127);
+        rl.rlim_cur = rl.rlim_max = strtoull(argv[3], 0, 10);
+        if (rl.rlim_cur && setrlimit(RLIMIT_FSIZE, &rl) != 0) _exit(127);
+        execv(argv[5], argv + 5);
+        _exit(127);
+    }
+    while (wait4(child, &status, 0, &ru) < 0) {
+        if (errno != EINTR) return 127;
+    }
+    int64_t resp[4] = {
+        status,
+        (int64_t)ru.ru_utime.tv_sec * 1000000 + ru.ru_utime.tv_usec,
+        (int64_t)ru.ru_stime.tv_sec * 1000000 + ru.ru_stime.tv_usec,
+        ru.ru_maxrss,
+    };
+    if (write(report, resp, sizeof(resp)) != sizeof(resp)) return 127;
+    return WIFSIGNALED(status) ? 128 + WTERMSIG(status) : WEXITSTATUS(status);
+}
+"""
+# 启动器回报: wait status, user 微秒, sys 微秒, maxrss KB（与 fork server 的回复相同）
+LAUNCHER_REPORT = struct.Struct("=qqqq")
+# 超时后先 SIGTERM 启动器让它回报 rusage，等待这么久仍未退出再 SIGKILL
+TERMINATE_GRACE = 1.0
+
+
+_launcher = None
+
+
+def get_launcher():
+    global _launcher
+    if _launcher is None:
+        # 优先静态链接，exec 开销最小
+        _launcher = build_helper("launcher", LAUNCHER_SRC, [["-O2", "-static"], ["-O2"]]) or ""
+    return _launcher
+
+
+def _cpu_seconds(time_limit):
+    # 超时可以是校准出的小数秒（wall 超时照用），RLIMIT_CPU 只能取整秒，向上取整且至少 1 秒
+    return max(1, math.ceil(time_limit))
+
+
+def _set_limits(time_limit_int, memory_kb):
+    # 与 ulimit -t / ulimit -v 一致：soft 和 hard 同时设置
+    cpu_seconds = _cpu_seconds(time_limit_int)
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    memory_bytes = memory_kb * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    if OUTPUT_LIMIT:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (OUTPUT_LIMIT, OUTPUT_LIMIT))
+
+
+class TestIO:
+    """
+    一次测试的 stdin / stdout / stderr。
+    小输入通过管道写入（self.input），大输入或 input_file=True 时写入匿名临时文件（self.stdin）；
+    输出写入匿名临时文件，大小受 RLIMIT_FSIZE 限制，结束后一次性读回。
+    """
+
+    def __init__(self, input_data, input_file=False):
+        if isinstance(input_data, str):
+            input_data = input_data.encode()
+        self.stdout = tempfile.TemporaryFile()
+        self.stderr = tempfile.TemporaryFile()
+        if input_file or len(input_data) > INPUT_FILE_THRESHOLD:
+            self.stdin = tempfile.TemporaryFile()
+            self.stdin.write(input_data)
+            self.stdin.seek(0)
+            self.input = None
+        else:
+            self.stdin = None
+            self.input = input_data
+
+    def popen_kwargs(self):
+        stdin = self.stdin if self.stdin is not None else subprocess.PIPE
+        return {"stdin": stdin, "stdout": self.stdout, "stderr": self.stderr}
+
+    def completed(self, args, returncode, usage=None):
+        self.stdout.seek(0)
+        stdout = self.stdout.read()
+        self.stderr.seek(0)
+        stderr = self.stderr.read()
+        return _completed(args, returncode, stdout, stderr, usage)
+
+    def close(self):
+        for f in (self.stdin, self.stdout, self.stderr):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _completed(args, returncode, stdout, stderr, usage=None):
+    if returncode < 0:
+        # 被信号杀死时换成 bash 的返回码 128 + signum
+        returncode = 128 - returncode
+    if OUTPUT_LIMIT and returncode != OLE_RETURNCODE and max(len(stdout), len(stderr)) >= OUTPUT_LIMIT:
+        # 忽略了 SIGXFSZ 的程序写满上限后只会收到 EFBIG，同样算输出超限
+        returncode = OLE_RETURNCODE
+    result = subprocess.CompletedProcess(args, returncode, stdout, stderr)
+    result.usage = usage
+    return result
+
+
+_pidfd_ok = None
+
+
+def _pidfd_supported():
+    global _pidfd_ok
+    if _pidfd_ok is None:
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+            _pidfd_ok = True
+        except (AttributeError, OSError):
+            _pidfd_ok = False
+    return _pidfd_ok
+
+
+def _reap(proc, report_r=None, options=0):
+    """
+    用 wait4 回收子进程，返回 (returncode, Usage)；options=os.WNOHANG 且尚未退出时返回 None。
+    有启动器回报时用它给出的测试进程 status / rusage。
+    """
+    pid, status, ru = os.wait4(proc.pid, options)
+    if pid == 0:
+        return None
+    # 写回 returncode，Popen 不会再去 waitpid
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if report_r is None:
+        # sh / preexec_fn 的子进程由 Python 进程直接 fork，峰值 RSS 含父进程的内存，不记录
+        return proc.returncode, Usage(ru.ru_utime, ru.ru_stime, None)
+    report = os.read(report_r, LAUNCHER_REPORT.size)
+    if len(report) < LAUNCHER_REPORT.size:
+        # 启动器没能回报（例如被 SIGKILL）
+        return proc.returncode, None
+    status, utime_us, stime_us, maxrss_kb = LAUNCHER_REPORT.unpack(report)
+    return os.waitstatus_to_exitcode(status), Usage(utime_us / 1e6, stime_us / 1e6, maxrss_kb)
+
+
+def _timeout_error(proc, timeout, reaped):
+    e = subprocess.TimeoutExpired(proc.args, timeout)
+    # 超时的测试同样记录资源占用
+    e.usage = reaped[1]
+    return e
+
+
+def _timeout(proc, report_r, timeout):
+    reaped = None
+    if report_r is not None:
+        proc.terminate()
+        deadline = time.monotonic() + TERMINATE_GRACE
+        while reaped is None and time.monotonic() < deadline:
+            time.sleep(0.002)
+            reaped = _reap(proc, report_r, os.WNOHANG)
+    if reaped is None:
+        proc.kill()
+        reaped = _reap(proc, report_r)
+    raise _timeout_error(proc, timeout, reaped)
+
+
+async def _timeout_async(proc, report_r, timeout):
+    reaped = None
+    if report_r is not None:
+        proc.terminate()
+        deadline = time.monotonic() + TERMINATE_GRACE
+        while reaped is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.002)
+            reaped = _reap(proc, report_r, os.WNOHANG)
+    if reaped is None:
+        proc.kill()
+        reaped = _reap(proc, report_r)
+    raise _timeout_error(proc, timeout, reaped)
+
+
+def _write_chunk(proc, pending):
+    """向管道写一块（不超过 PIPE_BUF，不会阻塞），返回剩余数据，写完或对方已关闭时返回 None"""
+    try:
+        pending = pending[os.write(proc.stdin.fileno(), pending[:select.PIPE_BUF]):]
+    except BrokenPipeError:
+        pending = pending[:0]
+    if len(pending) == 0:
+        proc.stdin.close()
+        return None
+    return pending
+
+
+def _wait_child(proc, report_r, input_data, timeout):
+    """
+    把 input_data 写进管道 stdin（proc.stdin 不为 None 时），等子进程退出后用 wait4 回收。
+    返回 (returncode, Usage)，超时结束子进程并抛出 subprocess.TimeoutExpired。
+    """
+    pending = memoryview(input_data).cast("B") if proc.stdin is not None else None
+    if not _pidfd_supported():
+        # 没有 pidfd：定时器到点结束子进程，阻塞写入 / wait4 随之返回
+        killed = threading.Event()
+        stop = proc.terminate if report_r is not None else proc.kill
+        timer = threading.Timer(timeout, lambda: (killed.set(), stop()))
+        timer.start()
+        try:
+            if pending is not None:
+                try:
+                    proc.stdin.write(pending)
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+            reaped = _reap(proc, report_r)
+        finally:
+            timer.cancel()
+        if killed.is_set():
+            raise _timeout_error(proc, timeout, reaped)
+        return reaped
+
+    deadline = time.monotonic() + timeout
+    pidfd = os.pidfd_open(proc.pid)
+    try:
+        if pending is not None and len(pending) == 0:
+            proc.stdin.close()
+            pending = None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _timeout(proc, report_r, timeout)
+            writers = [proc.stdin] if pending is not None else []
+            exited, writable, _ = select.select([pidfd], writers, [], remaining)
+            if writable:
+                pending = _write_chunk(proc, pending)
+            if exited:
+                return _reap(proc, report_r)
+    finally:
+        os.close(pidfd)
+        if proc.stdin is not None and not proc.stdin.closed:
+            proc.stdin.close()
+
+
+async def _wait_child_async(proc, report_r, timeout):
+    """_wait_child 的 asyncio 版本（stdin 必须是文件），pidfd 可读即子进程已退出"""
+    loop = asyncio.get_running_loop()
+    if not _pidfd_supported():
+        return await loop.run_in_executor(None, _wait_child, proc, report_r, b"", timeout)
+    pidfd = os.pidfd_open(proc.pid)
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await asyncio.wait_for(exited, timeout)
+    except asyncio.TimeoutError:
+        await _timeout_async(proc, report_r, timeout)
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return _reap(proc, report_r)
+
+
+def _shell_command(exe_file, time_limit_int, memory_kb):
+    cmd = f"ulimit -t {_cpu_seconds(time_limit_int)} && ulimit -v {memory_kb}"
+    if OUTPUT_LIMIT:
+        # POSIX sh（dash）的 ulimit -f 以 512 字节为单位
+        cmd += f" && ulimit -f {-(-OUTPUT_LIMIT // 512)}"
+    return f"{cmd} && {exe_file}"
+
+
+def _spawn(exe_file, time_limit_int, memory_kb, io):
+    """返回 (proc, report_r)，report_r 为启动器回报 rusage 的管道读端，不经过启动器时为 None"""
+    if RUNNER == "shell":
+        # sh 的 rusage 包含它回收的测试进程
+        return subprocess.Popen(_shell_command(exe_file, time_limit_int, memory_kb), shell=True, **io.popen_kwargs()), None
+    launcher = get_launcher()
+    if not launcher:
+        # 编译不了启动器时退回 preexec_fn（会让 subprocess 改用较慢的 fork）
+        preexec_fn = lambda: _set_limits(time_limit_int, memory_kb)
+        return subprocess.Popen([exe_file], preexec_fn=preexec_fn, **io.popen_kwargs()), None
+    report_r, report_w = os.pipe()
+    args = [launcher, str(_cpu_seconds(time_limit_int)), str(memory_kb * 1024), str(OUTPUT_LIMIT), str(report_w), exe_file]
+    try:
+        proc = subprocess.Popen(args, pass_fds=(report_w,), **io.popen_kwargs())
+    except BaseException:
+        os.close(report_r)
+        raise
+    finally:
+        os.close(report_w)
+    return proc, report_r
+
+
+def _run_spawned(exe_file, input_data, time_limit_int, memory_kb):
+    """direct / shell：每个测试启动一个进程"""
+    with TestIO(input_data) as io:
+        proc, report_r = _spawn(exe_file, time_limit_int, memory_kb, io)
+        try:
+            returncode, usage = _wait_child(proc, report_r, io.input, time_limit_int)
+        finally:
+            if report_r is not None:
+                os.close(report_r)
+        return io.completed(proc.args, returncode, usage)
+
+
+FORKSRV_CTL_FD = 198
+FORKSRV_ST_FD = 199
+FORKSRV_HELLO = 0x54434246
+# 请求: cpu 秒, 地址空间字节, 输出文件大小上限 (0 表示不限), stdin/stdout/stderr 路径
+FORKSRV_REQUEST = struct.Struct("=QQQ512s512s512s")
+# 回复: status, user 微秒, sys 微秒, maxrss KB
+FORKSRV_RESPONSE = struct.Struct("=qqqq")
+FORKSRV_START_TIMEOUT = 5
+
+FORKSRV_SHIM_SRC = r"""
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#define CTL_FD %(ctl_fd)d
+#define ST_FD %(st_fd)d
+
+struct request {
+    uint64_t cpu;
+    uint64_t as;
+    uint64_t fsize;
+    char in[512];
+    char out[512];
+    char err[512];
+} __attribute__((packed));
+
+static int read_full(int fd, void *buf, size_t n) {
+    size_t got = 0;
+    while (got < n) {
+        ssize_t r = read(fd, (char *)buf + got, n - got);
+        if (r <= 0) return -1;
+        got += r;
+    }
+    return 0;
+}
+
+static void redirect(const char *path, int flags, int target) {
+    int fd = open(path, flags, 0644);
+    if (fd < 0) _exit(127);
+    if (fd != target) {
+        dup2(fd, target);
+        close(fd);
+    }
+}
+
+__attribute__((constructor)) static void tcb_forkserver(void) {
+    if (!getenv("TCB_FORKSRV")) return;
+    unsetenv("TCB_FORKSRV");
+    int64_t hello = %(hello)d;
+    if (write(ST_FD, &hello, sizeof(hello)) != sizeof(hello)) return;
+    for (;;) {
+        struct request req;
+        if (read_full(CTL_FD, &req, sizeof(req)) < 0) _exit(0);
+        pid_t pid = fork();
+        if (pid < 0) _exit(1);
+        if (pid == 0) {
+            struct rlimit rl;
+            close(CTL_FD);
+            close(ST_FD);
+            rl.rlim_cur = rl.rlim_max = req.cpu;
+            setrlimit(RLIMIT_CPU, &rl);
+            rl.rlim_cur = rl.rlim_max = req.as;
+            setrlimit(RLIMIT_AS, &rl);
+            if (req.fsize) {
+                rl.rlim_cur = rl.rlim_max = req.fsize;
+                setrlimit(RLIMIT_FSIZE, &rl);
+            }
+            redirect(req.in, O_RDONLY, 0);
+            redirect(req.out, O_WRONLY | O_CREAT | O_TRUNC, 1);
+            redirect(req.err, O_WRONLY | O_CREAT | O_TRUNC, 2);
+            return;
+        }
+        int64_t child = pid;
+        if (write(ST_FD, &child, sizeof(child)) != sizeof(child)) _exit(1);
+        int status;
+        struct rusage ru;
+        if (wait4(pid, &status, 0, &ru) < 0) _exit(1);
+        int64_t resp[4] = {
+            status,
+            (int64_t)ru.ru_utime.tv_sec * 1000000 + ru.ru_utime.tv_usec,
+            (int64_t)ru.ru_stime.tv_sec * 1000000 + ru.ru_stime.tv_usec,
+            ru.ru_maxrss,
+        };
+        if (write(ST_FD, resp, sizeof(resp)) != sizeof(resp)) _exit(1);
+    }
+}
+""" % {"ctl_fd": FORKSRV_CTL_FD, "st_fd": FORKSRV_ST_FD, "hello": FORKSRV_HELLO}
+
+
+class ForkServerError(Exception):
+    pass
+
+
+_shim = None
+
+
+def get_forkserver_shim():
+    global _shim
+    if _shim is None:
+        _shim = build_helper("forkserver.so", FORKSRV_SHIM_SRC, [["-O2", "-shared", "-fPIC"]]) or ""
+    return _shim
+
+
+def _read_exact(fd, n, timeout):
+    data = b""
+    while len(data) < n:
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if not ready:
+            return None
+        chunk = os.read(fd, n - len(data))
+        if not chunk:
+            raise ForkServerError("fork server exited")
+        data += chunk
+    return data
+
+
+class ForkServer:
+    """一个可执行文件对应一个 fork server，进程在 main 之前停住，每个测试 fork 一次"""
+
+    def __init__(self, exe_file):
+        self.exe_file = exe_file
+        self.workdir = tempfile.mkdtemp()
+        ctl_r, self.ctl_w = os.pipe()
+        self.st_r, st_w = os.pipe()
+
+        def setup_fds():
+            os.dup2(ctl_r, FORKSRV_CTL_FD)
+            os.dup2(st_w, FORKSRV_ST_FD)
+
+        shim = get_forkserver_shim()
+        if not shim:
+            raise ForkServerError("fork server shim could not be built")
+        env = dict(os.environ)
+        env["LD_PRELOAD"] = shim
+        env["TCB_FORKSRV"] = "1"
+        self.proc = subprocess.Popen(
+            [exe_file],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            close_fds=False,
+            preexec_fn=setup_fds
+        )
+        os.close(ctl_r)
+        os.close(st_w)
+        try:
+            hello = _read_exact(self.st_r, 8, FORKSRV_START_TIMEOUT)
+        except ForkServerError:
+            hello = None
+        if hello is None or struct.unpack("=q", hello)[0] != FORKSRV_HELLO:
+            self.close()
+            raise ForkServerError(f"fork server did not start for {exe_file}")
+
+    def run(self, input_data, time_limit_int, memory_kb):
+        in_file = os.path.join(self.workdir, "stdin")
+        out_file = os.path.join(self.workdir, "stdout")
+        err_file = os.path.join(self.workdir, "stderr")
+        if isinstance(input_data, str):
+            input_data = input_data.encode()
+        with open(in_file, "wb") as f:
+            f.write(input_data)
+        request = FORKSRV_REQUEST.pack(
+            _cpu_seconds(time_limit_int), memory_kb * 1024, OUTPUT_LIMIT,
+            in_file.encode(), out_file.encode(), err_file.encode()
+        )
+        os.write(self.ctl_w, request)
+        pid_data = _read_exact(self.st_r, 8, FORKSRV_START_TIMEOUT)
+        if pid_data is None:
+            raise ForkServerError("fork server did not answer")
+        pid = struct.unpack("=q", pid_data)[0]
+
+        response = _read_exact(self.st_r, FORKSRV_RESPONSE.size, time_limit_int)
+        if response is None:
+            # 超时：杀掉子进程，等 server 回收后再报告 TLE
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            response = _read_exact(self.st_r, FORKSRV_RESPONSE.size, FORKSRV_START_TIMEOUT)
+            if response is None:
+                raise ForkServerError("fork server did not reap timed out child")
+            _, utime_us, stime_us, maxrss_kb = FORKSRV_RESPONSE.unpack(response)
+            e = subprocess.TimeoutExpired([self.exe_file], time_limit_int)
+            e.usage = Usage(utime_us / 1e6, stime_us / 1e6, maxrss_kb)
+            raise e
+
+        status, utime_us, stime_us, maxrss_kb = FORKSRV_RESPONSE.unpack(response)
+        if os.WIFSIGNALED(status):
+            returncode = 128 + os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        with open(out_file, "rb") as f:
+            stdout = f.read()
+        with open(err_file, "rb") as f:
+            stderr = f.read()
+        return _completed([self.exe_file], returncode, stdout, stderr, Usage(utime_us / 1e6, stime_us / 1e6, maxrss_kb))
+
+    def close(self):
+        for fd in (self.ctl_w, self.st_r):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+_server = None
+_no_forkserver = set()
+
+
+def close_forkserver():
+    global _server
+    if _server is not None:
+        _server.close()
+        _server = None
+
+
+atexit.register(close_forkserver)
+
+
+def _run_forkserver(exe_file, input_data, time_limit_int, memory_kb):
+    global _server
+    if exe_file in _no_forkserver:
+        return _run_spawned(exe_file, input_data, time_limit_int, memory_kb)
+    if _server is None or _server.exe_file != exe_file:
+        close_forkserver()
+        try:
+            _server = ForkServer(exe_file)
+        except ForkServerError:
+            _no_forkserver.add(exe_file)
+            return _run_spawned(exe_file, input_data, time_limit_int, memory_kb)
+    try:
+        return _server.run(input_data, time_limit_int, memory_kb)
+    except ForkServerError:
+        # server 异常退出时本条测试改用 direct，下一条测试重新拉起 server
+        close_forkserver()
+        return _run_spawned(exe_file, input_data, time_limit_int, memory_kb)
+
+
+def run_test(exe_file, input_data, time_limit_int, memory_kb):
+    """
+    input_data 为 bytes（str 按 UTF-8 编码），返回的 stdout / stderr 为 bytes。
+    超时抛出 subprocess.TimeoutExpired，与 subprocess.run 相同
+    """
+    if RUNNER == "forkserver":
+        return _run_forkserver(exe_file, input_data, time_limit_int, memory_kb)
+    return _run_spawned(exe_file, input_data, time_limit_int, memory_kb)
+
+
+def run_step(request):
+    """
+    执行 run_cpp_code_steps 的一步：
+    ("compile", source, flags, workdir) -> (耗时秒, compile_cpp 的返回值)
+    ("run", exe_file, input_data, time_limit_int, memory_kb) -> (耗时秒, CompletedProcess 或异常)
+    time_limit_int 为超时秒数，可以是小数（time_limits.py 校准的超时）
+    """
+    start_time = time.perf_counter()
+    if request[0] == "compile":
+        compiled = compile_cache.compile_cpp(*request[1:])
+        return time.perf_counter() - start_time, compiled
+    try:
+        result = run_test(*request[1:])
+    except Exception as e:
+        result = e
+    return time.perf_counter() - start_time, result
+
+
+def execute_steps(steps):
+    """同步驱动 run_cpp_code_steps，返回它最终的 infos"""
+    reply = None
+    try:
+        while True:
+            try:
+                request = steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply = run_step(request)
+    finally:
+        steps.close()
+
+
+async def run_test_async(exe_file, input_data, time_limit_int, memory_kb):
+    """
+    run_test 的 asyncio 版本，返回值和超时行为相同。输入总是写成临时文件，退出通过 pidfd 等待。
+    shell runner 照旧走 sh，其余 runner 都用 direct 的方式启动（fork server 是同步协议）。
+    """
+    with TestIO(input_data, input_file=True) as io:
+        proc, report_r = _spawn(exe_file, time_limit_int, memory_kb, io)
+        try:
+            returncode, usage = await _wait_child_async(proc, report_r, time_limit_int)
+        finally:
+            if report_r is not None:
+                os.close(report_r)
+        return io.completed(proc.args, returncode, usage)
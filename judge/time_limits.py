@@ -0,0 +1,226 @@
+"""
+Per-problem test timeouts calibrated from reference solutions.
+
+By default a test may run for time_limit // 1000 + 3 seconds, so every looping wrong
+code burns ~4 s per test on a 1 s problem. `python time_limits.py` compiles a
+problem's accepted `solutions`, runs them on its tests on this machine and stores
+
+    timeout = clamp(max reference seconds * factor + slack, floor, ceiling)
+
+per problem (ceiling defaults to the old time_limit // 1000 + 3, so a calibrated
+timeout is never looser than before). parallel_exe.py / filter_testcases.py take the
+file through --time_limits; run_cpp_code_steps then uses infos["timeout"] and falls
+back to the old formula for problems that are missing from it.
+
+Every reference solution finishes well inside its timeout (factor x its slowest test
+here), so a TLE still means "far slower than any accepted solution on this machine".
+Problems are timed --cpu at a time (default 50, like parallel_exe.py), so pass the
+evaluation's --cpu: references timed on an otherwise idle machine run faster than the
+same binaries under full evaluation load. Reference runs that exit with an error are
+left out of the timing and reported.
+"""
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+import compile_cache
+import runner
+
+DEFAULT_FACTOR = 3.0
+DEFAULT_SLACK = 0.5
+DEFAULT_FLOOR = 1.0
+
+
+def legacy_timeout(time_limit):
+    """time_limit 为题目时限（毫秒），返回原来的测试超时（秒）"""
+    return int(time_limit) // 1000 + 3
+
+
+def effective_timeout(infos):
+    """infos["timeout"]（秒，--time_limits 校准得到）优先，否则沿用 time_limit // 1000 + 3"""
+    timeout = infos.get("timeout")
+    if timeout:
+        return timeout
+    return legacy_timeout(infos["time_limit"])
+
+
+def calibrated_timeout(reference_seconds, factor=DEFAULT_FACTOR, slack=DEFAULT_SLACK, floor=DEFAULT_FLOOR, ceiling=None):
+    timeout = max(reference_seconds * factor + slack, floor)
+    if ceiling is not None:
+        timeout = min(timeout, ceiling)
+    return round(timeout, 3)
+
+
+def load_time_limits(path):
+    """返回 problem_id -> 超时秒数"""
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    return {problem_id: entry["timeout"] for problem_id, entry in calibration["problems"].items()}
+
+
+def apply_time_limits(data, time_limits):
+    """给 time_limits 里有的题目的代码项设置 item["timeout"]，返回设置了的项数"""
+    applied = 0
+    for item in data:
+        timeout = time_limits.get(item["problem_id"])
+        if timeout:
+            item["timeout"] = timeout
+            applied += 1
+    return applied
+
+
+def read_test_inputs(testcase_path):
+    """与判题时的跳过规则一致：只取期望输出非空的测试，input 为 dict 时取内层"""
+    inputs = []
+    if not os.path.exists(testcase_path):
+        return inputs
+    with open(testcase_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            testcase = json.loads(line)
+            if isinstance(testcase["input"], dict):
+                testcase = testcase["input"]
+            if str(testcase["output"]) == "":
+                continue
+            input_data = testcase["input"]
+            if not isinstance(input_data, str):
+                input_data = str(input_data)
+            inputs.append(input_data.encode("utf-8"))
+    return inputs
+
+
+def solution_flags(options, optimize):
+    # filter_testcases 不带 -O 编译参考代码，默认按这个更慢的方式计时，校准结果对两边都偏保守
+    flags = [f"-std={options['std']}"]
+    if optimize:
+        level = options["O"]
+        flags.insert(0, f"-O{'2' if level == 'fast' else level}")
+    return flags
+
+
+def time_solution(code, flags, inputs, ceiling, memory_kb, repeat, workdir):
+    """
+    返回 (参考代码在各测试上的最长用时, 运行出错的测试数)，每个测试取 repeat 次中最短的 wall 秒。
+    编译失败或没有一个测试正常结束时用时为 None。运行出错的测试不计时（生成的测试本身可能不合法，
+    出错退出的用时也不代表完整运行），超时按 ceiling 计。
+    """
+    # 与 excute_tool_filter.remove_freopen_lines 一样去掉 freopen
+    source = "\n".join(line for line in code.splitlines() if "freopen" not in line)
+    exe_file, _ = compile_cache.compile_cpp(source, flags, workdir)
+    if exe_file is None:
+        return None, 0
+    slowest = None
+    errors = 0
+    for input_data in inputs:
+        best = math.inf
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            try:
+                result = runner.run_test(exe_file, input_data, ceiling, memory_kb)
+            except Exception:
+                best = ceiling
+                break
+            elapsed = time.perf_counter() - start_time
+            if result.returncode != 0:
+                best = None
+                break
+            best = min(best, elapsed)
+        if best is None:
+            errors += 1
+            continue
+        slowest = best if slowest is None else max(slowest, best)
+    return slowest, errors
+
+
+def calibrate_problem(task):
+    item, testcase_path, options = task
+    ceiling = options["ceiling"] or legacy_timeout(item["runtime_limit"])
+    inputs = read_test_inputs(testcase_path)
+    solutions = item["solutions"]
+    if len(solutions) > options["max_solutions"]:
+        solutions = random.Random(item["tcb_id"]).sample(solutions, options["max_solutions"])
+    memory_kb = int(item["memory_limit"]) * 1024 * 5
+
+    reference_seconds = []
+    runtime_errors = 0
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for solution in solutions:
+            flags = solution_flags(solution["compileAndRunOptions"], options["optimize"])
+            seconds, errors = time_solution(solution["code"], flags, inputs, ceiling, memory_kb, options["repeat"], tmpdirname)
+            runtime_errors += errors
+            if seconds is not None:
+                reference_seconds.append(seconds)
+    if not inputs or not reference_seconds:
+        return item["tcb_id"], None, runtime_errors
+
+    slowest = max(reference_seconds)
+    return item["tcb_id"], {
+        "timeout": calibrated_timeout(slowest, options["factor"], options["slack"], options["floor"], ceiling),
+        "reference_seconds": round(slowest, 6),
+        "time_limit": item["runtime_limit"],
+        "solutions": len(reference_seconds),
+        "tests": len(inputs),
+        "runtime_errors": runtime_errors,
+    }, runtime_errors
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate per-problem test timeouts from reference solutions.")
+    parser.add_argument('--data_path', type=str, default='TestcaseBench-v29.json', help="TC-Bench data path")
+    parser.add_argument('--tests_dir', type=str, required=True, help="directory with the tests-{tcb_id}.jsonl files the timeouts will be used on")
+    parser.add_argument('--output', type=str, default='time_limits.json', help="calibration file, pass it to --time_limits")
+    parser.add_argument('--factor', type=float, default=DEFAULT_FACTOR, help="timeout = slowest reference seconds * factor + slack")
+    parser.add_argument('--slack', type=float, default=DEFAULT_SLACK, help="seconds added after scaling")
+    parser.add_argument('--floor', type=float, default=DEFAULT_FLOOR, help="minimum timeout (seconds)")
+    parser.add_argument('--ceiling', type=float, default=0, help="maximum timeout (seconds), 0: time_limit // 1000 + 3 of each problem")
+    parser.add_argument('--max_solutions', type=int, default=8, help="reference solutions timed per problem")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per test, the fastest one counts")
+    parser.add_argument('--optimize', action='store_true', help="compile with the solutions' -O level (default: no -O, like filter_testcases.py)")
+    parser.add_argument('--cpu', type=int, default=50, help="problems calibrated in parallel; use the evaluation's --cpu so the references are timed under the same load")
+    parser.add_argument('--compile_cache_dir', type=str, default="", help="compiled binary cache dir (e.g. ~/.cache/tcb-compile), empty: no cache")
+    parser.add_argument('--runner', type=str, default="shell", choices=runner.RUNNERS, help="test runner, use the one the evaluation uses")
+    args = parser.parse_args()
+
+    compile_cache.configure(args.compile_cache_dir)
+    runner.configure(args.runner)
+    options = {
+        "factor": args.factor,
+        "slack": args.slack,
+        "floor": args.floor,
+        "ceiling": args.ceiling,
+        "max_solutions": args.max_solutions,
+        "repeat": max(1, args.repeat),
+        "optimize": args.optimize,
+        "cpu": args.cpu,
+    }
+
+    ds = json.load(open(args.data_path, "r", encoding="utf-8"))
+    tasks = []
+    for item in ds:
+        testcase_path = os.path.join(args.tests_dir, f"tests-{item['tcb_id']}.jsonl")
+        if item.get("solutions") and os.path.exists(testcase_path):
+            tasks.append((item, testcase_path, options))
+
+    problems = {}
+    with Pool(args.cpu) as pool:
+        for problem_id, entry, runtime_errors in pool.imap_unordered(calibrate_problem, tasks):
+            if runtime_errors:
+                print(f"{problem_id}: {runtime_errors} reference runs exited with an error, not timed")
+            if entry is None:
+                print(f"{problem_id}: no reference solution could be timed, keeping the default timeout")
+                continue
+            problems[problem_id] = entry
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"params": options, "problems": dict(sorted(problems.items()))}, f, indent=2)
+
+    saved = sum(legacy_timeout(entry["time_limit"]) - entry["timeout"] for entry in problems.values())
+    print(f"calibrated {len(problems)}/{len(tasks)} problems -> {args.output}")
+    print(f"worst-case seconds saved per TLE test, summed over problems: {saved:.1f}")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 仓库里的脚本都按所在目录平铺导入，测试把这几个目录放进 sys.path
+for _name in ("data_construction", "evaluation", "judge"):
+    sys.path.insert(0, os.path.join(ROOT, _name))
@@ -0,0 +1,72 @@
+import shutil
+
+import pytest
+
+import async_engine
+import runner
+from excute_tool_linux import run_cpp_code_steps
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="g++ not available")
+
+PROGRAM = r"""
+#include <cstdio>
+#include <cstdlib>
+int main() {
+    long long n;
+    if (scanf("%lld", &n) != 1) return 2;
+    if (n < 0) { volatile unsigned long x = 0; for (;;) x++; }
+    if (n == 7) abort();
+    printf("%lld\n", n * n);
+    return 0;
+}
+"""
+
+
+def make_items():
+    def item(code, cases, timeout=None):
+        infos = {
+            "code": code,
+            "time_limit": 1000,
+            "memory_limit": 256,
+            "test_cases": [{"input": str(n), "output": str(out)} for n, out in cases],
+            "compileAndRunOptions": {"O": "2", "std": "c++17"},
+        }
+        if timeout:
+            infos["timeout"] = timeout
+        return infos
+
+    return [
+        item(PROGRAM, [(1, 1), (2, 4), (3, 9)]),
+        item(PROGRAM, [(2, 4), (3, 10), (7, 49)]),
+        # 超时：墙钟 0.5 秒先于 RLIMIT_CPU 到达
+        item(PROGRAM, [(4, 16), (-1, 1), (5, 25)], timeout=0.5),
+        item("int main() { return x; }", [(1, 1)]),
+    ]
+
+
+def verdicts(infos):
+    # CE 的 details 是编译器输出，含临时目录路径，只比较状态
+    details = infos["details"] if infos["error"] != ["CE"] else None
+    return infos["error"], details, [run[:2] for run in infos["runs"]]
+
+
+@pytest.mark.parametrize("runner_name", ["direct", "shell"])
+def test_async_engine_matches_execute_steps(runner_name, monkeypatch):
+    monkeypatch.setattr(runner, "RUNNER", runner_name)
+    expected = [runner.execute_steps(run_cpp_code_steps(item)) for item in make_items()]
+    outcomes = async_engine.run_items(make_items(), run_cpp_code_steps, concurrency=3)
+    assert [verdicts(infos) for infos in outcomes] == [verdicts(infos) for infos in expected]
+    assert verdicts(outcomes[1])[0] == ["AC", "WA", "RE"]
+    assert verdicts(outcomes[2])[0] == ["AC", "TLE", "AC"]
+    assert verdicts(outcomes[3])[0] == ["CE"]
+    # 两个引擎记录同样的字段
+    for infos, ref in zip(outcomes, expected):
+        assert sorted(infos) == sorted(ref)
+        assert [len(run) for run in infos["runs"]] == [len(run) for run in ref["runs"]]
+
+
+def test_split_batches_keeps_order():
+    items = list(range(10))
+    batches = async_engine.split_batches(items, 1)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [x for batch in batches for x in batch] == items
@@ -0,0 +1,36 @@
+import os
+
+import cbuild
+import compile_cache
+
+
+def test_is_private(tmp_path):
+    path = os.path.join(tmp_path, "helper")
+    with open(path, "w") as f:
+        f.write("")
+    os.chmod(path, 0o700)
+    assert cbuild._is_private(path, is_dir=False)
+    assert not cbuild._is_private(path, is_dir=True)
+    os.chmod(path, 0o722)
+    assert not cbuild._is_private(path, is_dir=False)
+    link = os.path.join(tmp_path, "link")
+    os.symlink(path, link)
+    os.chmod(path, 0o700)
+    assert not cbuild._is_private(link, is_dir=False)
+    assert not cbuild._is_private(os.path.join(tmp_path, "missing"), is_dir=False)
+
+
+def test_helper_dir_rejects_shared_directory(tmp_path, monkeypatch):
+    shared = os.path.join(tmp_path, "shared")
+    os.mkdir(shared)
+    os.chmod(shared, 0o777)
+    monkeypatch.setattr(compile_cache, "CACHE_DIR", shared)
+    monkeypatch.setattr(cbuild, "_fallback_helper_dir", None)
+    helper_dir = cbuild._helper_dir()
+    assert helper_dir != shared
+    assert cbuild._is_private(helper_dir, is_dir=True)
+
+    private = os.path.join(tmp_path, "private")
+    os.mkdir(private, 0o700)
+    monkeypatch.setattr(compile_cache, "CACHE_DIR", private)
+    assert cbuild._helper_dir() == private
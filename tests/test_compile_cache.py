@@ -0,0 +1,125 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import compile_cache
+
+needs_gxx = pytest.mark.skipif(shutil.which("g++") is None, reason="g++ not available")
+
+HELLO = '#include <cstdio>\nint main() { puts("hi"); return 0; }\n'
+BROKEN = "int main() { return x; }\n"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(compile_cache, "_inserts", 0)
+    compile_cache.configure(str(tmp_path / "cache"))
+    yield str(tmp_path / "cache")
+    compile_cache.configure("")
+
+
+def test_cache_key_covers_compiler_flags_and_source(monkeypatch):
+    key = compile_cache.cache_key(HELLO, ["-O2"])
+    assert key == compile_cache.cache_key(HELLO, ["-O2"])
+    assert key != compile_cache.cache_key(HELLO, ["-O0"])
+    assert key != compile_cache.cache_key(HELLO, ["-O2", "-std=c++17"])
+    assert key != compile_cache.cache_key(HELLO + "\n", ["-O2"])
+    monkeypatch.setattr(compile_cache, "compiler_version", lambda compiler="g++": "g++ (other) 99.0\n")
+    assert key != compile_cache.cache_key(HELLO, ["-O2"])
+
+
+@needs_gxx
+def test_store_then_lookup_hits(cache, tmp_path):
+    workdir = tmp_path / "w1"
+    workdir.mkdir()
+    exe_file, stderr = compile_cache.compile_cpp(HELLO, ["-O0"], str(workdir))
+    assert stderr == "" and os.path.dirname(exe_file) == str(workdir)
+    key = compile_cache.cache_key(HELLO, ["-O0"])
+    cached_exe, _, hit = compile_cache.lookup(key)
+    assert hit and cached_exe.startswith(cache)
+
+    # 第二次不再编译：拿到的是缓存条目在新 workdir 里的链接
+    workdir = tmp_path / "w2"
+    workdir.mkdir()
+    exe_file, _ = compile_cache.compile_cpp(HELLO, ["-O0"], str(workdir))
+    assert os.path.dirname(exe_file) == str(workdir)
+    assert os.listdir(workdir) == [os.path.basename(exe_file)]
+    assert subprocess.run([exe_file], capture_output=True).stdout == b"hi\n"
+
+
+@needs_gxx
+def test_compile_errors_are_cached(cache, tmp_path, monkeypatch):
+    exe_file, stderr = compile_cache.compile_cpp(BROKEN, ["-O0"], str(tmp_path))
+    assert exe_file is None and "error" in stderr
+    monkeypatch.setattr(subprocess, "run", lambda *args, **kwargs: pytest.fail("compiled again"))
+    assert compile_cache.compile_cpp(BROKEN, ["-O0"], str(tmp_path)) == (None, stderr)
+
+
+@needs_gxx
+def test_evicted_binary_keeps_running(cache, tmp_path, monkeypatch):
+    exe_file, _ = compile_cache.compile_cpp(HELLO, ["-O0"], str(tmp_path))
+    exe_file, _ = compile_cache.compile_cpp(HELLO, ["-O0"], str(tmp_path))
+    monkeypatch.setattr(compile_cache, "EVICT_GRACE_SECONDS", 0)
+    compile_cache.evict(max_bytes=0)
+    assert compile_cache.lookup(compile_cache.cache_key(HELLO, ["-O0"]))[2] is False
+    assert subprocess.run([exe_file], capture_output=True).stdout == b"hi\n"
+
+
+def test_atomic_store_replaces(tmp_path, monkeypatch):
+    path = str(tmp_path / "ab" / "abcd.ce")
+    compile_cache._atomic_store(path, text="old")
+    with open(path) as reader:
+        compile_cache._atomic_store(path, text="new")
+        # 已打开的读者仍看到完整的旧条目，新打开的看到新条目
+        assert reader.read() == "old"
+    with open(path) as f:
+        assert f.read() == "new"
+
+    src = tmp_path / "a.out"
+    src.write_bytes(b"binary")
+
+    def broken_copy(src_file, dst):
+        with open(dst, "wb") as f:
+            f.write(b"bin")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(shutil, "copy2", broken_copy)
+    with pytest.raises(OSError):
+        compile_cache._atomic_store(path, src_file=str(src))
+    # 写到一半失败：旧条目不变，不留临时文件
+    with open(path) as f:
+        assert f.read() == "new"
+    assert os.listdir(tmp_path / "ab") == ["abcd.ce"]
+
+
+def test_pch_error_detection():
+    assert compile_cache._PCH_ERROR_RE.search("cc1plus: error: one or more PCH files were found, but they were invalid")
+    assert compile_cache._PCH_ERROR_RE.search("/cache/pch/ab/bits/stdc++.h.gch: created by a different GCC executable")
+    assert not compile_cache._PCH_ERROR_RE.search("a.cpp:3:5: error: 'foo' was not declared in this scope")
+
+
+def test_can_use_pch():
+    assert compile_cache.can_use_pch("// header\n/* block\n comment */\n#include <bits/stdc++.h>\nint main() {}")
+    assert not compile_cache.can_use_pch("#include <cstdio>\n#include <bits/stdc++.h>\n")
+
+
+def test_evict_counts_pch(tmp_path, monkeypatch):
+    monkeypatch.setattr(compile_cache, "CACHE_DIR", str(tmp_path))
+    old = 1_000_000
+    pch_dir = os.path.join(tmp_path, "pch", "k1", "bits")
+    os.makedirs(pch_dir)
+    gch = os.path.join(pch_dir, "stdc++.h.gch")
+    with open(gch, "wb") as f:
+        f.write(b"\0" * 4000)
+    os.makedirs(os.path.join(tmp_path, "ab"))
+    entry = os.path.join(tmp_path, "ab", "abcd.out")
+    with open(entry, "wb") as f:
+        f.write(b"\0" * 1000)
+    os.utime(gch, (old, old))
+    os.utime(entry, (old + 10, old + 10))
+    # pch 计入总量：超出上限时最旧的 pch 目录被整体删除，较新的条目保留
+    compile_cache.evict(max_bytes=3000)
+    assert not os.path.exists(os.path.join(tmp_path, "pch", "k1"))
+    assert os.path.exists(entry)
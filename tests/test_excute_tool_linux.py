@@ -0,0 +1,181 @@
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+import compile_cache
+import runner
+from excute_tool_linux import run_cpp_code_steps, NOT_RUN, TLE_SKIPPED
+from runner import OLE_RETURNCODE, execute_steps
+
+
+def make_infos(test_cases, **extra):
+    infos = {
+        "code": "int main() {}",
+        "time_limit": 1000,
+        "memory_limit": 256,
+        "test_cases": test_cases,
+        "compileAndRunOptions": {"O": "2", "std": "c++17"},
+    }
+    infos.update(extra)
+    return infos
+
+
+def judge(infos, outputs, test_mode=False):
+    """
+    不编译也不启动进程，直接驱动 run_cpp_code_steps：编译总是成功，
+    outputs 为 输入 -> (returncode, stdout)。返回最终的 infos 和按顺序执行过的输入
+    """
+    steps = run_cpp_code_steps(infos, test_mode)
+    executed = []
+    reply = None
+    while True:
+        try:
+            request = steps.send(reply)
+        except StopIteration as stop:
+            return stop.value, executed
+        if request[0] == "compile":
+            reply = (0.0, ("exe", ""))
+        else:
+            input_data = request[2]
+            executed.append(input_data)
+            returncode, stdout = outputs[input_data]
+            reply = (0.001, subprocess.CompletedProcess(["exe"], returncode, stdout, b""))
+
+
+def test_lazy_sample_runs_only_sampled_tests():
+    tests = [{"input": str(i), "output": str(i)} for i in range(6)]
+    outputs = {str(i): (0, str(i).encode()) for i in range(6)}
+    infos, executed = judge(make_infos(tests, test_indices=[1, 4]), outputs)
+    assert executed == ["1", "4"]
+    assert infos["error"] == [NOT_RUN, "AC", NOT_RUN, NOT_RUN, "AC", NOT_RUN]
+
+
+def test_lazy_sample_positions_skip_empty_outputs():
+    # status 下标按跳过空输出后的序号计
+    tests = [{"input": "a", "output": ""}, {"input": "b", "output": "1"}, {"input": "c", "output": "2"}]
+    outputs = {"b": (0, b"1"), "c": (0, b"3")}
+    infos, executed = judge(make_infos(tests, test_indices=[1]), outputs)
+    assert executed == ["c"]
+    assert infos["error"] == [NOT_RUN, "WA"]
+
+
+def test_fail_fast_stops_at_first_failure():
+    tests = [{"input": str(i), "output": "ok"} for i in range(4)]
+    outputs = {"0": (0, b"ok"), "1": (0, b"no"), "2": (0, b"ok"), "3": (0, b"ok")}
+    infos, executed = judge(make_infos(tests), outputs, test_mode=True)
+    assert executed == ["0", "1"]
+    assert infos["error"] == ["WA"]
+
+
+def test_fail_fast_follows_test_order():
+    tests = [{"input": str(i), "output": "ok"} for i in range(3)]
+    outputs = {"0": (0, b"ok"), "1": (0, b"ok"), "2": (0, b"ok")}
+    infos, executed = judge(make_infos(tests, test_order=[2, 0, 1]), outputs, test_mode=True)
+    assert executed == ["2", "0", "1"]
+    assert infos["error"] == ["AC"]
+
+
+def test_returncode_verdicts():
+    assert OLE_RETURNCODE == 153
+    tests = [{"input": str(code), "output": "ok"} for code in (0, 137, 124, 153, 1, 139)]
+    outputs = {str(code): (code, b"ok") for code in (0, 137, 124, 153, 1, 139)}
+    infos, _ = judge(make_infos(tests), outputs)
+    assert infos["error"] == ["AC", "MLE", "TLE", "OLE", "RE", "RE"]
+    assert infos["details"][1] == "MLE: Testcase:1"
+    assert [run[:2] for run in infos["runs"]] == [[0, "AC"], [1, "MLE"], [2, "TLE"], [3, "OLE"], [4, "RE"], [5, "RE"]]
+    # 拿不到 rusage 时后三项为 None
+    assert infos["runs"][0][2:] == [0.001, None, None, None]
+
+
+def test_compile_error_stops_before_running():
+    steps = run_cpp_code_steps(make_infos([{"input": "1", "output": "1"}]))
+    assert next(steps)[0] == "compile"
+    try:
+        steps.send((0.5, (None, "error: expected ';'")))
+    except StopIteration as stop:
+        infos = stop.value
+    assert infos["error"] == ["CE"]
+    assert infos["details"] == ["error: expected ';'"]
+    assert infos["compile_seconds"] == 0.5
+    assert infos["runs"] == []
+
+
+def tle_outputs(pattern):
+    """pattern 中 T 为超时、A 为通过"""
+    tests = [{"input": str(i), "output": "ok"} for i in range(len(pattern))]
+    outputs = {str(i): (124, b"") if c == "T" else (0, b"ok") for i, c in enumerate(pattern)}
+    return tests, outputs
+
+
+def test_tle_budget_consecutive():
+    tests, outputs = tle_outputs("TATTAT")
+    infos, executed = judge(make_infos(tests, tle_budget=2, tle_consecutive=True), outputs)
+    assert executed == ["0", "1", "2", "3"]
+    assert infos["error"] == ["TLE", "AC", "TLE", "TLE", TLE_SKIPPED, TLE_SKIPPED]
+    assert len(infos["runs"]) == 4
+
+
+def test_tle_budget_total():
+    tests, outputs = tle_outputs("TATAAT")
+    infos, executed = judge(make_infos(tests, tle_budget=2, tle_consecutive=False), outputs)
+    assert executed == ["0", "1", "2"]
+    assert infos["error"] == ["TLE", "AC", "TLE", TLE_SKIPPED, TLE_SKIPPED, TLE_SKIPPED]
+
+
+def test_no_tle_budget_runs_everything():
+    tests, outputs = tle_outputs("TTTT")
+    infos, executed = judge(make_infos(tests), outputs)
+    assert len(executed) == 4
+    assert infos["error"] == ["TLE"] * 4
+
+
+IO_PROGRAM = r"""
+#include <cstdio>
+#include <cstring>
+int main() {
+    char mode[8];
+    long long n, x, sum = 0;
+    if (scanf("%7s %lld", mode, &n) != 2) return 1;
+    if (!strcmp(mode, "sum")) {
+        for (long long i = 0; i < n && scanf("%lld", &x) == 1; i++) sum += x;
+        printf("%lld\n", sum);
+    } else {
+        FILE *out = strcmp(mode, "out") ? stderr : stdout;
+        for (long long i = 0; i < n; i++) fputc('x', out);
+    }
+    return 0;
+}
+"""
+
+
+@pytest.fixture(params=["shell", "direct"])
+def limited_runner(request, monkeypatch):
+    monkeypatch.setattr(runner, "RUNNER", request.param)
+    monkeypatch.setattr(runner, "OUTPUT_LIMIT", 1024 ** 2)
+    return request.param
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="g++ not available")
+def test_large_io_and_output_limit(limited_runner):
+    big_input = "sum 600000 " + "1 " * 600000
+    # 超过阈值的输入写成临时文件作为 stdin
+    assert len(big_input) > runner.INPUT_FILE_THRESHOLD
+    with runner.TestIO(big_input) as io:
+        assert io.stdin is not None and io.input is None
+    tests = [
+        {"input": big_input, "output": "600000"},
+        {"input": "out 4000000", "output": "x"},
+        {"input": "err 4000000", "output": "x"},
+        {"input": "out 3", "output": "xxx"},
+    ]
+    infos = execute_steps(run_cpp_code_steps(make_infos(tests, code=IO_PROGRAM)))
+    assert infos["error"] == ["AC", "OLE", "OLE", "AC"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        exe_file, _ = compile_cache.compile_cpp(IO_PROGRAM, ["-O2"], workdir)
+        result = runner.run_test(exe_file, "err 4000000", 3, 256 * 1024)
+        # 写满上限就停止：读回的 stderr 不超过上限
+        assert result.returncode == OLE_RETURNCODE
+        assert 0 < len(result.stderr) <= runner.OUTPUT_LIMIT
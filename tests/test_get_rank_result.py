@@ -0,0 +1,160 @@
+import itertools
+import random
+import zlib
+
+import numpy as np
+import pytest
+
+from excute_tool_linux import NOT_RUN, TLE_SKIPPED
+from get_rank_result import RANK_MULTIPLIERS, STATUS_CODES, STATUS_NAMES, bootstrap_problem, compute_bootstrap_result, compute_exact_result, exact_problem_curve, compute_fail_fast_result, find_first_non_ac, verdict_matrix, compute_rank_result, get_problem_test_indices, is_fail_fast_result
+
+STATUSES = ["AC", "AC", "AC", "WA", "TLE", "RE"]
+
+
+def full_results(num_problems=4, num_codes=3, num_tests=40, seed=1):
+    rng = random.Random(seed)
+    results = {}
+    for p in range(num_problems):
+        problem_id = f"p{p}"
+        results[problem_id] = {
+            "problem_id": problem_id,
+            "codes": [{"code_id": f"c{c}", "status": [rng.choice(STATUSES) for _ in range(num_tests)]} for c in range(num_codes)],
+        }
+    return results
+
+
+def lazy_results(results, seed):
+    """--lazy_sample --seed 的结果：没抽到的位置为 NR"""
+    lazy = {}
+    for problem_id, v in results.items():
+        array_length = len(v["codes"][0]["status"])
+        sampled = set(get_problem_test_indices(problem_id, array_length, len(v["codes"]), seed))
+        lazy[problem_id] = {
+            "problem_id": problem_id,
+            "sample_seed": seed,
+            "codes": [{"code_id": code["code_id"], "status": [sta if i in sampled else NOT_RUN for i, sta in enumerate(code["status"])]} for code in v["codes"]],
+        }
+    return lazy
+
+
+def test_problem_test_indices_do_not_depend_on_order():
+    first = get_problem_test_indices("p1", 50, 3, seed=7)
+    random.random()
+    assert get_problem_test_indices("p1", 50, 3, seed=7) == first
+    assert get_problem_test_indices("p2", 50, 3, seed=7) != first
+    assert len(first) == 15 and len(set(first)) == 15
+
+
+def test_lazy_sample_matches_full_run():
+    results = full_results()
+    assert compute_rank_result(lazy_results(results, 3), seed=3) == compute_rank_result(results, seed=3)
+
+
+def test_lazy_sample_rejects_other_seed():
+    with pytest.raises(ValueError):
+        compute_rank_result(lazy_results(full_results(), 3), seed=4)
+
+
+def test_fail_fast_result_counts_first_status():
+    results = {
+        "p0": {"problem_id": "p0", "fail_fast": True, "codes": [{"status": ["WA"]}, {"status": ["AC"]}]},
+        "p1": {"problem_id": "p1", "fail_fast": True, "codes": [{"status": ["TLE"]}, {"status": ["RE"]}, {"status": ["AC"]}, {"status": ["AC"]}]},
+    }
+    assert is_fail_fast_result(results)
+    rank_result, success_k = compute_fail_fast_result(results)
+    assert success_k == {"all": {"total": 6, "hacked": 0.5 + 0.5}}
+    assert rank_result["all"]["AC"] == 0.5 + 0.5
+    assert rank_result["all"]["WA"] == 0.5
+    assert rank_result["all"]["TLE"] == rank_result["all"]["RE"] == 0.25
+
+
+def test_tle_skip_counts_as_tle():
+    assert find_first_non_ac(["AC", TLE_SKIPPED, "WA"]) == "TLE"
+    skipped = {"p0": {"problem_id": "p0", "codes": [{"status": ["AC", "TLE", TLE_SKIPPED, TLE_SKIPPED]}, {"status": ["AC"] * 4}]}}
+    observed = {"p0": {"problem_id": "p0", "codes": [{"status": ["AC", "TLE", "TLE", "TLE"]}, {"status": ["AC"] * 4}]}}
+    assert compute_rank_result(skipped, seed=0) == compute_rank_result(observed, seed=0)
+    assert (verdict_matrix(skipped["p0"]) == verdict_matrix(observed["p0"])).all()
+    assert verdict_matrix(skipped["p0"])[0, 3] == STATUS_CODES["TLE"]
+
+
+def test_bootstrap_problem_matches_loop():
+    results = full_results(num_problems=1, num_codes=4, num_tests=30)
+    v = results["p0"]
+    matrix = verdict_matrix(v)
+    rank, num_seeds = len(v["codes"]), 6
+    shares = bootstrap_problem(matrix, rank, "p0", num_seeds, seed=2)
+    # 用同一个随机源逐组、逐代码重新算第一个非 AC
+    rng = np.random.default_rng([2, zlib.crc32(b"p0")])
+    num_tests = min(rank * RANK_MULTIPLIERS, matrix.shape[1])
+    tests_index = np.argsort(rng.random((num_seeds, matrix.shape[1])), axis=1)[:, :num_tests]
+    for s in range(num_seeds):
+        for i in range(RANK_MULTIPLIERS):
+            expected = np.zeros(len(STATUS_NAMES))
+            for code in v["codes"]:
+                status = find_first_non_ac([code["status"][t] for t in tests_index[s, :rank * (i + 1)]])
+                expected[STATUS_CODES[status]] += 1 / rank
+            assert np.allclose(shares[s, i], expected)
+
+
+def test_bootstrap_result_is_deterministic_and_order_free():
+    results = full_results()
+    reordered = dict(reversed(list(results.items())))
+    rank_result, success_k = compute_bootstrap_result(results, num_seeds=20, seed=5)
+    assert compute_bootstrap_result(results, num_seeds=20, seed=5) == (rank_result, success_k)
+    # 换题目顺序只改变浮点累加顺序
+    reordered_rank_result, reordered_success_k = compute_bootstrap_result(reordered, num_seeds=20, seed=5)
+    for key, summary in success_k.items():
+        assert reordered_success_k[key] == pytest.approx(summary)
+        for name in STATUS_NAMES:
+            assert reordered_rank_result[key][name] == pytest.approx(rank_result[key][name])
+    for key, summary in success_k.items():
+        assert summary["low"] <= summary["mean"] <= summary["high"]
+        assert abs(sum(rank_result[key][name]["mean"] for name in STATUS_NAMES) - 100) < 1e-9
+        assert abs(summary["mean"] - (100 - rank_result[key]["AC"]["mean"])) < 1e-9
+
+
+def test_bootstrap_edge_cases():
+    all_ac = np.zeros((3, 10), dtype=np.int8)
+    assert (bootstrap_problem(all_ac, 3, "p", 4)[:, :, STATUS_CODES["AC"]] == 1).all()
+    all_wa = np.full((2, 10), STATUS_CODES["WA"], dtype=np.int8)
+    assert (bootstrap_problem(all_wa, 2, "p", 4)[:, :, STATUS_CODES["WA"]] == 1).all()
+    empty = np.zeros((2, 0), dtype=np.int8)
+    assert (bootstrap_problem(empty, 2, "p", 4)[:, :, STATUS_CODES["AC"]] == 1).all()
+
+
+def test_exact_curve_matches_enumeration():
+    statuses = [["AC", "WA", "AC", "TLE", "AC", "WA"], ["AC"] * 6, ["RE"] * 6, ["AC", "AC", "AC", "AC", "AC", "MLE"]]
+    matrix = np.array([[STATUS_CODES[sta] for sta in row] for row in statuses], dtype=np.int8)
+    curve = exact_problem_curve(matrix)
+    n = matrix.shape[1]
+    # 所有测试顺序等概率，前 m 个测试里第一个非 AC 的状态
+    orders = list(itertools.permutations(range(n)))
+    for m in range(1, n + 1):
+        expected = np.zeros(len(STATUS_NAMES))
+        for row in statuses:
+            for order in orders:
+                expected[STATUS_CODES[find_first_non_ac([row[t] for t in order[:m]])]] += 1 / len(orders) / len(statuses)
+        assert np.allclose(curve[m - 1], expected)
+
+
+def test_exact_result_matches_bootstrap_mean():
+    results = full_results(num_problems=3, num_codes=3, num_tests=40)
+    rank_result, success_k = compute_exact_result(results)
+    bootstrap_rank_result, bootstrap_success_k = compute_bootstrap_result(results, num_seeds=4000, seed=1)
+    for key in success_k:
+        # compute_exact_result 按题目累加，bootstrap 为百分比
+        exact_rate = success_k[key]["hacked"] / len(results) * 100
+        assert abs(exact_rate - bootstrap_success_k[key]["mean"]) < 1.0
+        for name in STATUS_NAMES:
+            assert abs(rank_result[key][name] / len(results) * 100 - bootstrap_rank_result[key][name]["mean"]) < 1.0
+
+
+def test_exact_result_full_curve():
+    results = full_results(num_problems=2, num_codes=3, num_tests=40)
+    rank_result, success_k = compute_exact_result(results, max_k=None)
+    # 3 个代码、40 个测试：k = ceil(40 / 3) = 14 时用完全部测试
+    assert len(success_k) == 14
+    # 这组数据里每个代码都至少错一个测试，用完全部测试时全部被 hack
+    assert all(find_first_non_ac(code["status"]) != "AC" for v in results.values() for code in v["codes"])
+    assert abs(rank_result["rank14"]["AC"]) < 1e-9
+    assert success_k["rank14"]["hacked"] == pytest.approx(len(results))
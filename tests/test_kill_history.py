@@ -0,0 +1,24 @@
+# test_hash / test_hashes 以 test_ 开头，直接导入会被 pytest 当成测试收集
+import kill_history
+from kill_history import prioritize, update_history
+
+
+def test_hashes_follow_nested_inputs():
+    tests = [{"input": "1 2", "output": "3"}, {"input": {"input": "1 2", "output": "3"}}, {"input": "5", "output": "5"}]
+    hashes = kill_history.test_hashes(tests)
+    assert hashes == [kill_history.test_hash(testcase) for testcase in tests]
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_update_and_prioritize():
+    hashes = kill_history.test_hashes([{"input": str(i), "output": ""} for i in range(4)])
+    results = [
+        {"problem_id": "p", "runs": [[0, "AC", 0.1], [1, "WA", 0.3], [2, "WA", 0.1]]},
+        {"problem_id": "p", "runs": [[0, "AC", 0.1], [1, "WA", 0.3, 0.2, 0.0, 1024], [2, "WA", 0.1]]},
+        {"problem_id": "p", "runs": []},
+    ]
+    history = update_history({}, results, {"p": hashes})
+    assert history["p"][hashes[1]] == {"trials": 2, "kills": 2, "seconds": 0.6}
+    assert history["p"][hashes[0]]["kills"] == 0
+    # 击杀率相同时先跑更快的；没有记录的测试（0.5）排在从未击杀的测试之前
+    assert prioritize(history["p"], hashes) == [2, 1, 3, 0]
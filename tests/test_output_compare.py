@@ -0,0 +1,33 @@
+from output_compare import FLOAT_TOLERANCE, outputs_match, tokens_match
+
+
+def test_whitespace_is_ignored():
+    assert outputs_match(b"1 2\n3\n", b"1 2 3")
+    assert outputs_match(b"  1\t2\r\n\n3  \n\n", b"1 2\n3")
+    assert outputs_match(b"", b"\n \n")
+    assert not outputs_match(b"12", b"1 2")
+    assert not outputs_match(b"1 2", b"1 2 3")
+    assert not outputs_match(b"1 2 3", b"1 2")
+
+
+def test_decimal_tolerance_per_token():
+    assert outputs_match(b"0.1000001 2.5", b"0.1 2.5000005")
+    assert outputs_match(b"-1.0000000 3", b"-1.0000001 3")
+    assert not outputs_match(b"0.100002 2.5", b"0.1 2.5")
+    assert not outputs_match(b"1.5 0.1", b"1.5 0.2")
+
+
+def test_tolerance_needs_decimals_on_both_sides():
+    assert tokens_match(b"1.0", b"1.0000001")
+    assert not tokens_match(b"1", b"1.0")
+    assert not tokens_match(b"1e-7", b"0.0")
+    assert not tokens_match(b"abc", b"abd")
+    assert tokens_match(b"0.5", b"0.5" + b"0" * 6 + b"1", FLOAT_TOLERANCE)
+
+
+def test_mismatch_across_chunk_boundaries():
+    expected = b" ".join(str(i).encode() for i in range(50000))
+    actual = b"\n".join(str(i).encode() for i in range(50000))
+    assert outputs_match(memoryview(actual), memoryview(expected))
+    assert not outputs_match(actual.replace(b"\n49999", b"\n49998"), expected)
+    assert not outputs_match(actual + b" 0", expected)
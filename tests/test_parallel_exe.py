@@ -0,0 +1,81 @@
+import json
+import os
+
+from parallel_exe import save_results
+from result_journal import ResultJournal, index_journal, iter_sorted, pending_items, write_json_list
+
+
+def make_result(problem_id, code_id, status):
+    return {
+        "problem_id": problem_id, "code_id": code_id, "code": f"// {problem_id} {code_id} 中文\nint main() {{}}",
+        "error": status, "details": [], "time_limit": 1000, "memory_limit": 256, "test_cases": "tests.jsonl",
+        "compile_seconds": 0.5, "runs": [[0, status[0], 0.25, 0.2, 0.01, 2048]],
+    }
+
+
+def test_save_results_streams_same_files(tmp_path):
+    journal_path = os.path.join(tmp_path, "x.journal.jsonl")
+    with ResultJournal(journal_path) as journal:
+        for result in [make_result("p2", "c1", ["WA"]), make_result("p1", "c0", ["AC", "AC"]), make_result("p2", "c0", ["AC"]), make_result("p1", "c1", ["TLE"])]:
+            journal.append(result)
+    all_file, correct_file = os.path.join(tmp_path, "x-all.json"), os.path.join(tmp_path, "x-correct.json")
+    status_counts, problem_results = save_results(iter_sorted(journal_path, index_journal(journal_path)), correct_file, all_file)
+
+    assert status_counts["AC"] == 2 and status_counts["WA"] == 1 and status_counts["TLE"] == 1
+    saved = json.load(open(all_file))
+    # 与 json.dump(..., indent=3) 的格式逐字节相同
+    assert open(all_file).read() == json.dumps(saved, indent=3)
+    assert list(saved) == ["p1", "p2"]
+    assert [code["code_id"] for code in saved["p2"]["codes"]] == ["c0", "c1"]
+    assert saved["p1"]["codes"][0]["code"].startswith("// p1 c0")
+    assert saved["p1"]["resources"]["compile_seconds"] == 1.0
+    correct = json.load(open(correct_file))
+    assert open(correct_file).read() == json.dumps(correct, indent=3)
+    assert {problem_id: [code["code_id"] for code in v["codes"]] for problem_id, v in correct.items()} == {"p1": ["c0"], "p2": ["c0"]}
+    # 返回的结果不带源码
+    assert all("code" not in code for v in problem_results.values() for code in v["codes"])
+    assert [code["status"] for code in problem_results["p1"]["codes"]] == [["AC", "AC"], ["TLE"]]
+
+
+def test_save_results_empty(tmp_path):
+    all_file, correct_file = os.path.join(tmp_path, "x-all.json"), os.path.join(tmp_path, "x-correct.json")
+    status_counts, problem_results = save_results([], correct_file, all_file)
+    assert problem_results == {}
+    assert open(all_file).read() == "{}" and open(correct_file).read() == "{}"
+
+
+def test_resume_skips_finished_and_rebuilds_from_journal(tmp_path):
+    journal_path = os.path.join(tmp_path, "x.journal.jsonl")
+    items = [{"problem_id": p, "code_id": c} for p in ("p1", "p2") for c in ("c0", "c1")]
+    statuses = {("p1", "c0"): ["AC"], ("p1", "c1"): ["WA"], ("p2", "c0"): ["RE"], ("p2", "c1"): ["AC", "AC"]}
+    # 上次运行完成了两个结果，第三个写到一半时进程被杀
+    with ResultJournal(journal_path) as journal:
+        journal.append(make_result("p2", "c0", statuses[("p2", "c0")]))
+        journal.append(make_result("p1", "c1", statuses[("p1", "c1")]))
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(make_result("p1", "c0", ["AC"]))[:40])
+
+    remaining, num_done = pending_items(journal_path, items, resume=True)
+    assert num_done == 2
+    assert [(item["problem_id"], item["code_id"]) for item in remaining] == [("p1", "c0"), ("p2", "c1")]
+    with ResultJournal(journal_path) as journal:
+        for item in remaining:
+            journal.append(make_result(item["problem_id"], item["code_id"], statuses[(item["problem_id"], item["code_id"])]))
+
+    # 半行被截掉，每个结果恰好一行；最终文件由整个 journal 重建
+    with open(journal_path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert sorted((r["problem_id"], r["code_id"]) for r in lines) == sorted(statuses)
+    index = index_journal(journal_path)
+    json_file = os.path.join(tmp_path, "x.json")
+    write_json_list(json_file, iter_sorted(journal_path, index))
+    assert [(r["problem_id"], r["code_id"]) for r in json.load(open(json_file))] == sorted(statuses)
+    all_file, correct_file = os.path.join(tmp_path, "x-all.json"), os.path.join(tmp_path, "x-correct.json")
+    status_counts, problem_results = save_results(iter_sorted(journal_path, index), correct_file, all_file)
+    assert {(p, code["code_id"]): code["status"] for p, v in problem_results.items() for code in v["codes"]} == statuses
+    assert status_counts["AC"] == 2 and status_counts["WA"] == 1 and status_counts["RE"] == 1
+
+    # 所有结果都已完成时没有剩余；不续跑时旧 journal 被删除
+    assert pending_items(journal_path, items, resume=True) == ([], 4)
+    assert pending_items(journal_path, items, resume=False) == (items, 0)
+    assert not os.path.exists(journal_path)
@@ -0,0 +1,147 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import cbuild
+import utils
+from utils import bareiss_rank, exchange_rows, get_basis, get_rank, init_exchange, large_primes, swappable
+
+
+def fraction_rank(matrix):
+    """有理数域上的 Gauss 消元，作为秩的标准答案"""
+    rows = [[Fraction(int(x)) for x in row] for row in np.asarray(matrix)]
+    rank = 0
+    for col in range(len(rows[0]) if rows else 0):
+        pivot = next((r for r in range(rank, len(rows)) if rows[r][col] != 0), None)
+        if pivot is None:
+            continue
+        rows[rank], rows[pivot] = rows[pivot], rows[rank]
+        for r in range(rank + 1, len(rows)):
+            factor = rows[r][col] / rows[rank][col]
+            if factor:
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[rank])]
+        rank += 1
+    return rank
+
+
+def greedy_basis(matrix):
+    """按行顺序取与前面已选行无关的行"""
+    basis = []
+    for i in range(len(matrix)):
+        if fraction_rank(matrix[basis + [i]]) > len(basis):
+            basis.append(i)
+    return basis
+
+
+def random_matrix(rng, rows, cols, rank=None, density=0.4):
+    """随机 0/1 矩阵；给定 rank 时由 rank 行 0/1 行向量做 0/1 组合得到（秩不超过 rank）"""
+    if rank is None:
+        return (rng.random((rows, cols)) < density).astype(np.int64)
+    generators = (rng.random((rank, cols)) < density).astype(np.int64)
+    mix = (rng.random((rows, rank)) < 0.3).astype(np.int64)
+    return np.minimum(mix @ generators, 1) if rng.random() < 0.5 else mix @ generators
+
+
+@pytest.fixture(params=["kernel", "numpy"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        # 没有 gcc：build_helper 编译失败返回 None，退回 numpy 消元
+        monkeypatch.setattr(utils, "_kernel", None)
+        monkeypatch.setattr(cbuild, "build_helper", lambda *args, **kwargs: None)
+        assert utils._get_kernel() is None
+    return request.param
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_rank_matches_fractions(engine, seed):
+    rng = np.random.default_rng(seed)
+    for shape in [(12, 30), (30, 12), (25, 25)]:
+        matrix = random_matrix(rng, *shape)
+        assert get_rank(matrix) == fraction_rank(matrix) == bareiss_rank(matrix)
+        deficient = random_matrix(rng, *shape, rank=min(shape) // 2)
+        assert get_rank(deficient) == fraction_rank(deficient)
+
+
+def test_rank_deficient_uses_more_primes(engine, monkeypatch):
+    rng = np.random.default_rng(7)
+    matrix = random_matrix(rng, 60, 60, rank=20, density=0.5)
+    primes = []
+    independent_rows = utils.independent_rows
+
+    def spy(rows, p, max_rank=None):
+        primes.append(p)
+        return independent_rows(rows, p, max_rank)
+
+    monkeypatch.setattr(utils, "independent_rows", spy)
+    assert get_rank(matrix) == fraction_rank(matrix) < 60
+    # 不满秩时一个素数不能确认，要换素数直到超过 Hadamard 界
+    assert len(primes) > 1
+
+
+def test_rank_survives_unlucky_prime(engine):
+    # 行列式是第一个素数的倍数：模它只有秩 1，换下一个素数得到 2
+    p = large_primes()[0]
+    matrix = np.array([[p, 0], [0, 1]], dtype=np.int64)
+    assert get_rank(matrix) == 2
+    assert get_basis(matrix, 2) == [0, 1]
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_basis_is_greedy_independent_and_spanning(engine, seed):
+    rng = np.random.default_rng(100 + seed)
+    matrix = random_matrix(rng, 20, 14, rank=6 + seed)
+    matrix[3] = matrix[1]
+    matrix[5] = 0
+    rank = get_rank(matrix)
+    basis = get_basis(matrix, rank)
+    assert len(basis) == rank == len(set(basis))
+    # 线性无关，且加上任意一行秩不变（张成整个行空间）
+    assert fraction_rank(matrix[basis]) == rank
+    assert fraction_rank(np.concatenate([matrix[basis], matrix])) == rank
+    assert basis == greedy_basis(matrix)
+
+
+def brute_force_swappable(matrix, basis, rank):
+    mask = np.zeros((len(matrix), len(basis)), dtype=bool)
+    for k in range(len(matrix)):
+        for l in range(len(basis)):
+            temp_basis = list(basis)
+            temp_basis[l] = k
+            mask[k, l] = get_rank(matrix[temp_basis]) == rank
+    return mask
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_exchange_matches_brute_force(engine, seed):
+    rng = np.random.default_rng(200 + seed)
+    matrix = random_matrix(rng, 18, 12, rank=7, density=0.5)
+    rank = get_rank(matrix)
+    exchange = init_exchange(matrix, get_basis(matrix, rank))
+    for _ in range(6):
+        mask = swappable(exchange)
+        assert np.array_equal(mask, brute_force_swappable(matrix, exchange["basis"], rank))
+        # 换成一个不在基里的可换行，之后的系数应与重新建立的状态一致
+        candidates = [(k, l) for k, l in zip(*np.nonzero(mask)) if k not in exchange["basis"]]
+        k, l = candidates[rng.integers(len(candidates))]
+        exchange_rows(exchange, l, k)
+        assert get_rank(matrix[exchange["basis"]]) == rank
+        fresh = init_exchange(matrix, exchange["basis"])
+        common = set(exchange["coefficients"]) & set(fresh["coefficients"])
+        assert common
+        for p in common:
+            assert np.array_equal(exchange["coefficients"][p], fresh["coefficients"][p])
+        assert np.array_equal(swappable(exchange), swappable(fresh))
+
+
+def test_exchange_replaces_unlucky_prime():
+    # 换行后新基的主子式是第一个素数的倍数：该素数下的系数作废，换别的素数补足
+    p = large_primes()[0]
+    matrix = np.array([[1, 0], [0, 1], [p, 1]], dtype=np.int64)
+    exchange = init_exchange(matrix, [0, 1])
+    assert p in exchange["coefficients"]
+    assert swappable(exchange)[2].tolist() == [True, True]
+    exchange_rows(exchange, 0, 2)
+    assert exchange["basis"] == [2, 1]
+    assert p not in exchange["coefficients"]
+    assert swappable(exchange).tolist() == brute_force_swappable(matrix, [2, 1], 2).tolist()
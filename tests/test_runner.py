@@ -0,0 +1,118 @@
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+import compile_cache
+import runner
+
+pytestmark = pytest.mark.skipif(shutil.which("g++") is None, reason="g++ not available")
+
+PROGRAM = r"""
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <vector>
+#include <unistd.h>
+int main() {
+    char mode[8];
+    if (scanf("%7s", mode) != 1) return 2;
+    if (!strcmp(mode, "ac")) puts("ok");
+    else if (!strcmp(mode, "wa")) puts("no");
+    else if (!strcmp(mode, "re")) abort();
+    else if (!strcmp(mode, "tle")) sleep(5);
+    else if (!strcmp(mode, "mle")) { std::vector<char> v(1ull << 32); v[12345] = 1; printf("%d\n", v[12345]); }
+    return 0;
+}
+"""
+MODES = ["ac", "wa", "re", "tle", "mle", "ac"]
+MEMORY_KB = 256 * 1024
+
+
+@pytest.fixture
+def use_runner(monkeypatch):
+    def use(name):
+        monkeypatch.setattr(runner, "RUNNER", name)
+    yield use
+    runner.close_forkserver()
+
+
+def needs_shim():
+    if not runner.get_forkserver_shim():
+        pytest.skip("fork server shim could not be built")
+
+
+def server_children(server):
+    children = []
+    for path in glob.glob(f"/proc/{server.proc.pid}/task/*/children"):
+        with open(path) as f:
+            children += f.read().split()
+    return children
+
+
+def verdict(exe_file, mode):
+    """与 run_cpp_code_linux 相同的返回码映射；tle 模式只 sleep，超时由墙钟判定，不依赖 CPU 时间的时序"""
+    try:
+        result = runner.run_test(exe_file, mode, 1, MEMORY_KB)
+    except subprocess.TimeoutExpired:
+        return "TLE", None
+    if result.returncode == 137:
+        return "MLE", None
+    if result.returncode == 124:
+        return "TLE", None
+    if result.returncode != 0:
+        return "RE", None
+    return ("AC" if result.stdout.strip() == b"ok" else "WA"), result.stdout
+
+
+def test_forkserver_verdicts_match_direct(use_runner, tmp_path):
+    needs_shim()
+    exe_file, _ = compile_cache.compile_cpp(PROGRAM, ["-O2"], str(tmp_path))
+    use_runner("direct")
+    direct = [verdict(exe_file, mode) for mode in MODES]
+    # 超出地址空间上限时分配失败（bad_alloc -> abort），与 ulimit -v 一样判为 RE
+    assert [v for v, _ in direct] == ["AC", "WA", "RE", "TLE", "RE", "AC"]
+
+    use_runner("forkserver")
+    assert [verdict(exe_file, mode) for mode in MODES] == direct
+    # 确实是 fork server 跑的，没有退回 direct
+    assert runner._server is not None and exe_file not in runner._no_forkserver
+
+
+def test_forkserver_reaps_killed_children(use_runner, tmp_path):
+    needs_shim()
+    use_runner("forkserver")
+    exe_file, _ = compile_cache.compile_cpp(PROGRAM, ["-O2"], str(tmp_path))
+    assert runner.run_test(exe_file, "ac", 1, MEMORY_KB).stdout == b"ok\n"
+    server = runner._server
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run_test(exe_file, "tle", 1, MEMORY_KB)
+    # 超时的子进程被杀死并由 server 回收，server 还能继续服务
+    assert server_children(server) == []
+    assert runner.run_test(exe_file, "ac", 1, MEMORY_KB).stdout == b"ok\n"
+    assert runner._server is server
+    runner.close_forkserver()
+    assert server.proc.returncode is not None
+    assert not os.path.exists(f"/proc/{server.proc.pid}")
+
+
+def test_forkserver_falls_back_to_direct(use_runner, tmp_path, monkeypatch):
+    use_runner("forkserver")
+    # 静态链接的程序不加载 LD_PRELOAD 的 shim，server 起不来
+    exe_file, _ = compile_cache.compile_cpp(PROGRAM, ["-O2", "-static"], str(tmp_path))
+    if exe_file is None:
+        pytest.skip("static linking not available")
+    assert runner.run_test(exe_file, "ac", 1, MEMORY_KB).stdout == b"ok\n"
+    assert exe_file in runner._no_forkserver
+    assert runner._server is None
+
+    # shim 编译不了时同样退回 direct
+    monkeypatch.setattr(runner, "get_forkserver_shim", lambda: "")
+    with tempfile.TemporaryDirectory() as workdir:
+        exe_file, _ = compile_cache.compile_cpp(PROGRAM, ["-O2"], workdir)
+        result = runner.run_test(exe_file, "wa", 1, MEMORY_KB)
+        assert result.returncode == 0 and result.stdout == b"no\n"
+        assert exe_file in runner._no_forkserver
@@ -0,0 +1,206 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import solve
+from solve import check_optimizer, find_balance
+from utils import BitMatrix, cal_jaccard_similarity, get_basis, get_rank, transform2aw
+
+
+def enumerate_balance(matrix, rank, basis, max_iter=1000):
+    """原来的 find_balance：每轮枚举所有换行，逐个求秩并重算 Jaccard"""
+    basis = np.array(basis)
+    balance_states, balance_value = cal_jaccard_similarity(matrix[basis, :])
+    for _ in range(max_iter):
+        others = np.setdiff1d(np.arange(matrix.shape[0]), basis)
+        change = None
+        balance_min = balance_value
+        for i_idx in range(len(basis)):
+            for j in others:
+                temp_basis = basis.copy()
+                temp_basis[i_idx] = j
+                if get_rank(matrix[temp_basis, :]) < rank:
+                    continue
+                temp_states, temp_value = cal_jaccard_similarity(matrix[temp_basis, :])
+                if temp_value < balance_min:
+                    balance_min = temp_value
+                    change = (temp_states, temp_value, i_idx, j)
+        if change is None:
+            break
+        balance_states, balance_value, i_idx, j = change
+        basis[i_idx] = j
+    return basis.tolist(), balance_value, balance_states
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_find_balance_matches_enumeration(seed):
+    rng = np.random.default_rng(seed)
+    matrix = (rng.random((14, 9)) < 0.4).astype(np.int64)
+    matrix[matrix.sum(axis=1) == 0, 0] = 1
+    rank = get_rank(matrix)
+    basis = get_basis(matrix, rank)
+    _, found_basis, value, states, _ = find_balance(["p", matrix, rank, basis, "jaccard"])
+    expected_basis, expected_value, expected_states = enumerate_balance(matrix, rank, basis)
+    assert found_basis == expected_basis
+    assert value == expected_value
+    assert states == expected_states.tolist()
+    assert get_rank(matrix[found_basis]) == rank
+
+
+def test_find_balance_accepts_bit_matrix():
+    rng = np.random.default_rng(9)
+    matrix = (rng.random((20, 70)) < 0.3).astype(np.int64)
+    rank = get_rank(matrix)
+    basis = get_basis(matrix, rank)
+    dense = find_balance(["p", matrix, rank, basis, "jaccard"])
+    packed = find_balance(["p", BitMatrix.from_dense(matrix), rank, basis, "jaccard"])
+    assert dense[1:4] == packed[1:4]
+
+
+
+def test_check_optimizer():
+    check_optimizer("greedy", None)
+    check_optimizer("anneal", 1.0)
+    with pytest.raises(ValueError):
+        check_optimizer("anneal", None)
+    with pytest.raises(ValueError):
+        check_optimizer("tabu", 1.0)
+    check_optimizer("anneal", None, max_steps=100)
+    with pytest.raises(ValueError):
+        check_optimizer("greedy", None, max_steps=100)
+
+
+def make_problems(seed, count=3, rows=12, cols=8):
+    rng = np.random.default_rng(seed)
+    problems = {}
+    for i in range(count):
+        matrix = (rng.random((rows, cols)) < 0.4).astype(np.int64)
+        matrix[matrix.sum(axis=1) == 0, 0] = 1
+        rank = get_rank(matrix)
+        basis = get_basis(matrix, rank)
+        name = f"p{i}"
+        problems[name] = {
+            "name": name,
+            "rank": rank,
+            "basis_indices": basis,
+            "jaccard": cal_jaccard_similarity(matrix[basis])[1].item(),
+            "wc": transform2aw(matrix),
+        }
+    return problems
+
+
+@pytest.fixture
+def balance_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("logs")
+    monkeypatch.setattr(solve, "PATH", f"{tmp_path}/")
+    with open(tmp_path / "init.json", "w") as f:
+        json.dump(make_problems(0), f)
+    return tmp_path
+
+
+def read_outputs(path):
+    with open(path / "out.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    with open(path / "out.checkpoint.json") as f:
+        checkpoint = json.load(f)
+    with open(path / "out.json") as f:
+        final = json.load(f)
+    return records, checkpoint, final
+
+
+def per_problem(records):
+    """imap_unordered 下不同题目的记录交错，比较每个题目自己的改进序列"""
+    values = {}
+    for record in records:
+        values.setdefault(record["name"], []).append(record["balance_jaccard"])
+    return values
+
+
+def test_better_problem_resume_continues(balance_dir, tmp_path_factory):
+    run = dict(source_file="init.json", output_file="out.json", patience=100, processes=2)
+    solve.better_problem(max_turns=1, **run)
+    first, checkpoint, _ = read_outputs(balance_dir)
+    assert checkpoint["turn"] == 1
+    assert all(count == 1 for count in checkpoint["restarts"].values())
+    # 第二轮进行到一半被杀：最后一行只写了一半
+    with open(balance_dir / "out.jsonl", "a") as f:
+        f.write('{"name": "p0", "bala')
+    solve.better_problem(max_turns=4, resume=True, **run)
+    resumed, checkpoint, final = read_outputs(balance_dir)
+    assert checkpoint["turn"] == 4
+    assert all(count == 4 for count in checkpoint["restarts"].values())
+    # 旧记录原样保留、不重复，之后每条记录都是严格改进
+    assert resumed[:len(first)] == first
+    for values in per_problem(resumed).values():
+        assert values == sorted(set(values), reverse=True)
+
+    # 与不中断地跑 4 轮结果相同（每轮的种子只取决于轮数）
+    other = tmp_path_factory.mktemp("uninterrupted")
+    os.makedirs(other / "logs")
+    solve.PATH = f"{other}/"
+    with open(other / "init.json", "w") as f:
+        json.dump(make_problems(0), f)
+    solve.better_problem(max_turns=4, **run)
+    records, expected_checkpoint, expected_final = read_outputs(other)
+    assert per_problem(resumed) == per_problem(records)
+    assert checkpoint == expected_checkpoint
+    assert final == expected_final
+
+
+def test_better_problem_patience(balance_dir):
+    solve.better_problem(source_file="init.json", output_file="out.json", max_turns=100, patience=2, processes=2)
+    records, checkpoint, _ = read_outputs(balance_dir)
+    improvements = {name: len(values) for name, values in per_problem(records).items()}
+    # 连续 patience 次没有改进就不再重启，最后一个题目收敛后整个搜索结束，远在 max_turns 之前
+    assert checkpoint["turn"] == max(checkpoint["restarts"].values()) < 100
+    for name, count in checkpoint["restarts"].items():
+        assert checkpoint["stale"][name] == 2
+        assert count >= improvements.get(name, 0) + 2
+
+    # patience=0：一次也不重启
+    os.remove(balance_dir / "out.checkpoint.json")
+    solve.better_problem(source_file="init.json", output_file="out.json", max_turns=100, patience=0, processes=2)
+    assert not os.path.exists(balance_dir / "out.checkpoint.json")
+    assert os.path.getsize(balance_dir / "out.jsonl") == 0
+
+
+def test_balance_worker_limits_threads(monkeypatch):
+    calls = []
+    monkeypatch.setattr(solve, "threadpool_limits", calls.append)
+    solve._init_balance_worker({"p": "matrix"})
+    assert calls == [1]
+    assert solve._shared_matrices == {"p": "matrix"}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_anneal_never_worse_than_greedy(seed):
+    rng = np.random.default_rng(300 + seed)
+    matrix = BitMatrix.from_dense((rng.random((24, 40)) < 0.35).astype(np.int64))
+    rank = get_rank(matrix)
+    basis = get_basis(matrix, rank)
+    greedy = solve.greedy_balance(matrix, rank, basis)
+    annealed = solve.anneal_balance(matrix, rank, basis, np.random.default_rng(seed), max_steps=3000)
+    assert annealed["value"] <= greedy["value"]
+    assert get_rank(matrix[annealed["basis"]]) == rank
+    assert annealed["value"] == cal_jaccard_similarity(matrix[annealed["basis"]])[1]
+    # 同一个种子、只按步数停止时结果可复现
+    again = solve.anneal_balance(matrix, rank, basis, np.random.default_rng(seed), max_steps=3000)
+    assert again["basis"] == annealed["basis"] and again["value"] == annealed["value"]
+
+
+def test_multi_start_is_deterministic():
+    problems = make_problems(5, count=1, rows=24, cols=30)
+    p = problems["p0"]
+    matrices = {"p0": BitMatrix.from_aw(p["wc"])}
+    keys = ("basis", "value", "order", "states", "steps")
+    with multiprocessing.Pool(2, initializer=solve._init_balance_worker, initargs=(matrices,)) as pool:
+        for optimizer, max_steps in (("greedy", None), ("anneal", 500)):
+            first = solve.multi_start(pool, "p0", p["rank"], optimizer, starts=4, budget=None, seed=1, max_steps=max_steps)
+            second = solve.multi_start(pool, "p0", p["rank"], optimizer, starts=4, budget=None, seed=1, max_steps=max_steps)
+            assert {key: first[key] for key in keys} == {key: second[key] for key in keys}
+        with pytest.raises(ValueError):
+            solve.multi_start(pool, "p0", p["rank"], "greedy", starts=2, budget=None, max_steps=10)
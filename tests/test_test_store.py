@@ -0,0 +1,40 @@
+import os
+
+from excute_tool_linux import iter_testcases
+from test_store import StoredTests, close_stores, write_store
+
+TESTS = [
+    {"input": "1 2\n", "output": "3"},
+    {"input": {"input": "中文", "output": "ok"}},
+    {"input": "", "output": 0.5},
+    {"input": "x" * 100000, "output": ""},
+]
+
+
+def test_store_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "tests.blob")
+    store = write_store(TESTS, path)
+    try:
+        reopened = StoredTests(path)
+        assert len(reopened) == len(TESTS)
+        assert list(reopened) == [
+            {"input": "1 2\n", "output": "3"},
+            {"input": "中文", "output": "ok"},
+            {"input": "", "output": "0.5"},
+            {"input": "x" * 100000, "output": ""},
+        ]
+        assert reopened[-1] == store[3]
+        assert reopened[1:3] == list(reopened)[1:3]
+    finally:
+        close_stores()
+
+
+def test_store_iter_testcases_matches_list(tmp_path):
+    path = os.path.join(tmp_path, "tests.blob")
+    store = write_store(TESTS, path)
+    try:
+        from_store = [(idx, bytes(i), bytes(o)) for idx, i, o in iter_testcases(store, [3, 0, 2, 1])]
+        from_list = [(idx, i.encode(), o.encode()) for idx, i, o in iter_testcases(TESTS, [3, 0, 2, 1])]
+        assert from_store == from_list
+    finally:
+        close_stores()
@@ -0,0 +1,34 @@
+import subprocess
+
+import compile_cache
+import runner
+import time_limits
+
+
+def fake_judge(monkeypatch, returncodes):
+    """编译总是成功，returncodes 为 输入 -> 返回码"""
+    monkeypatch.setattr(compile_cache, "compile_cpp", lambda source, flags, workdir: ("exe", ""))
+    monkeypatch.setattr(runner, "run_test", lambda exe, input_data, timeout, memory_kb: subprocess.CompletedProcess([exe], returncodes[input_data], b"", b""))
+
+
+def test_runtime_errors_are_not_timed(monkeypatch):
+    fake_judge(monkeypatch, {"ok": 0, "bad": 134})
+    seconds, errors = time_limits.time_solution("int main() {}", [], ["ok", "bad", "ok"], 3, 1024, 2, "/tmp")
+    assert errors == 1
+    assert seconds is not None and seconds > 0
+
+    seconds, errors = time_limits.time_solution("int main() {}", [], ["bad", "bad"], 3, 1024, 2, "/tmp")
+    assert (seconds, errors) == (None, 2)
+
+
+def test_compile_error_is_not_timed(monkeypatch):
+    monkeypatch.setattr(compile_cache, "compile_cpp", lambda source, flags, workdir: (None, "error"))
+    assert time_limits.time_solution("x", [], ["1"], 3, 1024, 1, "/tmp") == (None, 0)
+
+
+def test_calibrated_timeout_clamps():
+    assert time_limits.calibrated_timeout(0.1) == 1.0
+    assert time_limits.calibrated_timeout(1.0) == 3.5
+    assert time_limits.calibrated_timeout(5.0, ceiling=4) == 4
+    assert time_limits.effective_timeout({"time_limit": 2000}) == 5
+    assert time_limits.effective_timeout({"time_limit": 2000, "timeout": 1.5}) == 1.5
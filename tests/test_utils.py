@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from utils import BitMatrix, cal_jaccard_similarity, get_basis, get_rank, jaccard_columns, popcount_sum, transform2aw, transform2matrix
+
+
+def dense_jaccard(matrix):
+    """所有行两两之间的 Jaccard（对角为 0），与 cal_jaccard_similarity 的逐项公式相同"""
+    intersection = matrix @ matrix.T
+    row_sums = matrix.sum(axis=1, keepdims=True)
+    union = row_sums + row_sums.T - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaccard = np.where(union == 0, 1.0, intersection / union)
+    np.fill_diagonal(jaccard, 0)
+    return jaccard
+
+
+def test_jaccard_columns_matches_pairwise():
+    rng = np.random.default_rng(0)
+    matrix = (rng.random((30, 100)) < 0.2).astype(np.int64)
+    matrix[3] = 0
+    matrix[4] = 0
+    rows = [0, 3, 4, 17, 29]
+    expected = dense_jaccard(matrix)[:, rows]
+    assert np.array_equal(jaccard_columns(matrix, rows), expected)
+    assert np.array_equal(jaccard_columns(BitMatrix.from_dense(matrix), rows), expected)
+    assert np.array_equal(jaccard_columns(matrix, rows, matrix.sum(axis=1)), expected)
+
+
+def random_aw(rows, cols, seed, density=0.3):
+    rng = np.random.default_rng(seed)
+    return ["".join("W" if x else "A" for x in row) for row in rng.random((rows, cols)) < density]
+
+
+@pytest.mark.parametrize("cols", [1, 63, 64, 65, 130])
+def test_bit_matrix_round_trip(cols):
+    wc = random_aw(7, cols, cols)
+    matrix = BitMatrix.from_aw(wc)
+    assert matrix.shape == (7, cols)
+    assert matrix.words.shape == (7, (cols + 63) // 64)
+    assert matrix.to_aw() == wc
+    assert transform2aw(matrix) == wc
+    dense = transform2matrix(wc)
+    assert np.array_equal(matrix.to_dense(), dense)
+    assert BitMatrix.from_dense(dense) == matrix
+    assert np.array_equal(matrix.row_sums(), dense.sum(axis=1))
+    assert np.array_equal(matrix.column_sums(), dense.sum(axis=0))
+    assert np.array_equal(matrix.intersections(), dense @ dense.T)
+    assert np.array_equal(matrix.intersections(matrix[[2, 5]]), dense @ dense[[2, 5]].T)
+
+
+def test_bit_matrix_bit_layout():
+    matrix = BitMatrix.from_aw(["W" + "A" * 63 + "W", "A" * 64 + "A"])
+    assert matrix.words.tolist() == [[1, 1], [0, 0]]
+    assert BitMatrix.from_aw(["A" * 3 + "W"]).words.tolist() == [[8]]
+
+
+def test_bit_matrix_rows():
+    wc = random_aw(6, 70, 1)
+    matrix = BitMatrix.from_aw(wc)
+    assert matrix[[4, 0]].to_aw() == [wc[4], wc[0]]
+    assert matrix[1:3].to_aw() == wc[1:3]
+    assert matrix[np.array([True, False] * 3)].to_aw() == wc[::2]
+    assert matrix[2].to_aw() == [wc[2]]
+    assert matrix[[3], :].to_aw() == [wc[3]]
+    with pytest.raises(IndexError):
+        matrix[:, 0]
+
+
+def test_bit_matrix_edge_cases():
+    assert BitMatrix.from_aw([]).shape == (0, 0)
+    with pytest.raises(ValueError):
+        BitMatrix.from_aw(["AW", "A"])
+
+
+def test_popcount_table_fallback(monkeypatch):
+    words = BitMatrix.from_aw(random_aw(5, 200, 2)).words
+    expected = popcount_sum(words)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert np.array_equal(popcount_sum(words), expected)
+
+
+def test_bit_matrix_matches_dense_pipeline():
+    wc = random_aw(25, 90, 3)
+    matrix, dense = BitMatrix.from_aw(wc), transform2matrix(wc)
+    rank = get_rank(dense)
+    assert get_rank(matrix) == rank
+    basis = get_basis(matrix, rank)
+    assert basis == get_basis(dense, rank)
+    packed_states, packed_value = cal_jaccard_similarity(matrix[basis])
+    dense_states, dense_value = cal_jaccard_similarity(dense[basis])
+    assert packed_value == dense_value
+    assert np.array_equal(packed_states, dense_states)
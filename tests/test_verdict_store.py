@@ -0,0 +1,93 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from excute_tool_linux import NOT_RUN, TLE_SKIPPED
+from get_rank_result import STATUS_CODES, compute_bootstrap_result, compute_fail_fast_result, compute_exact_result, compute_rank_result, load_results, verdict_matrix
+from verdict_store import PAD, has_verdicts, load_verdicts, verdicts_prefix, write_verdicts
+
+RESULTS = {
+    "p0": {
+        "problem_id": "p0", "time_limit": 1000, "memory_limit": 256,
+        "codes": [
+            {"code_id": "c0", "status": ["AC", "WA", "AC", "TLE"]},
+            {"code_id": "c1", "status": ["CE"]},
+            {"code_id": "c2", "status": ["AC", "AC", TLE_SKIPPED, "OLE"]},
+        ],
+    },
+    "p1": {
+        "problem_id": "p1", "time_limit": 2000, "memory_limit": 512, "sample_seed": 3,
+        "codes": [{"code_id": "c0", "status": ["AC", NOT_RUN, "RE"]}],
+    },
+    "p2": {"problem_id": "p2", "time_limit": 1000, "memory_limit": 256, "fail_fast": True, "codes": []},
+}
+
+
+def test_round_trip(tmp_path):
+    prefix = os.path.join(tmp_path, "x-all")
+    write_verdicts(RESULTS, prefix)
+    loaded = load_verdicts(prefix)
+    assert list(loaded) == list(RESULTS)
+    for problem_id, v in RESULTS.items():
+        assert [{"code_id": c["code_id"], "status": c["status"]} for c in v["codes"]] == loaded[problem_id]["codes"]
+        for field in ("time_limit", "memory_limit", "sample_seed", "fail_fast"):
+            assert loaded[problem_id].get(field) == v.get(field)
+    assert loaded["p0"]["verdicts"].dtype == np.uint8
+    assert loaded["p0"]["verdicts"][1, 1:].tolist() == [PAD] * 3
+    assert loaded["p0"]["lengths"].tolist() == [4, 1, 4]
+
+
+def test_status_codes_and_metrics_match_json(tmp_path):
+    results = {k: v for k, v in RESULTS.items() if k == "p0"}
+    prefix = os.path.join(tmp_path, "x-all")
+    write_verdicts(results, prefix)
+    loaded = load_verdicts(prefix, STATUS_CODES, statuses=False)
+    assert "status" not in loaded["p0"]["codes"][0]
+    assert (verdict_matrix(loaded["p0"]) == verdict_matrix(results["p0"])).all()
+    assert compute_exact_result(loaded) == compute_exact_result(results)
+    assert compute_bootstrap_result(loaded, 50) == compute_bootstrap_result(results, 50)
+    assert compute_rank_result(load_verdicts(prefix, STATUS_CODES), seed=1) == compute_rank_result(results, seed=1)
+
+
+def test_not_run_maps_to_pad(tmp_path):
+    prefix = os.path.join(tmp_path, "x-all")
+    write_verdicts(RESULTS, prefix)
+    loaded = load_verdicts(prefix, STATUS_CODES)
+    assert loaded["p1"]["verdicts"][0].tolist() == [STATUS_CODES["AC"], PAD, STATUS_CODES["RE"]]
+    with pytest.raises(ValueError):
+        verdict_matrix(loaded["p1"])
+
+
+def test_stale_verdicts_are_ignored(tmp_path):
+    result_file = os.path.join(tmp_path, "x-all.json")
+    with open(result_file, "w") as f:
+        json.dump(RESULTS, f)
+    assert not has_verdicts(result_file)
+    write_verdicts(RESULTS, verdicts_prefix(result_file))
+    assert has_verdicts(result_file)
+    assert "verdicts" in load_results(result_file)["p0"]
+    later = os.path.getmtime(result_file) + 10
+    os.utime(result_file, (later, later))
+    assert not has_verdicts(result_file)
+    assert "verdicts" not in load_results(result_file)["p0"]
+
+
+def test_fail_fast_without_statuses(tmp_path):
+    results = {
+        "p3": {
+            "problem_id": "p3", "time_limit": 1000, "memory_limit": 256, "fail_fast": True,
+            "codes": [
+                {"code_id": "c0", "status": ["AC", "AC", "WA"]},
+                {"code_id": "c1", "status": ["AC"]},
+                {"code_id": "c2", "status": ["CE"]},
+                {"code_id": "c3", "status": ["AC", TLE_SKIPPED]},
+            ],
+        },
+    }
+    prefix = os.path.join(tmp_path, "x-all")
+    write_verdicts(results, prefix)
+    loaded = load_verdicts(prefix, STATUS_CODES, statuses=False)
+    assert "status" not in loaded["p3"]["codes"][0]
+    assert compute_fail_fast_result(loaded) == compute_fail_fast_result(results)